@@ -0,0 +1,181 @@
+'''
+John Maurer
+
+Description: Runs many isolated headless arenas side by side, one world per
+process in a process pool (a process can only ever hold one ShowBase), each
+with its own seed, cog count, and scripted input. The results and timings of
+every arena are gathered into one report, for balance sweeps and soak tests
+
+Usage: python arena_runner.py [--arenas N] [--workers N] [--cogs N [N ...]] [--ticks N] [--recording FILE]
+'''
+
+from input_replay import loadRecording
+import argparse
+import contextlib
+import json
+import multiprocessing
+import random
+import sys,os
+import time
+import traceback
+
+#Keys a scripted toon can hold down, and the event that lets each one go
+HELD_KEYS = {'arrow_up': 'arrow_up-up', 'arrow_down': 'arrow_down-up',
+			'arrow_left': 'arrow_left-up', 'arrow_right': 'arrow_right-up'}
+
+def scriptInputs(seed, ticks, tickRate=60):
+	#Input events in the recording format ([frame, event]): keys held for a second or so at a time, and a pie now and then
+	generator = random.Random(seed)
+	events = []
+	heldKeys = set()
+	frame = 0
+	while frame < ticks:
+		roll = generator.random()
+		if roll < 0.35 and heldKeys:
+			key = generator.choice(sorted(heldKeys))
+			heldKeys.discard(key)
+			events.append([frame, HELD_KEYS[key]])
+		elif roll < 0.8:
+			key = generator.choice(sorted(HELD_KEYS))
+			if key not in heldKeys:
+				heldKeys.add(key)
+				events.append([frame, key])
+		else:
+			events.append([frame, 'control'])
+		frame += generator.randint(tickRate // 4, tickRate * 2)
+	return events
+
+def makeArenas(count, cogCounts, firstSeed, ticks, tickRate, events=None, sweptPies=False, batchCollisions=True):
+	#Every arena gets the next seed, and the cog counts are handed out in turn (so a sweep covers each one evenly)
+	arenas = []
+	for index in range(count):
+		seed = firstSeed + index
+		arenas.append({'arena': index,
+					'seed': seed,
+					'cogs': cogCounts[index % len(cogCounts)],
+					'ticks': ticks,
+					'tickRate': tickRate,
+					'sweptPies': sweptPies,
+					'batchCollisions': batchCollisions,
+					'events': events if events is not None else scriptInputs(seed, ticks, tickRate)})
+	return arenas
+
+def runArena(arena):
+	#Runs in a fresh worker process: build the arena's world, play its input into it, and report how it went
+	#(a world that blows up is reported, rather than taking the whole run down with it)
+	result = dict((key, value) for key, value in arena.items() if key != 'events')
+	result['pid'] = os.getpid()
+	startTime = time.perf_counter()
+	startCpu = time.process_time()
+	try:
+		#(the game prints every hit, which nobody is reading here)
+		with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+			runWorld(arena, result, startTime)
+	except Exception:
+		result['error'] = traceback.format_exc()
+	result['processSeconds'] = time.perf_counter() - startTime
+	result['cpuSeconds'] = time.process_time() - startCpu
+	return result
+
+def runWorld(arena, result, startTime):
+	#Seed before the world is built, so the arena gets the same cogs every time it runs with this seed
+	random.seed(arena['seed'])
+	from main import PieThrow
+	from input_replay import InputPlayer
+	from benchmark import getPeakMemoryMB
+	pieThrow = PieThrow(headless=True, cogCount=arena['cogs'], sweptPies=arena['sweptPies'], tickRate=arena['tickRate'],
+						batchCollisions=arena['batchCollisions'])
+	result['startupSeconds'] = time.perf_counter() - startTime
+
+	inputPlayer = InputPlayer(pieThrow.taskMgr, arena['events'])
+	stats = pieThrow.runFixedSteps(arena['ticks'], arena['tickRate'])
+	waveStats = pieThrow.waveManager.getStats()
+	result.update({'wallSeconds': stats['wallSeconds'],
+				'ticksPerSecond': stats['ticksPerSecond'],
+				'msPerTick': stats['wallSeconds'] * 1000 / arena['ticks'],
+				'p99MsPerTick': pieThrow.profiler.snapshot()['frame']['p99Ms'] if pieThrow.profiler is not None else None,
+				'inputEvents': len(arena['events']),
+				'cogsDestroyed': waveStats['destroyed'],
+				'wavesSpawned': waveStats['waves'],
+				'cogsBuilt': waveStats['built'],
+				'toonHealth': pieThrow.player.health,
+				'finalState': pieThrow.getReplayState(),
+				'peakMemoryMB': getPeakMemoryMB()})
+
+def runArenas(arenas, workers=None):
+	#Each worker process runs one arena and is replaced, so every arena starts from a clean process
+	#(spawned rather than forked, so no Panda state is ever inherited)
+	workers = workers or os.cpu_count() or 1
+	context = multiprocessing.get_context('spawn')
+	startTime = time.perf_counter()
+	with context.Pool(workers, maxtasksperchild=1) as pool:
+		results = []
+		for result in pool.imap_unordered(runArena, arenas):
+			results.append(result)
+			if 'error' in result:
+				print('arena {0[arena]} (seed {0[seed]}, {0[cogs]} cogs) FAILED'.format(result))
+			else:
+				print('arena {0[arena]} (seed {0[seed]}, {0[cogs]} cogs): {0[ticksPerSecond]:.0f} ticks/s, '
+					'{0[cogsDestroyed]} cogs destroyed over {0[wavesSpawned]} waves'.format(result))
+	wallSeconds = time.perf_counter() - startTime
+	results.sort(key=lambda result: result['arena'])
+	return makeReport(results, workers, wallSeconds)
+
+def makeReport(results, workers, wallSeconds):
+	#How much the pool sped things up over running every arena one after the other (the CPU time the arenas took
+	#is how long they would have taken alone, where wall time counts waiting on each other too), and each cog count's results
+	cpuSeconds = sum(result['cpuSeconds'] for result in results)
+	speedup = cpuSeconds / wallSeconds if wallSeconds > 0 else 0.0
+	cogCounts = {}
+	for result in results:
+		if 'error' not in result:
+			cogCounts.setdefault(result['cogs'], []).append(result)
+	sweep = {}
+	for cogs, cogResults in sorted(cogCounts.items()):
+		sweep[str(cogs)] = {'arenas': len(cogResults),
+							'ticksPerSecond': sum(result['ticksPerSecond'] for result in cogResults) / len(cogResults),
+							'msPerTick': sum(result['msPerTick'] for result in cogResults) / len(cogResults),
+							'cogsDestroyed': sum(result['cogsDestroyed'] for result in cogResults) / float(len(cogResults)),
+							'peakMemoryMB': max(result['peakMemoryMB'] or 0 for result in cogResults)}
+	return {'workers': workers,
+			'cpus': os.cpu_count(),
+			'arenas': len(results),
+			'failed': sum(1 for result in results if 'error' in result),
+			'wallSeconds': wallSeconds,
+			'cpuSeconds': cpuSeconds,
+			'speedup': speedup,
+			'efficiency': speedup / workers,
+			'sweep': sweep,
+			'results': results}
+
+def parseArguments(args=None):
+	parser = argparse.ArgumentParser(description='Run many headless Pie Throw arenas in parallel and report on them')
+	parser.add_argument('--arenas', type=int, default=8, help='arenas to run')
+	parser.add_argument('--workers', type=int, default=None, help='processes to run them on (default one per core)')
+	parser.add_argument('--cogs', type=int, nargs='+', default=[10], help='cogs in each wave, handed out to the arenas in turn')
+	parser.add_argument('--seed', type=int, default=1, help='seed of the first arena (the rest count up from it)')
+	parser.add_argument('--ticks', type=int, default=3600, help='ticks each arena runs for')
+	parser.add_argument('--tick-rate', type=int, default=60, help='simulated ticks per second')
+	parser.add_argument('--recording', default=None, help='play the input from this recording into every arena instead of scripting it')
+	parser.add_argument('--swept-pies', action='store_true', help='find pie impacts along their whole arc')
+	parser.add_argument('--collision-events', action='store_true', help='send every collision through the messenger')
+	parser.add_argument('--output', default='arena_report.json', help='JSON file to write the report to')
+	return parser.parse_args(args)
+
+if __name__ == '__main__':
+	arguments = parseArguments()
+	events = loadRecording(arguments.recording)['events'] if arguments.recording is not None else None
+	arenas = makeArenas(arguments.arenas, arguments.cogs, arguments.seed, arguments.ticks, arguments.tick_rate, events,
+						arguments.swept_pies, not arguments.collision_events)
+	report = runArenas(arenas, arguments.workers)
+	with open(arguments.output, 'w') as outputFile:
+		json.dump(report, outputFile, indent=1, sort_keys=True)
+
+	for cogs, summary in report['sweep'].items():
+		print('{0:>5} cogs: {1[arenas]} arenas, {1[ticksPerSecond]:.0f} ticks/s, {1[cogsDestroyed]:.1f} cogs destroyed, '
+			'peak memory {1[peakMemoryMB]:.0f} MB'.format(cogs, summary))
+	print('{arenas} arenas on {workers} workers in {wallSeconds:.1f}s ({cpuSeconds:.1f}s of arena CPU time): '
+		'{speedup:.2f}x speedup, {efficiency:.0%} efficiency'.format(**report))
+	if report['failed']:
+		print('{0} arenas FAILED (see {1})'.format(report['failed'], arguments.output))
+		sys.exit(1)
@@ -0,0 +1,99 @@
+'''
+John Maurer
+
+Description: A process-wide cache for models, Actors, and textures. Each asset is
+read from disk once, then handed out as a copy (geometry) or shared (textures)
+'''
+
+from direct.actor.Actor import Actor
+from panda3d.core import *
+from collections import OrderedDict
+
+class AssetCache():
+	def __init__(self, maxEntries=256):
+		#Least recently used entries are at the front of the dictionary
+		self.maxEntries = maxEntries
+		self.entries = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def resolvePath(self, path):
+		#Key everything by the absolute path so that different spellings share an entry
+		filename = Filename(path)
+		filename.makeAbsolute()
+		return filename.getFullpath()
+
+	def lookup(self, key, loadFunction):
+		#Return the cached prototype, loading it on a miss
+		if key in self.entries:
+			self.hits += 1
+			self.entries.move_to_end(key)
+			return self.entries[key]
+
+		self.misses += 1
+		prototype = loadFunction()
+		self.entries[key] = prototype
+
+		#Evict the least recently used entries once over budget
+		while len(self.entries) > self.maxEntries:
+			self.entries.popitem(last=False)
+			self.evictions += 1
+
+		return prototype
+
+	def loadTexture(self, path):
+		#Textures are immutable once loaded, so every caller shares the same one
+		key = ('texture', self.resolvePath(path))
+		return self.lookup(key, lambda: loader.loadTexture(key[1]))
+
+	def loadModel(self, path):
+		#Hand out a detached copy of the cached geometry
+		key = ('model', self.resolvePath(path))
+		prototype = self.lookup(key, lambda: loader.loadModel(key[1]))
+		return prototype.copyTo(NodePath())
+
+	def loadActor(self, models, anims=None):
+		#Models and anims are given the same way as to the Actor constructor
+		if isinstance(models, dict):
+			resolvedModels = tuple(sorted((partName, self.resolvePath(path)) for partName, path in models.items()))
+		else:
+			resolvedModels = self.resolvePath(models)
+
+		resolvedAnims = ()
+		if anims:
+			if all(isinstance(value, dict) for value in anims.values()):
+				resolvedAnims = tuple(sorted((partName, tuple(sorted((animName, self.resolvePath(path)) for animName, path in partAnims.items())))
+											for partName, partAnims in anims.items()))
+			else:
+				resolvedAnims = tuple(sorted((animName, self.resolvePath(path)) for animName, path in anims.items()))
+
+		#Copies share the prototype's animation bundles
+		key = ('actor', resolvedModels, resolvedAnims)
+		prototype = self.lookup(key, lambda: Actor(models, anims))
+		return Actor(other=prototype)
+
+	def releaseModel(self, path):
+		#Forget a model nobody will copy again, here and in Panda's model pool, so its geometry can be freed
+		key = ('model', self.resolvePath(path))
+		self.entries.pop(key, None)
+		ModelPool.releaseModel(Filename(key[1]))
+
+	def clear(self):
+		self.entries.clear()
+
+	def getStats(self):
+		return {'entries': len(self.entries),
+				'maxEntries': self.maxEntries,
+				'hits': self.hits,
+				'misses': self.misses,
+				'evictions': self.evictions}
+
+#The cache is shared by everything in the process
+sharedCache = None
+
+def getAssetCache():
+	global sharedCache
+	if sharedCache is None:
+		sharedCache = AssetCache()
+	return sharedCache
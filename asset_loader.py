@@ -0,0 +1,120 @@
+'''
+John Maurer
+
+Description: A class that reads model, animation, and texture files from disk on a
+pool of threads, and builds each group of assets on the main thread once its
+files (and the groups it depends on) are ready. Files land in Panda's model and
+texture pools, so the loads that build the world afterwards never touch the disk
+'''
+
+from panda3d.core import *
+from concurrent.futures import ThreadPoolExecutor
+import concurrent.futures
+import time
+
+def readModel(path):
+	#Runs on a loader thread; the model pool keeps the result for the main thread
+	if ModelPool.loadModel(Filename(path)) is None:
+		raise Exception('UH OH! Could not load model ' + path)
+
+def readTexture(path):
+	if TexturePool.loadTexture(Filename(path)) is None:
+		raise Exception('UH OH! Could not load texture ' + path)
+
+class LoadGroup():
+	def __init__(self, name, after):
+		self.name = name
+		self.after = list(after)
+		self.futures = []
+		self.callbacks = []
+
+		#When the group was asked for, when its files were read, and when it was built
+		self.requestTime = time.perf_counter()
+		self.loadedTime = None
+		self.readyTime = None
+
+	def onReady(self, callback):
+		#Callbacks run on the main thread, in the order they were given
+		self.callbacks.append(callback)
+		return self
+
+	def isLoaded(self):
+		return all(future.done() for future in self.futures)
+
+class AssetLoader():
+	def __init__(self, taskMgr, threadCount=4):
+		self.taskMgr = taskMgr
+		self.executor = ThreadPoolExecutor(threadCount)
+
+		#Groups in the order they were asked for, which is also the order their files are read in
+		self.groups = []
+		self.groupsByName = {}
+		self.task = None
+
+	def request(self, name, models=(), textures=(), after=()):
+		#Start reading the group's files right away; only building it waits for the groups it comes after
+		for dependency in after:
+			if dependency not in self.groupsByName:
+				raise Exception('UH OH! Asset group ' + name + ' depends on unknown group ' + dependency)
+		group = LoadGroup(name, after)
+		group.futures += [self.executor.submit(readModel, path) for path in models]
+		group.futures += [self.executor.submit(readTexture, path) for path in textures]
+		self.groups.append(group)
+		self.groupsByName[name] = group
+
+		#Build groups as they become ready, between frames
+		if self.task is None:
+			self.task = self.taskMgr.add(self.pollGroups, 'load assets', sort=-40)
+		return group
+
+	def pollGroups(self, task):
+		self.buildReadyGroups()
+		if self.isDone():
+			self.task = None
+			return task.done
+		return task.cont
+
+	def buildReadyGroups(self):
+		#Build every group whose files are read and whose dependencies are built
+		for group in self.groups:
+			if group.readyTime is not None:
+				continue
+			if not group.isLoaded():
+				continue
+			if group.loadedTime is None:
+				group.loadedTime = time.perf_counter()
+			if any(self.groupsByName[dependency].readyTime is None for dependency in group.after):
+				continue
+
+			#Surface any file that failed to load
+			for future in group.futures:
+				future.result()
+			for callback in group.callbacks:
+				callback()
+			group.readyTime = time.perf_counter()
+
+	def wait(self):
+		#Block until every group is built
+		while not self.isDone():
+			pending = [future for group in self.groups for future in group.futures if not future.done()]
+			if pending:
+				concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+			self.buildReadyGroups()
+		if self.task is not None:
+			self.taskMgr.remove(self.task)
+			self.task = None
+
+	def isDone(self):
+		return all(group.readyTime is not None for group in self.groups)
+
+	def getTimes(self, startTime):
+		#Seconds from startTime until each group's files were read and until it was built
+		return dict((group.name, {'loaded': group.loadedTime - startTime if group.loadedTime is not None else None,
+								'ready': group.readyTime - startTime if group.readyTime is not None else None})
+					for group in self.groups)
+
+	def destroy(self):
+		if self.task is not None:
+			self.taskMgr.remove(self.task)
+			self.task = None
+		self.executor.shutdown(wait=False)
@@ -0,0 +1,106 @@
+'''
+John Maurer
+
+Description: An offline tool that assembles the toon and every cog variant the
+same way the game does at runtime, flattens their static parts, and writes one
+bam per character to resources/baked, along with each cog head split out of its
+suit's head list and a heightfield of the terrain's floor. When those files
+are there, the game loads them instead of putting each character together
+piece by piece (or sampling the floor)
+
+Usage: python bake_assets.py [--output DIRECTORY]
+'''
+
+from panda3d.core import *
+from cog_catalog import getHeadParts
+import argparse
+import sys,os
+
+def bakeToon(toon, outputPath):
+	#The toon never swaps parts, so its whole body (head and hat included) can be flattened,
+	#which folds each part's color and texture into its Geoms as it merges them
+	legs = toon.toon.getPart('legs').copyTo(NodePath())
+	nodeCount = toon.toon.countNumDescendants()
+	legs.flattenStrong()
+	legs.writeBamFile(Filename.fromOsSpecific(outputPath))
+	return nodeCount, legs.countNumDescendants()
+
+def bakeCog(template, outputPath):
+	actor, head = template.instantiate()
+	body = actor.getPart('modelRoot').copyTo(NodePath())
+	nodeCount = body.countNumDescendants() + head.countNumDescendants()
+
+	#Write down the torso and leg bounds the collision boxes are sized from, since flattening merges those parts
+	for partName in ('torso', 'legs'):
+		part = body.find('**/' + partName)
+		partMin, partMax = part.getTightBounds()
+		values = list(partMin) + list(partMax) + list(part.getBounds().getCenter())
+		body.setTag(partName + 'Bounds', ' '.join(repr(value) for value in values))
+	body.flattenStrong()
+
+	#The head and its accessories are static, so flatten them under one node the game can find
+	head.flattenStrong()
+	cogHead = NodePath(ModelNode('cogHead'))
+	head.reparentTo(cogHead)
+	cogHead.reparentTo(body.find('**/def_head'))
+
+	body.writeBamFile(Filename.fromOsSpecific(outputPath))
+	actor.cleanup()
+	actor.removeNode()
+	return nodeCount, body.countNumDescendants()
+
+def bakeHeads(catalog, outputDirectory):
+	#Split every head (and accessory) the catalog uses out of its suit's head list into a file of its own,
+	#so a cog that isn't baked only has to load the head it wears
+	for suit, partNames in sorted(getHeadParts(catalog.specs).items()):
+		suitDirectory = os.path.join(outputDirectory, 'heads', suit)
+		if not os.path.isdir(suitDirectory):
+			os.makedirs(suitDirectory)
+		headList = loader.loadModel(catalog.getHeadListPath(suit))
+		for partName in partNames:
+			part = NodePath(ModelRoot(partName))
+			headList.find('**/' + partName).copyTo(part)
+			part.writeBamFile(Filename.fromOsSpecific(os.path.join(suitDirectory, partName + '.bam')))
+		print('suit {0}: {1} of {2} heads split out'.format(suit, len(partNames), headList.findAllMatches('*/*').getNumPaths()))
+
+def parseArguments(args=None):
+	parser = argparse.ArgumentParser(description='Bake the toon and every cog into prebuilt bam files')
+	parser.add_argument('--output', default=None, help='directory to write the baked files to (default resources/baked)')
+	return parser.parse_args(args)
+
+if __name__ == '__main__':
+	arguments = parseArguments()
+
+	#The assembly code needs a (windowless) ShowBase to load through
+	loadPrcFileData('', 'window-type none')
+	loadPrcFileData('', 'audio-library-name null')
+	from direct.showbase.ShowBase import ShowBase
+	from toon import Toon, BAKED_TOON
+	from cog_catalog import CogCatalog
+	from terrain_heightfield import buildHeightfield, BAKED_HEIGHTFIELD
+
+	base = ShowBase()
+	currentDirectory = os.path.abspath(sys.path[0])
+	pandaDirectory = Filename.fromOsSpecific(currentDirectory).getFullpath()
+	outputDirectory = arguments.output if arguments.output is not None else os.path.join(currentDirectory, 'resources', 'baked')
+	if not os.path.isdir(os.path.join(outputDirectory, 'cogs')):
+		os.makedirs(os.path.join(outputDirectory, 'cogs'))
+
+	#Assemble everything from the original pieces, never from an earlier bake
+	toon = Toon(base.taskMgr)
+	before, after = bakeToon(toon, os.path.join(outputDirectory, BAKED_TOON))
+	print('toon: {0} nodes -> {1}'.format(before, after))
+
+	#Baked cogs refer to the suit atlas by file, so save it next to them first
+	catalog = CogCatalog(pandaDirectory)
+	catalog.atlas.write(os.path.join(outputDirectory, 'cogs', 'suit_atlas.png'))
+	for template in catalog.templates:
+		before, after = bakeCog(template, os.path.join(outputDirectory, 'cogs', template.spec.name + '.bam'))
+		print('{0}: {1} nodes -> {2}'.format(template.spec.name, before, after))
+	bakeHeads(catalog, outputDirectory)
+
+	#Sample the floor in the terrain's own coordinate space, so the game can place the terrain however it likes
+	terrain = loader.loadModel(pandaDirectory + '/resources/terrain/CogGolfHub.bam')
+	heightfield = buildHeightfield(terrain.find('**/collision_floors'), terrain)
+	heightfield.write(os.path.join(outputDirectory, BAKED_HEIGHTFIELD))
+	print('terrain: {0} x {1} floor heights'.format(heightfield.columns, heightfield.rows))
@@ -0,0 +1,225 @@
+'''
+John Maurer
+
+Description: A benchmark suite that runs scripted scenarios (crowds of walking
+cogs, a sky full of pies, cogs being destroyed and spawned over and over) in a
+headless world on a fixed-step clock, and measures startup time, milliseconds per
+tick, collision time per tick, and peak memory. Results are written as JSON and
+checked against a stored baseline, failing if any of them got worse
+
+Usage: python benchmark.py [--scenario NAME ...] [--repeat N] [--baseline FILE] [--update-baseline]
+'''
+
+from panda3d.core import Point3
+import argparse
+import json
+import random
+import subprocess
+import sys,os
+import time
+
+#Peak memory comes from the operating system, where it can tell us
+try:
+	import resource
+except ImportError:
+	resource = None
+
+#Each scenario is the world to build, and what to keep doing to it every tick
+SCENARIOS = {
+	'walk-1': {'cogs': 1},
+	'walk-50': {'cogs': 50},
+	'walk-500': {'cogs': 500},
+	'pies-64': {'cogs': 10, 'pies': 64, 'driver': 'keepPiesFlying'},
+	'churn-50': {'cogs': 50, 'driver': 'churnCogs'}
+}
+
+#Every metric is better when it is lower; a result fails once it is worse than the baseline by more than its share
+METRIC_TOLERANCES = {
+	'startupSeconds': 0.25,
+	'msPerTick': 0.25,
+	'collisionMsPerTick': 0.25,
+	'peakMemoryMB': 0.10
+}
+
+#Lines from a scenario's process that carry its results start with this
+RESULT_PREFIX = 'BENCHMARK '
+
+DEFAULT_BASELINE = 'benchmark_baseline.json'
+DEFAULT_OUTPUT = 'benchmark_results.json'
+
+def getPeakMemoryMB():
+	if resource is None:
+		return None
+	#Linux reports kilobytes, macOS reports bytes
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	return peak / (1024.0 * 1024.0) if sys.platform == 'darwin' else peak / 1024.0
+
+def skipEntrances(pieThrow):
+	#Land every cog where it was headed and start it walking, so the scenario measures walking cogs from the first tick
+	for cog in pieThrow.waveManager.activeCogs:
+		cog.finishEntrance()
+
+def keepPiesFlying(pieThrow, tick):
+	#Throw every idle pie from the toon, fanned out all the way around it
+	pool = pieThrow.player.piePool
+	toonPos = pieThrow.player.toon.getPos(render)
+	origin = Point3(toonPos.getX(), toonPos.getY(), toonPos.getZ() + 3)
+	while pool.idlePies:
+		heading = (tick * 37 + len(pool.flyingPies) * 360.0 / len(pool.pies)) % 360
+		pool.launch(origin, (heading, 0, 80))
+
+def churnCogs(pieThrow, tick):
+	#Every few ticks, destroy the oldest cog and send in a new one
+	if tick % 5 != 0:
+		return
+	waveManager = pieThrow.waveManager
+	if waveManager.activeCogs:
+		waveManager.activeCogs[0].destruct()
+	waveManager.spawnCog((random.uniform(-15, 15), random.uniform(-15, 15)))
+
+def runScenario(name, warmupTicks, ticks, tickRate=60, seed=1):
+	#Runs in its own process, since there can only be one ShowBase (and peak memory is per process)
+	settings = SCENARIOS[name]
+	random.seed(seed)
+
+	startTime = time.perf_counter()
+	from main import PieThrow
+	pieThrow = PieThrow(headless=True, cogCount=settings['cogs'], tickRate=tickRate, pieCount=settings.get('pies', 8))
+	startupSeconds = time.perf_counter() - startTime
+	skipEntrances(pieThrow)
+
+	#Keep the scenario going from a task of its own, before everything else runs
+	driver = globals()[settings['driver']] if 'driver' in settings else None
+	if driver is not None:
+		def driveScenario(task):
+			driver(pieThrow, task.frame)
+			return task.cont
+		pieThrow.taskMgr.add(driveScenario, 'drive scenario', sort=-40)
+
+	#Only time the ticks after the warmup
+	pieThrow.runFixedSteps(warmupTicks, tickRate)
+	profiler = pieThrow.profiler
+	profiler.reset()
+	stats = pieThrow.runFixedSteps(ticks, tickRate)
+
+	snapshot = profiler.snapshot()
+	collisionMs = sum(snapshot['tasks'][taskName]['totalMs'] for taskName in ('collisionLoop', 'pie hits', 'collision batch') if taskName in snapshot['tasks'])
+	return {'cogs': len(pieThrow.waveManager.activeCogs),
+			'ticks': ticks,
+			'startupSeconds': startupSeconds,
+			'msPerTick': stats['wallSeconds'] * 1000 / ticks,
+			'p99MsPerTick': snapshot['frame']['p99Ms'],
+			'collisionMsPerTick': collisionMs / ticks,
+			'peakMemoryMB': getPeakMemoryMB()}
+
+def runScenarioProcess(name, warmupTicks, ticks):
+	#Run one scenario in a fresh Python, and pick its results out of everything the game printed
+	script = os.path.abspath(__file__)
+	process = subprocess.run([sys.executable, script, '--run-scenario', name, '--warmup', str(warmupTicks), '--ticks', str(ticks)],
+							cwd=os.path.dirname(script), stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+	for line in process.stdout.splitlines():
+		if line.startswith(RESULT_PREFIX):
+			return json.loads(line[len(RESULT_PREFIX):])
+	raise Exception('UH OH! Benchmark scenario ' + name + ' failed:\n' + process.stderr[-2000:])
+
+def getBestResult(runs):
+	#Timings only ever get slower from noise, so the best of a few runs is the fairest one to compare
+	best = dict(runs[0])
+	for run in runs[1:]:
+		for metric, value in run.items():
+			if isinstance(value, float) and (best[metric] is None or value < best[metric]):
+				best[metric] = value
+	return best
+
+def getBaselineRepeat(baseline, name):
+	#How many runs a scenario's baseline kept the best of (older baselines kept one count for every scenario)
+	return baseline['scenarios'][name].get('repeat', baseline.get('repeat', 1))
+
+def compareToBaseline(results, baseline, tolerances):
+	#Return a line for every metric that got worse than the baseline allows
+	regressions = []
+	for name, metrics in sorted(results.items()):
+		baselineMetrics = baseline.get(name)
+		if baselineMetrics is None:
+			continue
+		for metric, tolerance in sorted(tolerances.items()):
+			value = metrics.get(metric)
+			baselineValue = baselineMetrics.get(metric)
+			if value is None or not baselineValue:
+				continue
+			if value > baselineValue * (1 + tolerance):
+				regressions.append('{0} {1}: {2:.3f} against a baseline of {3:.3f} (+{4:.0f}%, {5:.0f}% allowed)'.format(
+					name, metric, value, baselineValue, (value / baselineValue - 1) * 100, tolerance * 100))
+	return regressions
+
+def parseArguments(args=None):
+	parser = argparse.ArgumentParser(description='Benchmark scripted Pie Throw scenarios')
+	parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help='scenario to run (default all of them; can be given more than once)')
+	parser.add_argument('--warmup', type=int, default=60, help='ticks to run before timing')
+	parser.add_argument('--ticks', type=int, default=300, help='ticks to time')
+	parser.add_argument('--output', default=DEFAULT_OUTPUT, help='JSON file to write the results to')
+	parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='JSON file of results to compare against')
+	parser.add_argument('--update-baseline', action='store_true', help='save these results as the new baseline instead of comparing')
+	parser.add_argument('--repeat', type=int, default=None,
+						help='runs of each scenario, keeping the best of each metric (default as many as the baseline kept, or 1)')
+	parser.add_argument('--tolerance', type=float, default=None, help='how much worse (0.25 is 25%%) any metric may get before failing')
+	parser.add_argument('--run-scenario', default=None, help=argparse.SUPPRESS)
+	return parser.parse_args(args)
+
+if __name__ == '__main__':
+	arguments = parseArguments()
+
+	#A scenario's own process: run it and hand the results back
+	if arguments.run_scenario is not None:
+		result = runScenario(arguments.run_scenario, arguments.warmup, arguments.ticks)
+		print(RESULT_PREFIX + json.dumps(result))
+		sys.exit(0)
+
+	#Compare like with like: run each scenario as many times as its baseline kept the best of
+	baseline = None
+	if not arguments.update_baseline and os.path.exists(arguments.baseline):
+		with open(arguments.baseline) as baselineFile:
+			baseline = json.load(baselineFile)
+
+	results = {}
+	for name in arguments.scenario or sorted(SCENARIOS):
+		repeat = max(1, arguments.repeat or 1)
+		if baseline is not None and name in baseline['scenarios']:
+			baselineRepeat = getBaselineRepeat(baseline, name)
+			if arguments.repeat is not None and arguments.repeat != baselineRepeat:
+				raise Exception('UH OH! The baseline kept the best of {0} runs of {1}, so it can\'t be compared against {2} '
+								'(leave out --repeat, or save a new baseline)'.format(baselineRepeat, name, arguments.repeat))
+			repeat = baselineRepeat
+		results[name] = getBestResult([runScenarioProcess(name, arguments.warmup, arguments.ticks) for run in range(repeat)])
+		results[name]['repeat'] = repeat
+		metrics = results[name]
+		print('{0:>10}: startup {1:6.2f}s, {2:8.2f} ms/tick (p99 {3:.2f}), collisions {4:8.2f} ms/tick, peak memory {5} MB'.format(
+			name, metrics['startupSeconds'], metrics['msPerTick'], metrics['p99MsPerTick'], metrics['collisionMsPerTick'],
+			'{0:.0f}'.format(metrics['peakMemoryMB']) if metrics['peakMemoryMB'] is not None else '?'))
+
+	report = {'python': sys.version.split()[0], 'platform': sys.platform, 'warmupTicks': arguments.warmup, 'ticks': arguments.ticks,
+			'scenarios': results}
+	with open(arguments.output, 'w') as outputFile:
+		json.dump(report, outputFile, indent=2, sort_keys=True)
+
+	#Either save a new baseline, or fail loudly if anything got slower or bigger
+	if arguments.update_baseline:
+		if os.path.exists(arguments.baseline):
+			with open(arguments.baseline) as baselineFile:
+				report['scenarios'] = dict(json.load(baselineFile)['scenarios'], **results)
+		with open(arguments.baseline, 'w') as baselineFile:
+			json.dump(report, baselineFile, indent=2, sort_keys=True)
+		print('Saved the baseline to ' + arguments.baseline)
+	elif baseline is not None:
+		tolerances = METRIC_TOLERANCES
+		if arguments.tolerance is not None:
+			tolerances = dict((metric, arguments.tolerance) for metric in METRIC_TOLERANCES)
+		regressions = compareToBaseline(results, baseline['scenarios'], tolerances)
+		if regressions:
+			print('PERFORMANCE REGRESSION against ' + arguments.baseline + ':')
+			for regression in regressions:
+				print('  ' + regression)
+			sys.exit(1)
+		print('No regressions against ' + arguments.baseline)
+	else:
+		print('No baseline at ' + arguments.baseline + ' (run with --update-baseline to save one)')
@@ -0,0 +1,115 @@
+'''
+John Maurer
+
+Description: A class that gives walking cogs a level of detail for their walk
+animation. Cogs near the player loop it as usual, cogs farther away are only
+posed every few frames (so their joints are only worked out again then), and
+cogs the camera can't see hold still until they come back into view
+'''
+
+from panda3d.core import *
+
+#How often (in frames) a walking cog's joints are updated, by its distance from the focus (None is any distance)
+LOD_TIERS = [(25, 1), (50, 2), (None, 4)]
+
+#Cogs the camera can't see
+FROZEN = 0
+
+#Rough radius of a cog, for testing whether the camera can see any of it
+COG_RADIUS = 6
+
+class AnimatedCog():
+	def __init__(self, cog, slot):
+		self.cog = cog
+		self.control = cog.cog.getAnimControl('walk')
+
+		#Frames between updates (1 means the control loops by itself), and which of those frames is this cog's
+		self.interval = 1
+		self.slot = slot
+
+		#When the walk would have started, had it looped the whole time (used while we pose it)
+		self.startTime = 0.0
+
+class CogAnimationLOD():
+	def __init__(self, taskMgr, focus, camera=None, tiers=LOD_TIERS):
+		self.taskMgr = taskMgr
+		self.tiers = tiers
+
+		#Distances are measured from the focus, and only a camera can decide a cog is off-screen
+		self.focus = focus
+		self.camera = camera
+
+		#Walking cogs whose animation we look after
+		self.animatedCogs = {}
+		self.nextSlot = 0
+
+		#Pose the cogs after they have walked, but before collisions and rendering update their joints
+		self.task = self.taskMgr.add(self.updateCogs, 'animate cogs', sort=10)
+
+	def addCog(self, cog):
+		#Called when a cog starts (or goes back to) looping its walk
+		if cog in self.animatedCogs:
+			self.animatedCogs[cog].interval = 1
+			return
+		self.animatedCogs[cog] = AnimatedCog(cog, self.nextSlot)
+		self.nextSlot += 1
+
+	def removeCog(self, cog):
+		#The cog is about to play something else (which takes over from the walk), so just forget it
+		self.animatedCogs.pop(cog, None)
+
+	def getInterval(self, animated, focusPos, lensBounds):
+		#Off-screen cogs don't animate at all
+		position = animated.cog.cog.getPos(render)
+		if lensBounds is not None:
+			sphere = BoundingSphere(self.camera.getRelativePoint(render, position), COG_RADIUS * animated.cog.scale)
+			if not lensBounds.contains(sphere):
+				return FROZEN
+
+		distance = (position - focusPos).length()
+		for tierDistance, interval in self.tiers:
+			if tierDistance is None or distance < tierDistance:
+				return interval
+		return self.tiers[-1][1]
+
+	def updateCogs(self, task):
+		if not self.animatedCogs:
+			return task.cont
+		now = globalClock.getFrameTime()
+		frame = globalClock.getFrameCount()
+		focusPos = self.focus.getPos(render)
+		lensBounds = None
+		if self.camera is not None:
+			lensBounds = self.camera.node().getLens().makeBounds()
+
+		for animated in self.animatedCogs.values():
+			control = animated.control
+			interval = self.getInterval(animated, focusPos, lensBounds)
+			frameRate = control.getFrameRate() * control.getPlayRate()
+
+			if interval != animated.interval:
+				if animated.interval == 1:
+					#Take the walk over from the control, holding it at the frame it had reached
+					animated.startTime = now - control.getFullFframe() / frameRate
+					control.pose(control.getFullFframe())
+				elif interval == 1:
+					#Hand the walk back, picking up where our posing left it
+					control.loop(False)
+				animated.interval = interval
+
+			#Pose the cog at the frame the walk would be on by now, on this cog's turn only
+			if animated.interval > 1 and (frame + animated.slot) % animated.interval == 0:
+				control.pose(((now - animated.startTime) * frameRate) % control.getNumFrames())
+
+		return task.cont
+
+	def getStats(self):
+		#How many walking cogs are on each update interval (0 is off-screen)
+		counts = {}
+		for animated in self.animatedCogs.values():
+			counts[animated.interval] = counts.get(animated.interval, 0) + 1
+		return counts
+
+	def destroy(self):
+		self.taskMgr.remove(self.task)
+		self.animatedCogs = {}
@@ -0,0 +1,333 @@
+'''
+John Maurer
+
+Description: A table of every cog that can be spawned, resolved once into
+prepared templates so that picking and building a cog is a constant amount of work
+'''
+
+from direct.actor.Actor import Actor
+from panda3d.core import *
+from asset_cache import getAssetCache
+from suit_atlas import SuitAtlas
+from collections import namedtuple
+import random
+import os
+
+#Everything needed to build one cog. Colors are (r, g, b, a) tuples or None
+CogSpec = namedtuple('CogSpec', ['name', 'suit', 'head', 'headTexture', 'headColor', 'accessories',
+								'handColor', 'scale', 'department', 'weight'])
+
+def cogSpec(name, suit, head, department, scale, handColor=None, headTexture=None, headColor=None,
+			accessories=(), weight=1):
+	return CogSpec(name, suit, head, headTexture, headColor, accessories,
+					handColor, scale, department, weight)
+
+#Models and animations for each suit type
+SUIT_MODELS = {
+	'A': ('tt_a_ene_cga_zero.bam', 'suitA-heads.bam', {
+		'neutral': 'tt_a_ene_cga_neutral.bam',
+		'walk': 'tt_a_ene_cga_walk.bam',
+		'finger wag': 'tt_a_ene_cga_fingerwag.bam',
+		'landing': 'tt_a_ene_cga_landing.bam',
+		'hit': 'tt_a_ene_cga_pie-small.bam'}),
+	'B': ('tt_a_ene_cgb_zero.bam', 'suitB-heads.bam', {
+		'neutral': 'tt_a_ene_cgb_neutral.bam',
+		'walk': 'tt_a_ene_cgb_walk.bam',
+		'finger wag': 'tt_a_ene_cgb_finger-wag.bam',
+		'landing': 'tt_a_ene_cgb_landing.bam',
+		'hit': 'tt_a_ene_cgb_pie-small.bam'}),
+	'C': ('tt_a_ene_cgc_zero.bam', 'suitC-heads.bam', {
+		'neutral': 'tt_a_ene_cgc_neutral.bam',
+		'walk': 'tt_a_ene_cgc_walk.bam',
+		'finger wag': 'tt_a_ene_cgc_finger-wag.bam',
+		'landing': 'tt_a_ene_cgc_landing.bam',
+		'hit': 'tt_a_ene_cgc_pie-small.bam'})
+}
+
+#Blazer, sleeve, and leg textures for each department (in that order, which is also each part's atlas column)
+DEPARTMENT_TEXTURES = {
+	'sell': ('s_blazer.jpg', 's_sleeve.jpg', 's_leg.jpg'),
+	'cash': ('m_blazer.jpg', 'm_sleeve.jpg', 'm_leg.jpg'),
+	'law': ('l_blazer.jpg', 'l_sleeve.jpg', 'l_leg.jpg'),
+	'boss': ('c_blazer.jpg', 'c_sleeve.jpg', 'c_leg.jpg')
+}
+
+#Models every cog uses whatever its suit, in resources/cogs/models
+LIFE_METER_MODEL = 'matching_game_gui.bam'
+LIFE_METER_GLOW_MODEL = 'glow.bam'
+PROPELLER_MODEL = 'propeller-mod.bam'
+PROPELLER_ANIM = 'propeller-chan.bam'
+
+#Num cogs in suits
+#A - 14
+#B - 9
+#C - 9
+COG_SPECS = [
+	#Suit A
+	cogSpec('backstabber', 'A', 'backstabber', 'law', 0.9, (0.75, 0.75, 0.95, 1)),
+	cogSpec('bigcheese', 'A', 'bigcheese', 'boss', 1.3, (0.65, 0.95, 0.85, 1)),
+	cogSpec('bigwig', 'A', 'bigwig', 'law', 1.3, (0.75, 0.75, 0.95, 1)),
+	cogSpec('headhunter', 'A', 'headhunter', 'boss', 1.2, (0.95, 0.75, 0.75, 1)),
+	cogSpec('legaleagle', 'A', 'legaleagle', 'law', 1.3, (0.3, 0.3, 0.55, 1)),
+	cogSpec('numbercruncher', 'A', 'numbercruncher', 'cash', 1, (0.65, 0.95, 0.85, 1)),
+	cogSpec('namedropper', 'A', 'numbercruncher', 'sell', 0.9, (0.95, 0.75, 0.95, 1), headTexture='name-dropper.jpg'),
+	cogSpec('pennypincher', 'A', 'pennypincher', 'cash', 0.8, (0.98, 0.55, 0.56, 1)),
+	cogSpec('yesman', 'A', 'yesman', 'boss', 0.9, (0.95, 0.75, 0.75, 1)),
+	cogSpec('robberbaron', 'A', 'yesman', 'cash', 1.3, (0.65, 0.95, 0.85, 1), headTexture='robber-baron.jpg'),
+	cogSpec('mrhollywood', 'A', 'yesman', 'sell', 1.3, (0.95, 0.75, 0.95, 1)),
+	cogSpec('twoface', 'A', 'twoface', 'sell', 1, (0.95, 0.75, 0.95, 1)),
+	cogSpec('mingler', 'A', 'twoface', 'sell', 1.1, (0.95, 0.75, 0.95, 1), headTexture='mingler.jpg'),
+	cogSpec('doubletalker', 'A', 'twoface', 'law', 0.9, (0.75, 0.75, 0.95, 1), headTexture='double-talker.jpg'),
+
+	#Suit B
+	cogSpec('ambulancechaser', 'B', 'ambulancechaser', 'law', 1, (0.75, 0.75, 0.95, 1)),
+	cogSpec('beancounter', 'B', 'beancounter', 'cash', 0.9, (0.65, 0.95, 0.85, 1)),
+	cogSpec('downsizer', 'B', 'beancounter', 'boss', 0.9, (0.95, 0.75, 0.75, 1)),
+	cogSpec('loanshark', 'B', 'loanshark', 'cash', 1.3, (0.65, 0.95, 0.85, 1)),
+	cogSpec('movershaker', 'B', 'movershaker', 'sell', 1, (0.95, 0.75, 0.95, 1)),
+	cogSpec('bloodsucker', 'B', 'movershaker', 'law', 0.8, headTexture='blood-sucker.jpg'),
+	cogSpec('pencilpusher', 'B', 'pencilpusher', 'boss', 0.8, (0.95, 0.75, 0.75, 1)),
+	cogSpec('telemarketer', 'B', 'telemarketer', 'sell', 0.8, (0.95, 0.75, 0.95, 1)),
+	cogSpec('spindoctor', 'B', 'telemarketer', 'law', 1.1, (0.65, 0.95, 0.85, 1), headTexture='spin-doctor.jpg'),
+
+	#Suit C
+	cogSpec('shortchange', 'C', 'coldcaller', 'cash', 1.1, (0.65, 0.95, 0.85, 1)),
+	cogSpec('coldcaller', 'C', 'coldcaller', 'sell', 1.1, (0.09, 0.48, 0.95, 1), headColor=(0, 0, 255, 1)),
+	cogSpec('flunky', 'C', 'flunky', 'boss', 1.1, (0.95, 0.75, 0.75, 1), accessories=('glasses',)),
+	cogSpec('corporateraider', 'C', 'flunky', 'boss', 1.7, (0.98, 0.55, 0.56, 1), headTexture='corporate-raider.jpg'),
+	cogSpec('gladhander', 'C', 'gladhander', 'sell', 1.2, (0.95, 0.75, 0.95, 1)),
+	cogSpec('micromanager', 'C', 'micromanager', 'boss', 0.7, (0.95, 0.75, 0.75, 1)),
+	cogSpec('moneybags', 'C', 'moneybags', 'cash', 1.5, (0.65, 0.95, 0.85, 1)),
+	cogSpec('tightwad', 'C', 'tightwad', 'cash', 1.3, (0.65, 0.95, 0.85, 1)),
+	cogSpec('bottomfeeder', 'C', 'tightwad', 'law', 1.1, (0.75, 0.75, 0.95, 1), headTexture='bottom-feeder.jpg')
+]
+
+def getBakedCogPath(bakedDirectory, spec):
+	#The baked cog for this spec, if there is a baked directory and the cog has been baked into it
+	if bakedDirectory is None:
+		return None
+	path = bakedDirectory + '/cogs/' + spec.name + '.bam'
+	return path if os.path.exists(Filename(path).toOsSpecific()) else None
+
+def getBakedHeadPath(bakedDirectory, suit, partName):
+	#A head (or accessory) split out of its suit's head list by bake_assets.py, if it has been
+	if bakedDirectory is None:
+		return None
+	path = bakedDirectory + '/heads/' + suit + '/' + partName + '.bam'
+	return path if os.path.exists(Filename(path).toOsSpecific()) else None
+
+def getHeadParts(specs):
+	#The heads and accessories each suit type needs for these specs
+	headParts = {}
+	for spec in specs:
+		headParts.setdefault(spec.suit, set()).update((spec.head,) + tuple(spec.accessories))
+	return dict((suit, sorted(partNames)) for suit, partNames in headParts.items())
+
+def getCatalogAssets(pandaDirectory, specs=COG_SPECS, bakedDirectory=None):
+	#Every model (and animation) and texture file a catalog of these specs loads, for reading them ahead of time
+	cogDirectory = pandaDirectory + '/resources/cogs/'
+	models = [LIFE_METER_MODEL, LIFE_METER_GLOW_MODEL, PROPELLER_MODEL, PROPELLER_ANIM]
+	animations = []
+	textures = []
+	for suit in sorted(set(spec.suit for spec in specs)):
+		modelName, headsName, anims = SUIT_MODELS[suit]
+		models.append(modelName)
+		animations += list(anims.values())
+	for department in sorted(set(spec.department for spec in specs)):
+		textures += list(DEPARTMENT_TEXTURES[department])
+	textures += sorted(set(spec.headTexture for spec in specs if spec.headTexture is not None))
+	bakedModels = [path for path in (getBakedCogPath(bakedDirectory, spec) for spec in specs) if path is not None]
+
+	#Heads are only needed for cogs that aren't baked, and then only the split out ones (or the whole list if they aren't)
+	unbakedSpecs = [spec for spec in specs if getBakedCogPath(bakedDirectory, spec) is None]
+	for suit, partNames in sorted(getHeadParts(unbakedSpecs).items()):
+		headPaths = [getBakedHeadPath(bakedDirectory, suit, partName) for partName in partNames]
+		if None in headPaths:
+			models.append(SUIT_MODELS[suit][1])
+		else:
+			bakedModels += headPaths
+	return ([cogDirectory + 'models/' + name for name in models] + bakedModels + [cogDirectory + 'animations/' + name for name in animations],
+			[cogDirectory + 'textures/' + name for name in textures])
+
+class WeightedPicker():
+	def __init__(self, weights):
+		#Build Vose's alias table so that every pick is a single random draw and two lookups
+		self.count = len(weights)
+		if self.count == 0:
+			raise Exception('UH OH! Cannot pick from an empty list of weights!')
+
+		total = float(sum(weights))
+		scaled = [weight * self.count / total for weight in weights]
+		self.probability = [0.0] * self.count
+		self.alias = [0] * self.count
+
+		small = [index for index, value in enumerate(scaled) if value < 1.0]
+		large = [index for index, value in enumerate(scaled) if value >= 1.0]
+		while small and large:
+			less = small.pop()
+			more = large.pop()
+			self.probability[less] = scaled[less]
+			self.alias[less] = more
+			scaled[more] = (scaled[more] + scaled[less]) - 1.0
+			if scaled[more] < 1.0:
+				small.append(more)
+			else:
+				large.append(more)
+
+		#Whatever is left over is (up to rounding) exactly 1
+		for index in small + large:
+			self.probability[index] = 1.0
+
+	def pick(self, rng=random):
+		#Pick a column, then flip a biased coin between it and its alias
+		value = rng.random() * self.count
+		column = int(value)
+		if value - column < self.probability[column]:
+			return column
+		return self.alias[column]
+
+class CogTemplate():
+	def __init__(self, spec, suitActor, getHeadPart, textures, bakedModel=None, anims=None, atlas=None):
+		self.spec = spec
+
+		self.textures = textures
+		self.atlas = atlas
+
+		#A baked cog comes with its department, hands, and head already in place
+		if bakedModel is not None:
+			self.initBaked(bakedModel, anims)
+			return
+		self.baked = False
+
+		#Copy the suit Actor (sharing its animations) and bake in this cog's department and hands
+		self.actor = Actor(other=suitActor)
+		self.dress(self.actor)
+
+		#Hold only this cog's own head (getHeadPart gives a detached copy of one part of the suit's heads) and dress it up
+		self.head = getHeadPart(spec.suit, spec.head)
+		if spec.headTexture is not None:
+			self.head.setTexture(textures[spec.headTexture], 1)
+		if spec.headColor is not None:
+			self.head.setColor(*spec.headColor)
+		for accessory in spec.accessories:
+			getHeadPart(spec.suit, accessory).reparentTo(self.head)
+
+	def initBaked(self, bakedModel, anims):
+		self.baked = True
+		self.actor = Actor(bakedModel, anims, copy=False)
+		self.head = self.actor.find('**/cogHead')
+
+	@property
+	def poolKey(self):
+		#Cogs of the same suit type can be redressed as each other, but a baked cog's colors are part of its model
+		return self.spec.name if self.baked else self.spec.suit
+
+	def dress(self, actor):
+		#Apply this cog's department textures and hand color to an Actor of the same suit
+		for partIndex, partName in enumerate(('torso', 'arms', 'legs')):
+			for part in actor.findAllMatches('**/' + partName):
+				if self.atlas is not None:
+					self.atlas.apply(part, self.spec.department, partIndex)
+				else:
+					part.setTexture(self.textures[self.spec.department][partIndex], 1)
+
+		#The hands are untextured and (nearly) white, so tinting them gives the same color as setting it,
+		#and leaves every cog's hands with the same state apart from the tint
+		hands = actor.find('**/hands')
+		hands.clearColor()
+		hands.clearColorScale()
+		if self.spec.handColor is not None:
+			hands.setColorScale(*self.spec.handColor)
+
+	def instantiate(self):
+		#Return a fresh Actor and head for a new cog
+		if self.baked:
+			actor = Actor(other=self.actor)
+			return actor, actor.find('**/cogHead')
+		return Actor(other=self.actor), self.instantiateHead()
+
+	def instantiateHead(self):
+		return self.head.copyTo(NodePath())
+
+class CogCatalog():
+	def __init__(self, pandaDirectory, specs=COG_SPECS, bakedDirectory=None, useAtlas=True):
+		self.pandaDirectory = pandaDirectory
+		self.bakedDirectory = bakedDirectory
+		self.specs = list(specs)
+		self.assetCache = getAssetCache()
+
+		#Load every texture once
+		self.textures = {}
+		for department, names in DEPARTMENT_TEXTURES.items():
+			self.textures[department] = tuple(self.loadTexture(name) for name in names)
+		for spec in self.specs:
+			if spec.headTexture is not None and spec.headTexture not in self.textures:
+				self.textures[spec.headTexture] = self.loadTexture(spec.headTexture)
+
+		#Pack the department textures into one atlas, so every suit shares a texture
+		self.atlas = SuitAtlas(dict((department, self.textures[department]) for department in DEPARTMENT_TEXTURES)) if useAtlas else None
+
+		#Load every suit type that is actually used once
+		self.suitActors = {}
+		self.suitAnims = {}
+		for suit in set(spec.suit for spec in self.specs):
+			modelName, headsName, anims = SUIT_MODELS[suit]
+			self.suitAnims[suit] = dict((animName, self.pandaDirectory + '/resources/cogs/animations/' + fileName)
+										for animName, fileName in anims.items())
+			self.suitActors[suit] = self.assetCache.loadActor(self.pandaDirectory + '/resources/cogs/models/' + modelName,
+																self.suitAnims[suit])
+
+		#Resolve every spec into a ready-to-copy template, using its baked model if there is one.
+		#Whole head lists are only loaded if a template needs a head that hasn't been split out,
+		#and are let go of as soon as the templates have their copies
+		self.headLists = {}
+		self.templates = [self.makeTemplate(spec) for spec in self.specs]
+		self.releaseHeadLists()
+		self.templatesByName = dict((template.spec.name, template) for template in self.templates)
+		self.picker = WeightedPicker([spec.weight for spec in self.specs])
+
+	def makeTemplate(self, spec):
+		bakedPath = getBakedCogPath(self.bakedDirectory, spec)
+		bakedModel = self.assetCache.loadModel(bakedPath) if bakedPath is not None else None
+		return CogTemplate(spec, self.suitActors[spec.suit], self.getHeadPart, self.textures,
+							bakedModel, self.suitAnims[spec.suit], self.atlas)
+
+	def getHeadPart(self, suit, partName):
+		#A detached copy of one head (or accessory), from its own file if it was split out of the suit's heads
+		headPath = getBakedHeadPath(self.bakedDirectory, suit, partName)
+		if headPath is not None:
+			part = self.assetCache.loadModel(headPath).find('**/' + partName)
+		else:
+			if suit not in self.headLists:
+				self.headLists[suit] = self.assetCache.loadModel(self.getHeadListPath(suit))
+			part = self.headLists[suit].find('**/' + partName)
+		if part.isEmpty():
+			raise Exception('UH OH! There is no ' + partName + ' head for suit ' + suit + '!')
+		return part.copyTo(NodePath())
+
+	def getHeadListPath(self, suit):
+		return self.pandaDirectory + '/resources/cogs/models/' + SUIT_MODELS[suit][1]
+
+	def releaseHeadLists(self):
+		#Drop every head of the suits we loaded whole, including the copies kept by the asset cache and the model pool
+		for suit in self.headLists:
+			self.assetCache.releaseModel(self.getHeadListPath(suit))
+		self.headLists = {}
+
+	def loadTexture(self, fileName):
+		return self.assetCache.loadTexture(self.pandaDirectory + '/resources/cogs/textures/' + fileName)
+
+	def pickTemplate(self, rng=random):
+		return self.templates[self.picker.pick(rng)]
+
+	def getTemplate(self, name):
+		return self.templatesByName[name]
+
+#The catalog is shared by every cog in the process
+sharedCatalog = None
+
+def getCogCatalog(pandaDirectory, bakedDirectory=None):
+	global sharedCatalog
+	if sharedCatalog is None:
+		sharedCatalog = CogCatalog(pandaDirectory, bakedDirectory=bakedDirectory)
+	return sharedCatalog
@@ -0,0 +1,58 @@
+'''
+John Maurer
+
+Description: A uniform grid over the map that keeps track of which cells the
+live cogs are standing in, so nearby cogs can be found without checking every cog
+'''
+
+import math
+
+class CogGrid():
+	def __init__(self, cellSize=10):
+		self.cellSize = float(cellSize)
+
+		#Cogs in each occupied cell (kept in dictionaries rather than sets, so they come back
+		#in the order they arrived, the same in every run), and the cell each cog is in
+		self.cells = {}
+		self.cogCells = {}
+
+	def cellAt(self, x, y):
+		return (int(math.floor(x / self.cellSize)), int(math.floor(y / self.cellSize)))
+
+	def updateCog(self, cog, x, y):
+		self.moveCog(cog, self.cellAt(x, y))
+
+	def moveCog(self, cog, cell):
+		#Only touch the cells when the cog actually crosses into a new one
+		oldCell = self.cogCells.get(cog)
+		if oldCell == cell:
+			return
+		if oldCell is not None:
+			self.discard(cog, oldCell)
+		self.cells.setdefault(cell, {})[cog] = None
+		self.cogCells[cog] = cell
+
+	def removeCog(self, cog):
+		oldCell = self.cogCells.pop(cog, None)
+		if oldCell is not None:
+			self.discard(cog, oldCell)
+
+	def discard(self, cog, cell):
+		occupants = self.cells[cell]
+		occupants.pop(cog, None)
+		if not occupants:
+			del self.cells[cell]
+
+	def query(self, x, y, radius):
+		#Yield every cog in the cells overlapping the square around the point
+		minX, minY = self.cellAt(x - radius, y - radius)
+		maxX, maxY = self.cellAt(x + radius, y + radius)
+		for cellX in range(minX, maxX + 1):
+			for cellY in range(minY, maxY + 1):
+				occupants = self.cells.get((cellX, cellY))
+				if occupants:
+					for cog in occupants:
+						yield cog
+
+	def __len__(self):
+		return len(self.cogCells)
@@ -0,0 +1,115 @@
+'''
+John Maurer
+
+Description: A class that adds up the memory held by cogs: their scene graph
+nodes and joints, the vertices and textures they draw with, and the animation
+tables they play from. A tally remembers everything it has already counted, so
+data that cogs share with each other (or with the catalog) is only counted once
+'''
+
+from panda3d.core import *
+
+#Rough bytes for each scene graph node and joint, which Panda doesn't report
+NODE_BYTES = 512
+JOINT_BYTES = 256
+
+#Animation tables hold one float per frame for each component that moves
+TABLE_ENTRY_BYTES = 4
+TABLE_COMPONENTS = 'ijkabcrhpxyz'
+
+class MemoryTally():
+	def __init__(self, counted=None):
+		#Pointers to every node, array, texture, and bundle counted so far (on top of those another tally has counted)
+		self.seen = set()
+		self.counted = counted
+
+		self.nodes = 0
+		self.joints = 0
+		self.vertices = 0
+		self.vertexBytes = 0
+		self.textures = 0
+		self.textureBytes = 0
+		self.animations = 0
+		self.animationBytes = 0
+
+	def isNew(self, pandaObject):
+		#Python wrappers come and go, so tell objects apart by the pointer they wrap
+		pointer = pandaObject.this
+		if pointer in self.seen or (self.counted is not None and pointer in self.counted.seen):
+			return False
+		self.seen.add(pointer)
+		return True
+
+	def addNodePath(self, root):
+		#Count the nodes under root (root included), and the geometry and textures they draw with
+		for nodePath in root.findAllMatches('**'):
+			node = nodePath.node()
+			if not self.isNew(node):
+				continue
+			self.nodes += 1
+			if isinstance(node, GeomNode):
+				for geom in node.getGeoms():
+					self.addVertexData(geom.getVertexData())
+		for texture in root.findAllTextures():
+			if self.isNew(texture):
+				self.textures += 1
+				self.textureBytes += texture.estimateTextureMemory()
+
+	def addVertexData(self, vertexData):
+		#Copies of a model get their own vertex data, but keep sharing its arrays
+		for arrayIndex in range(vertexData.getNumArrays()):
+			arrayData = vertexData.getArray(arrayIndex)
+			if self.isNew(arrayData):
+				if arrayIndex == 0:
+					self.vertices += arrayData.getNumRows()
+				self.vertexBytes += arrayData.getDataSizeBytes()
+
+	def addActor(self, actor):
+		#An Actor's nodes, plus each part's joints and the animations it plays
+		self.addNodePath(actor)
+		for partName in actor.getPartNames():
+			bundle = actor.getPartBundle(partName)
+			if self.isNew(bundle):
+				self.joints += self.countGroups(bundle)
+			for animName in actor.getAnimNames():
+				#Only count animations that are already in memory (asking the Actor for them would load them)
+				animModel = ModelPool.getModel(Filename(actor.getAnimFilename(animName, partName)), False)
+				if animModel is None:
+					continue
+				anim = NodePath(animModel).find('**/+AnimBundleNode').node().getBundle()
+				if self.isNew(anim):
+					self.animations += 1
+					self.animationBytes += self.getAnimBytes(anim)
+
+	def measureActor(self, actor):
+		#What adding the actor would add to the tally, without adding it (a tally of just this actor, skipping
+		#whatever this one has already counted)
+		tally = MemoryTally(self)
+		tally.addActor(actor)
+		return tally.getBytes()
+
+	def countGroups(self, group):
+		return sum(1 + self.countGroups(group.getChild(index)) for index in range(group.getNumChildren()))
+
+	def getAnimBytes(self, group):
+		size = 0
+		if isinstance(group, AnimChannelMatrixXfmTable):
+			size += sum(len(group.getTable(component)) for component in TABLE_COMPONENTS) * TABLE_ENTRY_BYTES
+		for index in range(group.getNumChildren()):
+			size += self.getAnimBytes(group.getChild(index))
+		return size
+
+	def getBytes(self):
+		return (self.nodes * NODE_BYTES + self.joints * JOINT_BYTES + self.vertexBytes
+				+ self.textureBytes + self.animationBytes)
+
+	def getStats(self):
+		return {'nodes': self.nodes,
+				'joints': self.joints,
+				'vertices': self.vertices,
+				'vertexBytes': self.vertexBytes,
+				'textures': self.textures,
+				'textureBytes': self.textureBytes,
+				'animations': self.animations,
+				'animationBytes': self.animationBytes,
+				'totalBytes': self.getBytes()}
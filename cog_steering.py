@@ -0,0 +1,162 @@
+'''
+John Maurer
+
+Description: A class that walks every walking cog towards the nearest player from
+a single task, computing all of the headings and steps at once with NumPy. With a
+navigation grid, cogs that can't head straight for their toon follow the toon's
+flow field around the walls instead. Walking cogs are kept apart by a crowd separation
+pass rather than by pushing off each other in the collision traverser
+'''
+
+from panda3d.core import *
+from crowd_separation import CrowdSeparation
+import numpy
+import math
+
+#Cogs head straight for their toon unless the flow field turns them further away from it than this
+FLOW_COSINE = math.cos(math.radians(45))
+
+class CogSteering():
+	def __init__(self, taskMgr, player, grid=None, heightfield=None, navGrid=None, separation=None, crowd=None):
+		self.taskMgr = taskMgr
+		self.player = player
+		self.grid = grid
+
+		#Toons the cogs chase (each cog goes after whichever is nearest)
+		self.targets = [player]
+		self.heightfield = heightfield
+		self.navGrid = navGrid
+
+		#Keeps walking cogs from walking into each other, and into the rest of the crowd (every cog in the world,
+		#so walkers go around the cogs that are landing or reeling from a hit, which stand their ground)
+		self.separation = separation if separation is not None else CrowdSeparation()
+		self.crowd = crowd
+
+		#Walking cogs, and where each one sits in the list so it can be removed quickly
+		self.walkingCogs = []
+		self.cogIndices = {}
+
+		#How far each cog walks per frame, and how wide it is, rebuilt only when the list changes
+		self.steps = numpy.zeros(0)
+		self.radii = numpy.zeros(0)
+		self.stepsAreStale = False
+
+		#The grid cell each walking cog was in last frame
+		self.cells = numpy.zeros((0, 2), dtype=int)
+
+		#One task walks every cog
+		self.task = self.taskMgr.add(self.walkCogs, 'walking cogs')
+
+	def addCog(self, cog):
+		if cog in self.cogIndices:
+			return
+		self.cogIndices[cog] = len(self.walkingCogs)
+		self.walkingCogs.append(cog)
+		self.stepsAreStale = True
+
+	def removeCog(self, cog):
+		#Swap the last cog into the removed cog's place
+		index = self.cogIndices.pop(cog, None)
+		if index is None:
+			return
+		lastCog = self.walkingCogs.pop()
+		if lastCog is not cog:
+			self.walkingCogs[index] = lastCog
+			self.cogIndices[lastCog] = index
+		self.stepsAreStale = True
+
+	def walkCogs(self, task):
+		if not self.walkingCogs:
+			return task.cont
+
+		#Walking in the cog's own coordinate space means the step grows with the cog's scale
+		if self.stepsAreStale:
+			self.steps = numpy.array([cog.speed * cog.scale for cog in self.walkingCogs])
+			self.radii = numpy.array([cog.torsoSize.getX() * 0.5 * cog.scale for cog in self.walkingCogs])
+			self.cells = numpy.full((len(self.walkingCogs), 2), numpy.iinfo(int).min)
+			self.stepsAreStale = False
+
+		#Gather every cog's position
+		positions = numpy.array([tuple(cog.cog.getPos()) for cog in self.walkingCogs])
+		targets = numpy.array([tuple(toon.toon.getPos(render)) for toon in self.targets])
+		if len(self.targets) == 1:
+			nearest = numpy.zeros(len(positions), dtype=int)
+			target = targets[0]
+		else:
+			nearest = ((positions[:, None, :2] - targets[None, :, :2]) ** 2).sum(axis=2).argmin(axis=1)
+			target = targets[nearest]
+
+		#Look at the toon... (the same heading and pitch lookAt would give)
+		offsets = target - positions
+		flatDistances = numpy.hypot(offsets[:, 0], offsets[:, 1])
+		if self.navGrid is not None:
+			self.followFlowFields(positions, offsets, flatDistances, targets, nearest)
+		distances = numpy.sqrt(flatDistances * flatDistances + offsets[:, 2] * offsets[:, 2])
+		headings = numpy.degrees(numpy.arctan2(-offsets[:, 0], offsets[:, 1]))
+		pitches = numpy.degrees(numpy.arctan2(offsets[:, 2], flatDistances))
+
+		#Then walk towards them! (a cog standing on the toon stays put)
+		moving = distances > 0
+		scales = numpy.where(moving, self.steps / numpy.where(moving, distances, 1), 0)
+		positions += offsets * scales[:, None]
+
+		#Nudge cogs that walked into each other (or into a cog that isn't walking) apart
+		positions[:, :2] += self.separateCrowd(positions)
+
+		#Keep every cog standing on the floor
+		if self.heightfield is not None:
+			positions[:, 2] = self.heightfield.getHeights(positions[:, 0], positions[:, 1], positions[:, 2])
+
+		#Write every transform back
+		for cog, position, heading, pitch in zip(self.walkingCogs, positions.tolist(), headings.tolist(), pitches.tolist()):
+			cog.cog.setPosHpr(position[0], position[1], position[2], heading, pitch, 0)
+
+		#Only refile the cogs that walked into a new grid cell
+		if self.grid is not None:
+			cells = numpy.floor(positions[:, :2] / self.grid.cellSize).astype(int)
+			for index in numpy.nonzero((cells != self.cells).any(axis=1))[0].tolist():
+				self.grid.moveCog(self.walkingCogs[index], (int(cells[index, 0]), int(cells[index, 1])))
+			self.cells = cells
+
+		return task.cont
+
+	def separateCrowd(self, positions):
+		#How far to push each walking cog, with the cogs that aren't walking in the way as fixed obstacles
+		standing = [cog for cog in self.crowd if cog not in self.cogIndices] if self.crowd is not None else []
+		if not standing:
+			return self.separation.getPushes(positions[:, :2], self.radii)
+		walkingCount = len(positions)
+		crowdPositions = numpy.concatenate([positions[:, :2], numpy.array([tuple(cog.cog.getPos())[:2] for cog in standing])])
+		crowdRadii = numpy.concatenate([self.radii, [cog.torsoSize.getX() * 0.5 * cog.scale for cog in standing]])
+		fixed = numpy.arange(len(crowdPositions)) >= walkingCount
+		return self.separation.getPushes(crowdPositions, crowdRadii, fixed)[:walkingCount]
+
+	def followFlowFields(self, positions, offsets, flatDistances, targets, nearest):
+		#The cogs chasing a toon all share its field (only worked out again once the toon walks into another cell)
+		for targetIndex in numpy.unique(nearest).tolist():
+			field = self.navGrid.getFlowField(targets[targetIndex, 0], targets[targetIndex, 1])
+			if field is None:
+				continue
+			chasing = numpy.nonzero(nearest == targetIndex)[0]
+			directions, known = field.getDirections(positions[chasing, 0], positions[chasing, 1])
+
+			#Only turn the cogs the field sends well away from the straight line (walls are in the way), keeping how far
+			#they are from the toon, so they walk the same step and look at the toon's height
+			distances = flatDistances[chasing]
+			straight = offsets[chasing, :2] / numpy.where(distances > 0, distances, 1)[:, None]
+			turning = known & ((directions * straight).sum(axis=1) < FLOW_COSINE)
+			offsets[chasing[turning], :2] = directions[turning] * distances[turning, None]
+
+	def addTarget(self, toon):
+		if toon not in self.targets:
+			self.targets.append(toon)
+
+	def removeTarget(self, toon):
+		#There is always someone to chase
+		if toon in self.targets and len(self.targets) > 1:
+			self.targets.remove(toon)
+
+	def destroy(self):
+		self.taskMgr.remove(self.task)
+		self.walkingCogs = []
+		self.cogIndices = {}
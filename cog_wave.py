@@ -0,0 +1,212 @@
+'''
+John Maurer
+
+Description: A class that spawns waves of cogs, keeping a pool of destroyed
+cogs for each suit type so that they can be reset and reused instead of rebuilt,
+and (given a memory budget) only building new cogs while there is room for them
+'''
+
+from panda3d.core import *
+from random_cog import RandomCog
+from cog_grid import CogGrid
+from cog_animation import CogAnimationLOD
+from cog_memory import MemoryTally
+from timer_wheel import TimerWheel
+import random
+
+#Batched steering needs NumPy; without it every cog walks on its own task
+try:
+	from cog_steering import CogSteering
+except ImportError:
+	CogSteering = None
+
+class CogWaveManager():
+	def __init__(self, taskMgr, cTrav, wallHandler, enemyMaskBit, wallMaskBit, player, catalog, maxHealth=10, speed=0.05, camera=None, heightfield=None,
+				memoryBudgetMB=None, navGrid=None, terrainWallMaskBit=None, toonMaskBit=None):
+		#Everything a new cog needs
+		self.taskMgr = taskMgr
+		self.cTrav = cTrav
+		self.wallHandler = wallHandler
+		self.enemyMaskBit = enemyMaskBit
+		self.wallMaskBit = wallMaskBit
+		self.terrainWallMaskBit = terrainWallMaskBit
+		self.toonMaskBit = toonMaskBit
+		self.player = player
+		self.catalog = catalog
+		self.maxHealth = maxHealth
+		self.speed = speed
+		self.heightfield = heightfield
+		self.navGrid = navGrid
+
+		#Cogs in the world, and destroyed cogs waiting to be reused (by suit type, or by cog for baked cogs)
+		self.activeCogs = []
+		self.pools = dict((template.poolKey, []) for template in self.catalog.templates)
+
+		#File live cogs in a grid, and walk every cog from one task when possible (keeping walkers clear of every live cog)
+		self.grid = CogGrid()
+		self.steering = (CogSteering(self.taskMgr, self.player, self.grid, self.heightfield, self.navGrid, crowd=self.activeCogs)
+						if CogSteering is not None else None)
+
+		#Run every cog's timed transitions and life meter blinks from one timer wheel
+		self.timerWheel = TimerWheel(self.taskMgr)
+		
+		#Walk far (or unseen) cogs at a lower animation detail, measured from the camera if there is one
+		self.animationLOD = CogAnimationLOD(self.taskMgr, camera if camera is not None else self.player.toon, camera)
+
+		#Keep spawning waves of this size whenever a wave is cleared (0 means off)
+		self.waveSize = 0
+		self.waveCenter = (5, 5)
+		self.waveRadius = 0
+		self.wavesSpawned = 0
+
+		#Counters to make sure a warm pool really stops building Actors
+		self.cogsBuilt = 0
+		self.cogsRecycled = 0
+		self.cogsDestroyed = 0
+
+		#Every cog sent in gets an id of its own (a recycled cog gets a new one), so others can tell cogs apart
+		self.nextCogId = 0
+
+		#Memory held by every cog built so far (pooled cogs keep theirs), and what the last cog of each pool added to it.
+		#Once the budget is spent, new cogs have to come out of the pools
+		self.memoryBudget = memoryBudgetMB * 1024 * 1024 if memoryBudgetMB is not None else None
+		self.memoryTally = MemoryTally()
+		self.buildBytes = {}
+
+		#The most a cog has ever held beyond its template's Actor (its propeller and so on), to estimate kinds not built yet
+		self.extraBytes = 0
+		self.cogsRefused = 0
+
+	def prewarm(self, countPerPool):
+		#Build cogs up front and park them in the pools so spawning later never builds an Actor
+		for poolKey, pool in self.pools.items():
+			templates = [template for template in self.catalog.templates if template.poolKey == poolKey]
+			while len(pool) < countPerPool:
+				cog = self.buildCog(random.choice(templates), (0, 0))
+				cog.removeFromWorld()
+				pool.append(cog)
+
+	def buildCog(self, template, pos):
+		templateBytes = self.memoryTally.measureActor(template.actor) if self.memoryBudget is not None else None
+		cog = RandomCog(self.taskMgr, self.enemyMaskBit, self.wallMaskBit, self.player, self.maxHealth, self.speed,
+						self.catalog, template, pos, self.heightfield, self.timerWheel)
+		cog.onDestroyed = self.releaseCog
+		cog.steering = self.steering
+		cog.animationLOD = self.animationLOD
+		cog.grid = self.grid
+		cog.grid.updateCog(cog, pos[0], pos[1])
+		self.cogsBuilt += 1
+
+		#The first cog of a kind also pays for what it shares with the rest of its kind
+		usedBytes = self.memoryTally.getBytes()
+		cog.tallyMemory(self.memoryTally)
+		self.buildBytes[template.poolKey] = self.memoryTally.getBytes() - usedBytes
+		if templateBytes is not None:
+			self.extraBytes = max(self.extraBytes, self.buildBytes[template.poolKey] - templateBytes)
+		return cog
+
+	def estimateBuildBytes(self, template):
+		#What building a cog of this kind would add: what the last one added, or for a kind that hasn't been built yet,
+		#whatever its template's Actor holds that isn't tallied yet, plus the most any cog has held beyond that
+		buildBytes = self.buildBytes.get(template.poolKey)
+		if buildBytes is not None:
+			return buildBytes
+		return self.memoryTally.measureActor(template.actor) + self.extraBytes
+
+	def canBuild(self, template):
+		if self.memoryBudget is None:
+			return True
+		return self.memoryTally.getBytes() + self.estimateBuildBytes(template) <= self.memoryBudget
+
+	def spawnCog(self, pos=(5, 5), template=None):
+		#Pick a cog, reusing a destroyed one of the same suit type if there is one
+		if template is None:
+			template = self.catalog.pickTemplate()
+
+			#Over the memory budget, a random cog can be any cog that is waiting in a pool
+			if not self.pools[template.poolKey] and not self.canBuild(template):
+				pooledTemplates = [pooled for pooled in self.catalog.templates if self.pools[pooled.poolKey]]
+				if pooledTemplates:
+					template = random.choice(pooledTemplates)
+
+		#There is no cog to spare without going over the budget
+		pool = self.pools[template.poolKey]
+		if not pool and not self.canBuild(template):
+			self.cogsRefused += 1
+			return None
+
+		if pool:
+			cog = pool.pop()
+			cog.recycle(template, pos)
+			self.cogsRecycled += 1
+		else:
+			cog = self.buildCog(template, pos)
+		cog.cogId = self.nextCogId
+		self.nextCogId += 1
+
+		#Let the cog's torso push off walls and toons (just the terrain's walls and the toons, when the steering keeps
+		#the cogs apart, so the traverser never tests cogs against each other)
+		if self.steering is not None and self.terrainWallMaskBit is not None and self.toonMaskBit is not None:
+			cog.cogTorsoBox.node().setFromCollideMask(BitMask32.bit(self.terrainWallMaskBit) | BitMask32.bit(self.toonMaskBit))
+		self.wallHandler.addCollider(cog.cogTorsoBox, cog.cog)
+		self.cTrav.addCollider(cog.cogTorsoBox, self.wallHandler)
+
+		self.activeCogs.append(cog)
+		return cog
+
+	def spawnWave(self, count, center=(5, 5), radius=0):
+		#Scatter the wave around the center point
+		self.wavesSpawned += 1
+		cogs = []
+		for index in range(count):
+			x = center[0] + random.uniform(-radius, radius)
+			y = center[1] + random.uniform(-radius, radius)
+			cog = self.spawnCog((x, y))
+			if cog is not None:
+				cogs.append(cog)
+		return cogs
+
+	def startWaves(self, waveSize, center=(5, 5), radius=15):
+		#Spawn a wave now, and another every time one is cleared
+		self.waveSize = waveSize
+		self.waveCenter = center
+		self.waveRadius = radius
+		return self.spawnWave(self.waveSize, self.waveCenter, self.waveRadius)
+
+	def stopWaves(self):
+		self.waveSize = 0
+
+	def releaseCog(self, cog):
+		#Take the cog out of collisions and hand it back to its pool
+		self.cTrav.removeCollider(cog.cogTorsoBox)
+		self.wallHandler.removeCollider(cog.cogTorsoBox)
+		self.activeCogs.remove(cog)
+		self.pools[cog.template.poolKey].append(cog)
+		self.cogsDestroyed += 1
+
+		#Send in the next wave if this one is cleared
+		if self.waveSize > 0 and not self.activeCogs:
+			self.spawnWave(self.waveSize, self.waveCenter, self.waveRadius)
+
+	def addTarget(self, toon):
+		#Another toon for the cogs to chase (cogs walking on their own tasks only ever chase the player)
+		if self.steering is not None:
+			self.steering.addTarget(toon)
+
+	def removeTarget(self, toon):
+		if self.steering is not None:
+			self.steering.removeTarget(toon)
+
+	def getStats(self):
+		return {'active': len(self.activeCogs),
+				'pooled': sum(len(pool) for pool in self.pools.values()),
+				'built': self.cogsBuilt,
+				'recycled': self.cogsRecycled,
+				'destroyed': self.cogsDestroyed,
+				'refused': self.cogsRefused,
+				'waves': self.wavesSpawned,
+				'memory': self.memoryTally.getStats(),
+				'animation': self.animationLOD.getStats(),
+				'timers': self.timerWheel.getStats(),
+				'navigation': self.navGrid.getStats() if self.navGrid is not None else None,
+				'crowd': self.steering.separation.getStats() if self.steering is not None else None}
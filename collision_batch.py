@@ -0,0 +1,105 @@
+'''
+John Maurer
+
+Description: Classes that gather a frame's collisions from a queue handler (and
+from any detector that reports into them) and hand them to the game once per
+frame, as one list of contacts for each kind of collider, instead of throwing a
+named event through the messenger for every contact
+'''
+
+from panda3d.core import *
+
+class CollisionCategory():
+	def __init__(self, name, onBatch, newOnly=True):
+		#onBatch is called with the frame's list of entries, if there are any
+		self.name = name
+		self.onBatch = onBatch
+
+		#Only pass on contacts that weren't there last frame (like an in pattern), keyed by (from, into) node
+		self.newOnly = newOnly
+		self.contacts = set()
+
+		#Entries reported this frame
+		self.entries = []
+
+		#Totals, to see how much the batching saves
+		self.entryCount = 0
+		self.batchCount = 0
+
+	def add(self, entry):
+		self.entries.append(entry)
+
+	def takeBatch(self):
+		entries = self.entries
+		self.entries = []
+		if self.newOnly:
+			contacts = set()
+			newEntries = []
+			for entry in entries:
+				contact = (entry.getFromNodePath().getKey(), entry.getIntoNodePath().getKey())
+				if contact not in self.contacts and contact not in contacts:
+					newEntries.append(entry)
+				contacts.add(contact)
+			self.contacts = contacts
+			entries = newEntries
+		return entries
+
+class CollisionBatcher():
+	def __init__(self, taskMgr, traverser, sort=36):
+		self.taskMgr = taskMgr
+		self.traverser = traverser
+
+		#Every collider we add reports into one queue, and each collider belongs to a category
+		self.queue = CollisionHandlerQueue()
+		self.categories = {}
+		self.colliders = {}
+		self.colliderCategories = {}
+
+		#Hand out the batches after the traverser (and any detectors that run after it) have found this frame's contacts
+		self.task = self.taskMgr.add(self.sendBatches, 'collision batch', sort=sort)
+
+	def addCategory(self, name, onBatch, newOnly=True):
+		#Categories are sent their batches in the order they were added
+		if name in self.categories:
+			raise Exception('UH OH! There is already a collision category called ' + name + '!')
+		category = CollisionCategory(name, onBatch, newOnly)
+		self.categories[name] = category
+		return category
+
+	def addCollider(self, collider, categoryName):
+		#The traverser reports the collider's contacts into our queue, and we file them under the category
+		self.colliders[collider.getKey()] = collider
+		self.colliderCategories[collider.getKey()] = self.categories[categoryName]
+		self.traverser.addCollider(collider, self.queue)
+
+	def removeCollider(self, collider):
+		self.traverser.removeCollider(collider)
+		self.colliders.pop(collider.getKey(), None)
+		self.colliderCategories.pop(collider.getKey(), None)
+
+	def sendBatches(self, task):
+		#Sort the traverser's contacts by the category of the collider they came from
+		colliderCategories = self.colliderCategories
+		for entry in self.queue.getEntries():
+			category = colliderCategories.get(entry.getFromNodePath().getKey())
+			if category is not None:
+				category.entries.append(entry)
+		self.queue.clearEntries()
+
+		for category in self.categories.values():
+			entries = category.takeBatch()
+			if entries:
+				category.entryCount += len(entries)
+				category.batchCount += 1
+				category.onBatch(entries)
+		return task.cont
+
+	def getStats(self):
+		return dict((name, {'entries': category.entryCount, 'batches': category.batchCount})
+					for name, category in self.categories.items())
+
+	def destroy(self):
+		self.taskMgr.remove(self.task)
+		for collider in list(self.colliders.values()):
+			self.removeCollider(collider)
+		self.categories = {}
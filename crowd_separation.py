@@ -0,0 +1,103 @@
+'''
+John Maurer
+
+Description: Keeps a crowd of walking cogs from piling into each other. The cogs
+are sorted into a uniform grid of cells as wide as the widest pair of cogs, so
+each cog is only checked against the cogs in its own and the eight neighboring
+cells, and every push is worked out in one batched NumPy pass
+'''
+
+import numpy
+
+#Cells are packed into one key (column * KEY_SPAN + row), offset so every key is positive
+KEY_SPAN = 1 << 20
+KEY_OFFSET = 1 << 19
+
+#The cell itself and its eight neighbors, as key offsets
+NEIGHBOR_KEYS = numpy.array([columnOffset * KEY_SPAN + rowOffset for columnOffset in (-1, 0, 1) for rowOffset in (-1, 0, 1)])
+
+#Cogs standing right on top of each other split along a direction picked from the first cog's index, stepping by
+#this many radians (the golden angle) so neighboring pairs don't split the same way
+SPLIT_ANGLE = 2.399963
+
+class CrowdSeparation():
+	def __init__(self, stiffness=0.25, maxPush=0.2):
+		#How much of each overlap is pushed apart per frame, and the furthest a cog is pushed in one frame
+		#(so a crowd spreads out over a few frames rather than jumping apart)
+		self.stiffness = stiffness
+		self.maxPush = maxPush
+
+		#Totals, to see how much work the crowd takes
+		self.passes = 0
+		self.pairsTested = 0
+		self.overlaps = 0
+
+	def findPairs(self, positions, cellSize):
+		#Every pair of cogs in the same or neighboring cells (just once, the lower index first)
+		cells = numpy.floor(positions / cellSize).astype(numpy.int64) + KEY_OFFSET
+		keys = cells[:, 0] * KEY_SPAN + cells[:, 1]
+		order = numpy.argsort(keys, kind='stable')
+		sortedKeys = keys[order]
+
+		#Where each cog's neighboring cells start and end in the sorted cogs
+		neighborKeys = (keys[:, None] + NEIGHBOR_KEYS[None, :]).ravel()
+		starts = numpy.searchsorted(sortedKeys, neighborKeys, 'left')
+		counts = numpy.searchsorted(sortedKeys, neighborKeys, 'right') - starts
+
+		#Spell every range out into pairs
+		total = int(counts.sum())
+		cogs = numpy.repeat(numpy.arange(len(positions)).repeat(len(NEIGHBOR_KEYS)), counts)
+		withinRange = numpy.arange(total) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+		neighbors = order[numpy.repeat(starts, counts) + withinRange]
+		once = cogs < neighbors
+		return cogs[once], neighbors[once]
+
+	def getPushes(self, positions, radii, fixed=None):
+		#How far (in X and Y) to push each cog so it stops overlapping its neighbors, given where they are and how wide each one is.
+		#Fixed cogs (a boolean for each cog) push the others away but are never pushed themselves
+		count = len(positions)
+		if count < 2:
+			return numpy.zeros((count, 2))
+		if fixed is None:
+			fixed = numpy.zeros(count, dtype=bool)
+		cogs, neighbors = self.findPairs(positions, 2 * radii.max())
+		xs = positions[:, 0]
+		ys = positions[:, 1]
+		offsetXs = xs[cogs] - xs[neighbors]
+		offsetYs = ys[cogs] - ys[neighbors]
+		distances = numpy.hypot(offsetXs, offsetYs)
+		overlaps = radii[cogs] + radii[neighbors] - distances
+		overlapping = numpy.nonzero((overlaps > 0) & ~(fixed[cogs] & fixed[neighbors]))[0]
+		self.passes += 1
+		self.pairsTested += len(cogs)
+		self.overlaps += len(overlapping)
+
+		#Push the two of each overlapping pair straight away from each other (a pair standing right on top of
+		#each other splits along a direction picked from the pair). A cog up against a fixed one takes both shares
+		cogs, neighbors = cogs[overlapping], neighbors[overlapping]
+		offsetXs, offsetYs, distances, overlaps = offsetXs[overlapping], offsetYs[overlapping], distances[overlapping], overlaps[overlapping]
+		stacked = distances == 0
+		if stacked.any():
+			angles = cogs[stacked] * SPLIT_ANGLE
+			offsetXs[stacked] = numpy.cos(angles)
+			offsetYs[stacked] = numpy.sin(angles)
+			distances[stacked] = 1.0
+		strengths = overlaps * self.stiffness / distances
+		cogShares = numpy.where(fixed[cogs], 0.0, numpy.where(fixed[neighbors], 2.0, 1.0))
+		neighborShares = numpy.where(fixed[neighbors], 0.0, numpy.where(fixed[cogs], 2.0, 1.0))
+		pushXs = offsetXs * strengths
+		pushYs = offsetYs * strengths
+		pushes = numpy.zeros((count, 2))
+		pushes[:, 0] = numpy.bincount(cogs, pushXs * cogShares, count) - numpy.bincount(neighbors, pushXs * neighborShares, count)
+		pushes[:, 1] = numpy.bincount(cogs, pushYs * cogShares, count) - numpy.bincount(neighbors, pushYs * neighborShares, count)
+
+		#A cog deep in a crowd is only pushed so far each frame
+		lengths = numpy.hypot(pushes[:, 0], pushes[:, 1])
+		tooFar = lengths > self.maxPush
+		pushes[tooFar] *= (self.maxPush / lengths[tooFar])[:, None]
+		return pushes
+
+	def getStats(self):
+		return {'passes': self.passes,
+				'pairsTested': self.pairsTested,
+				'overlaps': self.overlaps}
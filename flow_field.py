@@ -0,0 +1,270 @@
+'''
+John Maurer
+
+Description: A navigation grid over the terrain, built once from its floor
+heights and wall collision polygons (and saved, so it's only built again when
+the walls or floor change), and flow fields over it: how far every open cell is
+from a target, spread out from the target's cell. Each field is shared by every
+cog chasing that target, and only worked out again when the target moves into
+another cell, so pathing costs the same however many cogs follow it
+'''
+
+from panda3d.core import *
+from wall_bvh import getWallSignature, getWorldSolids
+from array import array
+from collections import OrderedDict
+import hashlib
+import math
+import struct
+import os
+
+#Spreading a field out needs NumPy; building and saving the grid doesn't
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+#What the file starts with: a tag, the signature of what it was built from, the origin, the cell size, and how many cells there are each way
+NAV_GRID_HEADER = struct.Struct('<4s32sfffii')
+NAV_GRID_TAG = b'NAVG'
+
+#Bumped whenever the way grids are built changes, so saved grids get built again
+NAV_GRID_VERSION = 1
+
+#The navigation grid saved by the game, in the baked directory
+BAKED_NAV_GRID = 'terrain_nav.bin'
+
+#A wall blocks a cell if it reaches from below this height above the floor to above the step height
+#(anything lower can be stepped over, anything higher can be walked under)
+CLIMB_HEIGHT = 4.0
+STEP_HEIGHT = 0.5
+
+#Polygons that face up or down more than this are floors and ceilings, not walls
+WALL_NORMAL_Z = 0.7
+
+#The eight neighbors of a cell, and the unit step towards each
+NEIGHBORS = [(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1)]
+
+def getBakedNavGridPath(bakedDirectory):
+	#Where the navigation grid lives (whether or not it has been saved yet)
+	if bakedDirectory is None:
+		return None
+	return bakedDirectory + '/' + BAKED_NAV_GRID
+
+def getNavSignature(heightfield, wallNodes, cellSize, clearance):
+	#Sums up everything a grid is built from, so a saved grid is only used for the same terrain
+	signature = hashlib.md5()
+	signature.update(repr((NAV_GRID_VERSION, cellSize, clearance, heightfield.originX, heightfield.originY, heightfield.cellSize,
+							heightfield.columns, heightfield.rows, heightfield.offsetX, heightfield.offsetY, heightfield.scale)).encode())
+	signature.update(heightfield.signature)
+	signature.update(getWallSignature(wallNodes).encode())
+	return signature.hexdigest().encode()
+
+def buildNavGrid(heightfield, wallNodes, cellSize=3.0, clearance=1, signature=b''):
+	#Cover the floor with cells (in world space), open wherever there is floor and no wall
+	originX = heightfield.originX * heightfield.scale + heightfield.offsetX
+	originY = heightfield.originY * heightfield.scale + heightfield.offsetY
+	columns = int(math.ceil((heightfield.columns - 1) * heightfield.cellSize * heightfield.scale / cellSize))
+	rows = int(math.ceil((heightfield.rows - 1) * heightfield.cellSize * heightfield.scale / cellSize))
+	floors = [heightfield.getHeight(originX + (column + 0.5) * cellSize, originY + (row + 0.5) * cellSize)
+				for row in range(rows) for column in range(columns)]
+
+	#Trace every wall polygon's outline across the cells it stands in
+	walls = set()
+	for wallNode in wallNodes:
+		for solid in getWorldSolids(wallNode):
+			if not isinstance(solid, CollisionPolygon) or abs(solid.getNormal()[2]) > WALL_NORMAL_Z:
+				continue
+			points = solid.getPoints()
+			bottom = min(point[2] for point in points)
+			top = max(point[2] for point in points)
+			for index in range(len(points)):
+				start = points[index]
+				end = points[(index + 1) % len(points)]
+				samples = int(math.hypot(end[0] - start[0], end[1] - start[1]) / (cellSize * 0.5)) + 1
+				for sample in range(samples + 1):
+					x = start[0] + (end[0] - start[0]) * sample / samples
+					y = start[1] + (end[1] - start[1]) * sample / samples
+					column = int(math.floor((x - originX) / cellSize))
+					row = int(math.floor((y - originY) / cellSize))
+					if column < 0 or row < 0 or column >= columns or row >= rows:
+						continue
+					floor = floors[row * columns + column]
+					if floor is None or (bottom < floor + CLIMB_HEIGHT and top > floor + STEP_HEIGHT):
+						walls.add((column, row))
+
+	#Keep cogs a cell or so away from the walls, so they don't scrape along them
+	blocked = set()
+	for column, row in walls:
+		for rowOffset in range(-clearance, clearance + 1):
+			for columnOffset in range(-clearance, clearance + 1):
+				blocked.add((column + columnOffset, row + rowOffset))
+	walkable = array('B', [0]) * (columns * rows)
+	for row in range(rows):
+		for column in range(columns):
+			if floors[row * columns + column] is not None and (column, row) not in blocked:
+				walkable[row * columns + column] = 1
+	return NavGrid(originX, originY, cellSize, columns, rows, walkable, signature)
+
+def loadNavGrid(path, signature):
+	#The saved grid, if there is one and it was built from this same terrain
+	if path is None or not os.path.exists(Filename(path).toOsSpecific()):
+		return None
+	with open(Filename(path).toOsSpecific(), 'rb') as navFile:
+		tag, savedSignature, originX, originY, cellSize, columns, rows = NAV_GRID_HEADER.unpack(navFile.read(NAV_GRID_HEADER.size))
+		if tag != NAV_GRID_TAG:
+			raise Exception('UH OH! ' + path + ' is not a navigation grid!')
+		if savedSignature != signature:
+			return None
+		walkable = array('B')
+		walkable.fromfile(navFile, columns * rows)
+	return NavGrid(originX, originY, cellSize, columns, rows, walkable, signature)
+
+def getNavGrid(heightfield, wallNodes, path=None, cellSize=3.0, clearance=1):
+	#Load the saved grid, or build it (and save it for next time)
+	signature = getNavSignature(heightfield, wallNodes, cellSize, clearance)
+	navGrid = loadNavGrid(path, signature)
+	if navGrid is None:
+		navGrid = buildNavGrid(heightfield, wallNodes, cellSize, clearance, signature)
+		if path is not None:
+			directory = os.path.dirname(Filename(path).toOsSpecific())
+			if not os.path.isdir(directory):
+				os.makedirs(directory)
+			navGrid.write(Filename(path).toOsSpecific())
+	return navGrid
+
+class NavGrid():
+	def __init__(self, originX, originY, cellSize, columns, rows, walkable, signature=b'', maxFields=32):
+		#Open cells (1) and blocked ones (0), row by row, in world space
+		self.originX = originX
+		self.originY = originY
+		self.cellSize = cellSize
+		self.columns = columns
+		self.rows = rows
+		self.walkable = walkable
+		self.signature = signature
+
+		#Fields by the cell they lead to, the most recently used last (targets come back to cells they've been in)
+		self.fields = OrderedDict()
+		self.maxFields = maxFields
+		self.padded = None
+
+		#Totals, to see how often fields are worked out
+		self.fieldsBuilt = 0
+		self.fieldHits = 0
+		self.levelsSpread = 0
+
+	def cellAt(self, x, y):
+		return int(math.floor((x - self.originX) / self.cellSize)), int(math.floor((y - self.originY) / self.cellSize))
+
+	def isWalkable(self, column, row):
+		return 0 <= column < self.columns and 0 <= row < self.rows and self.walkable[row * self.columns + column] == 1
+
+	def findOpenCell(self, column, row, reach=3):
+		#The cell itself if it is open, or the nearest open cell around it (targets can stand closer to walls than cogs may)
+		for distance in range(reach + 1):
+			for rowOffset in range(-distance, distance + 1):
+				for columnOffset in range(-distance, distance + 1):
+					if max(abs(rowOffset), abs(columnOffset)) == distance and self.isWalkable(column + columnOffset, row + rowOffset):
+						return column + columnOffset, row + rowOffset
+		return None
+
+	def getFlowField(self, x, y):
+		#The field leading to the cell the point is in (None if there is no open cell near it)
+		cell = self.findOpenCell(*self.cellAt(x, y))
+		if cell is None:
+			return None
+		field = self.fields.get(cell)
+		if field is not None:
+			self.fields.move_to_end(cell)
+			self.fieldHits += 1
+			return field
+		if self.padded is None:
+			if numpy is None:
+				raise Exception('UH OH! Flow fields need NumPy!')
+			#Open cells with a blocked border around them, so spreading never wraps around an edge
+			self.padded = numpy.zeros((self.rows + 2, self.columns + 2), dtype=bool)
+			self.padded[1:-1, 1:-1] = numpy.frombuffer(self.walkable, dtype=numpy.uint8).reshape(self.rows, self.columns) == 1
+		field = self.fields[cell] = FlowField(self, cell)
+		self.fieldsBuilt += 1
+		if len(self.fields) > self.maxFields:
+			self.fields.popitem(last=False)
+		return field
+
+	def getStats(self):
+		return {'cells': self.columns * self.rows,
+				'walkable': sum(self.walkable),
+				'fields': len(self.fields),
+				'built': self.fieldsBuilt,
+				'hits': self.fieldHits,
+				'levels': self.levelsSpread}
+
+	def write(self, path):
+		#path is an OS path, like the other files the game saves
+		with open(path, 'wb') as navFile:
+			navFile.write(NAV_GRID_HEADER.pack(NAV_GRID_TAG, self.signature, self.originX, self.originY, self.cellSize, self.columns, self.rows))
+			self.walkable.tofile(navFile)
+
+class FlowField():
+	def __init__(self, navGrid, cell):
+		self.navGrid = navGrid
+		self.cell = cell
+
+		#Steps (through open cells, moving along rows and columns) from every cell reached so far to the target, -1 where
+		#the spread hasn't got to yet. The field only spreads as far as someone needs it to, and picks up from there later
+		shape = navGrid.padded.shape
+		self.distances = numpy.full(shape, -1, dtype=numpy.int32)
+		self.unvisited = navGrid.padded.copy()
+		self.frontier = numpy.zeros(shape, dtype=bool)
+		self.frontier[cell[1] + 1, cell[0] + 1] = True
+		self.unvisited[cell[1] + 1, cell[0] + 1] = False
+		self.distances[cell[1] + 1, cell[0] + 1] = 0
+		self.level = 0
+		self.box = (cell[1] + 1, cell[1] + 1, cell[0] + 1, cell[0] + 1)
+		self.growing = True
+
+		#Flat offsets to each neighbor in the padded grid, and the unit step towards each
+		width = shape[1]
+		self.neighborOffsets = numpy.array([rowOffset * width + columnOffset for columnOffset, rowOffset in NEIGHBORS])
+		steps = numpy.array(NEIGHBORS, dtype=float)
+		self.neighborSteps = steps / numpy.hypot(steps[:, 0], steps[:, 1])[:, None]
+
+	def spread(self, indices):
+		#Spread out a ring at a time until every one of the (flat, padded) cells has been reached, or there's nowhere left to go
+		#(each ring can only be one cell further out than the last, so only that box of the grid is looked at)
+		distances = self.distances.ravel()
+		lastRow = self.distances.shape[0] - 2
+		lastColumn = self.distances.shape[1] - 2
+		while self.growing and (distances[indices] < 0).any():
+			top, bottom, left, right = self.box
+			top, bottom, left, right = max(1, top - 1), min(lastRow, bottom + 1), max(1, left - 1), min(lastColumn, right + 1)
+			frontier = self.frontier
+			ring = (frontier[top - 1:bottom, left:right + 1] | frontier[top + 1:bottom + 2, left:right + 1]
+					| frontier[top:bottom + 1, left - 1:right] | frontier[top:bottom + 1, left + 1:right + 2])
+			ring &= self.unvisited[top:bottom + 1, left:right + 1]
+			self.unvisited[top:bottom + 1, left:right + 1] &= ~ring
+			self.level += 1
+			self.distances[top:bottom + 1, left:right + 1][ring] = self.level
+			self.frontier = numpy.zeros_like(frontier)
+			self.frontier[top:bottom + 1, left:right + 1] = ring
+			self.box = (top, bottom, left, right)
+			self.growing = ring.any()
+			self.navGrid.levelsSpread += 1
+
+	def getDirections(self, xs, ys):
+		#Which way to walk from each point (unit X and Y), and whether the field knows (off the grid, blocked
+		#or cut off cells, and the target's own cell, are left to walk straight)
+		navGrid = self.navGrid
+		columns = numpy.floor((xs - navGrid.originX) / navGrid.cellSize).astype(int)
+		rows = numpy.floor((ys - navGrid.originY) / navGrid.cellSize).astype(int)
+		inside = (columns >= 0) & (rows >= 0) & (columns < navGrid.columns) & (rows < navGrid.rows)
+		indices = numpy.where(inside, (rows + 1) * self.distances.shape[1] + columns + 1, 0)
+		distances = self.distances.ravel()
+		self.spread(indices[inside & navGrid.padded.ravel()[indices]])
+
+		#Step to whichever neighbor is closest to the target
+		neighborDistances = distances[indices[None, :] + self.neighborOffsets[:, None]]
+		neighborDistances = numpy.where(neighborDistances < 0, numpy.iinfo(numpy.int32).max, neighborDistances)
+		best = neighborDistances.argmin(axis=0)
+		known = inside & (distances[indices] > 0) & (neighborDistances[best, numpy.arange(len(best))] < distances[indices])
+		return self.neighborSteps[best], known
@@ -0,0 +1,203 @@
+'''
+John Maurer
+
+Description: A class that records where each frame's time goes, per task and per
+phase of the frame (intervals, collision traversal, event dispatch, rendering...),
+keeping rolling percentiles and a count of collision pairs. Snapshots can be
+exported as JSON or CSV
+'''
+
+from panda3d.core import *
+from collections import deque
+import json
+import csv
+import time
+
+#The phase of the frame each of ShowBase's own tasks belongs to (every other task is game logic)
+TASK_PHASES = {
+	'resetPrevTransform': 'input',
+	'dataLoop': 'input',
+	'eventManager': 'events',
+	'ivalLoop': 'intervals',
+	'collisionLoop': 'collisions',
+	'garbageCollectStates': 'render',
+	'igLoop': 'render',
+	'audioLoop': 'audio'
+}
+GAME_PHASE = 'game'
+
+#Columns written to a CSV snapshot
+CSV_COLUMNS = ['kind', 'name', 'calls', 'frames', 'totalMs', 'meanMs', 'p50Ms', 'p90Ms', 'p99Ms', 'maxMs']
+
+class RollingStat():
+	def __init__(self, historySize):
+		#Totals since the start, plus the per-frame times of the last few frames for percentiles
+		self.calls = 0
+		self.frames = 0
+		self.totalTime = 0.0
+		self.history = deque(maxlen=historySize)
+
+	def record(self, elapsedTime, calls):
+		self.calls += calls
+		self.frames += 1
+		self.totalTime += elapsedTime
+		self.history.append(elapsedTime)
+
+	def percentiles(self, fractions):
+		#Sorting only happens here, so recording a frame stays cheap
+		samples = sorted(self.history)
+		if not samples:
+			return [0] * len(fractions)
+		return [samples[min(len(samples) - 1, int(fraction * len(samples)))] for fraction in fractions]
+
+	def summarize(self):
+		p50, p90, p99, maximum = self.percentiles((0.5, 0.9, 0.99, 1.0))
+		return {'calls': self.calls,
+				'frames': self.frames,
+				'totalMs': self.totalTime * 1000,
+				'meanMs': self.totalTime * 1000 / self.frames if self.frames else 0.0,
+				'p50Ms': p50 * 1000,
+				'p90Ms': p90 * 1000,
+				'p99Ms': p99 * 1000,
+				'maxMs': maximum * 1000}
+
+class FrameProfiler():
+	def __init__(self, taskMgr, historySize=600):
+		self.taskMgr = taskMgr
+		self.historySize = historySize
+
+		#Rolling stats for whole frames, each phase, and each task name
+		self.frameStat = RollingStat(historySize)
+		self.phaseStats = {}
+		self.taskStats = {}
+
+		#Time and calls for each task name during the current frame
+		self.frameTimes = {}
+		self.frameCalls = {}
+
+		#Collision pairs seen, by (from, into) name, since the start and during the current frame
+		self.collisionPairs = {}
+		self.frameCollisions = 0
+		self.collisionStat = RollingStat(historySize)
+
+		#Time every task that already exists, and every task added from now on
+		self.originalAdd = self.taskMgr.add
+		self.originalDoMethodLater = self.taskMgr.doMethodLater
+		self.taskMgr.add = self.addTask
+		self.taskMgr.doMethodLater = self.doMethodLater
+		for task in self.taskMgr.getTasks():
+			self.timeTask(task)
+
+		#Close out each frame after everything else has run
+		self.lastFrameTime = None
+		self.task = self.originalAdd(self.endFrame, 'frame profiler', sort=1000)
+
+	def addTask(self, *args, **kwargs):
+		return self.timeTask(self.originalAdd(*args, **kwargs))
+
+	def doMethodLater(self, *args, **kwargs):
+		return self.timeTask(self.originalDoMethodLater(*args, **kwargs))
+
+	def timeTask(self, task):
+		#Wrap the task's function so every run adds its wall time under the task's name
+		if not isinstance(task, PythonTask) or task.getFunction() is None:
+			return task
+		name = task.getName()
+		function = task.getFunction()
+		frameTimes = self.frameTimes
+		frameCalls = self.frameCalls
+		perfCounter = time.perf_counter
+
+		def timedFunction(*args):
+			startTime = perfCounter()
+			result = function(*args)
+			frameTimes[name] = frameTimes.get(name, 0.0) + (perfCounter() - startTime)
+			frameCalls[name] = frameCalls.get(name, 0) + 1
+			return result
+
+		task.setFunction(timedFunction)
+		return task
+
+	def reset(self):
+		#Forget everything recorded so far (such as a warmup), keeping the timing in place
+		self.frameStat = RollingStat(self.historySize)
+		self.phaseStats.clear()
+		self.taskStats.clear()
+		self.collisionPairs.clear()
+		self.collisionStat = RollingStat(self.historySize)
+		self.lastFrameTime = None
+
+	def countCollision(self, fromName, intoName):
+		pair = (fromName, intoName)
+		self.collisionPairs[pair] = self.collisionPairs.get(pair, 0) + 1
+		self.frameCollisions += 1
+
+	def countCollisionEntry(self, entry):
+		self.countCollision(entry.getFromNodePath().getName(), entry.getIntoNodePath().getName())
+
+	def endFrame(self, task):
+		#A whole frame is the wall time between two visits to this task
+		now = time.perf_counter()
+		if self.lastFrameTime is not None:
+			self.frameStat.record(now - self.lastFrameTime, 1)
+		self.lastFrameTime = now
+
+		#Fold this frame's task times into the rolling stats, and add them up by phase
+		phaseTimes = {}
+		phaseCalls = {}
+		for name, elapsedTime in self.frameTimes.items():
+			calls = self.frameCalls[name]
+			stat = self.taskStats.get(name)
+			if stat is None:
+				stat = self.taskStats[name] = RollingStat(self.historySize)
+			stat.record(elapsedTime, calls)
+
+			phase = TASK_PHASES.get(name, GAME_PHASE)
+			phaseTimes[phase] = phaseTimes.get(phase, 0.0) + elapsedTime
+			phaseCalls[phase] = phaseCalls.get(phase, 0) + calls
+		for phase, elapsedTime in phaseTimes.items():
+			stat = self.phaseStats.get(phase)
+			if stat is None:
+				stat = self.phaseStats[phase] = RollingStat(self.historySize)
+			stat.record(elapsedTime, phaseCalls[phase])
+
+		self.collisionStat.record(self.frameCollisions, self.frameCollisions)
+		self.frameCollisions = 0
+
+		#Clear in place, since the timed functions hold on to these dictionaries
+		self.frameTimes.clear()
+		self.frameCalls.clear()
+		return task.cont
+
+	def snapshot(self):
+		p50, p99, maximum = self.collisionStat.percentiles((0.5, 0.99, 1.0))
+		return {'frame': self.frameStat.summarize(),
+				'phases': dict((name, stat.summarize()) for name, stat in self.phaseStats.items()),
+				'tasks': dict((name, stat.summarize()) for name, stat in self.taskStats.items()),
+				'collisions': {'total': self.collisionStat.calls,
+								'perFrameP50': p50,
+								'perFrameP99': p99,
+								'perFrameMax': maximum,
+								'pairs': dict(('%s-into-%s' % pair, count) for pair, count in self.collisionPairs.items())}}
+
+	def exportJson(self, path):
+		with open(path, 'w') as jsonFile:
+			json.dump(self.snapshot(), jsonFile, indent=2, sort_keys=True)
+
+	def exportCsv(self, path):
+		snapshot = self.snapshot()
+		with open(path, 'w', newline='') as csvFile:
+			writer = csv.DictWriter(csvFile, fieldnames=CSV_COLUMNS)
+			writer.writeheader()
+			writer.writerow(dict(snapshot['frame'], kind='frame', name='frame'))
+			for kind, stats in (('phase', snapshot['phases']), ('task', snapshot['tasks'])):
+				for name in sorted(stats):
+					writer.writerow(dict(stats[name], kind=kind, name=name))
+			for name, count in sorted(snapshot['collisions']['pairs'].items()):
+				writer.writerow({'kind': 'collision', 'name': name, 'calls': count})
+
+	def destroy(self):
+		#Stop timing new tasks (tasks that are already wrapped keep their timing until they end)
+		self.taskMgr.remove(self.task)
+		self.taskMgr.add = self.originalAdd
+		self.taskMgr.doMethodLater = self.originalDoMethodLater
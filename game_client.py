@@ -0,0 +1,201 @@
+'''
+John Maurer
+
+Description: A load-testing client for the game server. It runs many players
+from one asyncio loop, each pressing and releasing random keys the way a person
+at the keyboard would, and reports how many state updates each player got, how
+far behind the server acked their inputs, and how busy the server was. Players
+rebuild the world from the server's snapshot deltas and tell it which snapshot
+they have
+
+Usage: python game_client.py [--clients N] [--seconds S] [--port PORT] [--spawn-server [--cogs N]]
+'''
+
+from game_server import STATE_TAG, STATE_HEADER
+from world_snapshot import WorldSnapshot, applyDelta, getBaseTick, COGS
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys,os
+import threading
+import time
+
+#Base snapshots a player keeps for the server to send deltas against
+SNAPSHOT_HISTORY = 16
+
+#Keys a scripted player can hold down, and the event that lets each one go
+HELD_KEYS = {'arrow_up': 'arrow_up-up', 'arrow_down': 'arrow_down-up',
+			'arrow_left': 'arrow_left-up', 'arrow_right': 'arrow_right-up'}
+
+class ClientProtocol(asyncio.DatagramProtocol):
+	def __init__(self, client):
+		self.client = client
+
+	def datagram_received(self, data, address):
+		self.client.handleDatagram(data)
+
+class ScriptedClient():
+	def __init__(self, name, server, inputRate=10):
+		self.name = name
+		self.server = server
+		self.inputRate = inputRate
+		self.transport = None
+
+		#Given to us by the server once we are in, along with which ticks it sends deltas against
+		self.playerId = None
+		self.baseEvery = None
+
+		#What we sent, and what the server has acted on so far
+		self.seq = 0
+		self.heldKeys = set()
+		self.sendTimes = {}
+		self.ackDelays = []
+
+		#Base snapshots received (by tick), the newest snapshot and base, and deltas we couldn't use
+		self.snapshots = {}
+		self.snapshot = None
+		self.baseTick = None
+		self.states = 0
+		self.stateBytes = 0
+		self.lostStates = 0
+
+	def handleDatagram(self, data):
+		if data[:1] == STATE_TAG:
+			self.handleState(data)
+			return
+		message = json.loads(data.decode('utf-8'))
+		if message['type'] == 'welcome':
+			self.playerId = message['id']
+			self.baseEvery = message['baseEvery']
+
+	def handleState(self, data):
+		self.stateBytes += len(data)
+		tag, ack = STATE_HEADER.unpack_from(data, 0)
+
+		#See how long the server took to act on our inputs
+		sentTime = self.sendTimes.pop(ack, None)
+		if sentTime is not None:
+			self.ackDelays.append(time.monotonic() - sentTime)
+
+		#Read a full snapshot right out of the datagram, or rebuild one from a delta and the snapshot it is against
+		payload = memoryview(data)[STATE_HEADER.size:]
+		baseTick = getBaseTick(payload)
+		if baseTick is None:
+			snapshot = WorldSnapshot(payload)
+		elif baseTick in self.snapshots:
+			snapshot = applyDelta(self.snapshots[baseTick], payload)
+		else:
+			self.lostStates += 1
+			return
+		self.states += 1
+		if snapshot.tick % self.baseEvery == 0:
+			self.snapshots[snapshot.tick] = snapshot
+			self.baseTick = max(self.baseTick, snapshot.tick) if self.baseTick is not None else snapshot.tick
+			if len(self.snapshots) > SNAPSHOT_HISTORY:
+				del self.snapshots[min(self.snapshots)]
+		if self.snapshot is None or snapshot.tick > self.snapshot.tick:
+			self.snapshot = snapshot
+
+	def send(self, message):
+		self.transport.sendto(json.dumps(message, separators=(',', ':')).encode('utf-8'))
+
+	def pickEvents(self):
+		#Let go of a key, press another, or throw a pie (no more than a person would)
+		roll = random.random()
+		if roll < 0.3 and self.heldKeys:
+			key = random.choice(sorted(self.heldKeys))
+			self.heldKeys.discard(key)
+			return [HELD_KEYS[key]]
+		if roll < 0.8:
+			key = random.choice(sorted(HELD_KEYS))
+			if key not in self.heldKeys:
+				self.heldKeys.add(key)
+				return [key]
+			return []
+		return ['control']
+
+	async def run(self, seconds):
+		loop = asyncio.get_running_loop()
+		self.transport, protocol = await loop.create_datagram_endpoint(lambda: ClientProtocol(self), remote_addr=self.server)
+		try:
+			#Keep asking to join until the server answers
+			while self.playerId is None:
+				self.send({'type': 'join'})
+				await asyncio.sleep(0.2)
+
+			#Send inputs (or an empty one, to show we are still here) at the input rate
+			endTime = loop.time() + seconds
+			while loop.time() < endTime:
+				self.seq += 1
+				self.sendTimes[self.seq] = time.monotonic()
+				self.send({'type': 'input', 'seq': self.seq, 'events': self.pickEvents(),
+							'snapshot': self.baseTick})
+				await asyncio.sleep(1.0 / self.inputRate)
+			self.send({'type': 'leave'})
+		finally:
+			self.transport.close()
+
+	def getStats(self, seconds):
+		ackDelays = sorted(self.ackDelays)
+		return {'statesPerSecond': self.states / seconds,
+				'kbPerSecond': self.stateBytes / 1024.0 / seconds,
+				'ackMs': ackDelays[len(ackDelays) // 2] * 1000 if ackDelays else None,
+				'cogs': self.snapshot.counts[COGS] if self.snapshot is not None else 0}
+
+async def runClients(count, server, seconds, inputRate):
+	clients = [ScriptedClient('client {0}'.format(index), server, inputRate) for index in range(count)]
+	await asyncio.gather(*[client.run(seconds) for client in clients])
+	return clients
+
+def spawnServer(arguments):
+	#Start a server of our own and wait for it to say it is listening
+	script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'game_server.py')
+	command = [sys.executable, script, '--port', str(arguments.port), '--cogs', str(arguments.cogs),
+			'--tick-rate', str(arguments.tick_rate), '--seconds', str(arguments.seconds + 10)]
+	process = subprocess.Popen(command, cwd=os.path.dirname(script), stdout=subprocess.PIPE, universal_newlines=True)
+	for line in process.stdout:
+		if line.startswith('Serving on'):
+			break
+	else:
+		raise Exception('UH OH! The game server never started!')
+
+	#Keep reading what the server prints so it never blocks on a full pipe, holding on to its reports
+	process.reports = []
+	def readReports():
+		for line in process.stdout:
+			if ' ticks/s at ' in line:
+				process.reports.append(line.strip())
+	threading.Thread(target=readReports, daemon=True).start()
+	return process
+
+def parseArguments(args=None):
+	parser = argparse.ArgumentParser(description='Load test a Pie Throw game server with scripted players')
+	parser.add_argument('--host', default='127.0.0.1', help='address of the server')
+	parser.add_argument('--port', type=int, default=7198, help='UDP port of the server')
+	parser.add_argument('--clients', type=int, default=8, help='players to run')
+	parser.add_argument('--seconds', type=float, default=10, help='how long each player plays')
+	parser.add_argument('--input-rate', type=float, default=10, help='inputs each player sends a second')
+	parser.add_argument('--spawn-server', action='store_true', help='start a server to test against')
+	parser.add_argument('--cogs', type=int, default=10, help='cogs in each wave (with --spawn-server)')
+	parser.add_argument('--tick-rate', type=int, default=60, help='server ticks per second (with --spawn-server)')
+	return parser.parse_args(args)
+
+if __name__ == '__main__':
+	arguments = parseArguments()
+	server = spawnServer(arguments) if arguments.spawn_server else None
+	try:
+		clients = asyncio.run(runClients(arguments.clients, (arguments.host, arguments.port), arguments.seconds, arguments.input_rate))
+	finally:
+		if server is not None:
+			server.terminate()
+
+	#Report each player, then the worst of them (a server that keeps up sends every player tickRate / broadcastEvery states a second)
+	stats = [client.getStats(arguments.seconds) for client in clients]
+	for client, clientStats in zip(clients, stats):
+		print('{0} (player {1}): {2[statesPerSecond]:.1f} states/s, {2[kbPerSecond]:.1f} KB/s, inputs acked after {3}, {2[cogs]} cogs in view'.format(
+			client.name, client.playerId, clientStats, '{0:.0f} ms'.format(clientStats['ackMs']) if clientStats['ackMs'] is not None else 'never'))
+	print('{0} players: the slowest got {1:.1f} states/s'.format(len(clients), min(clientStats['statesPerSecond'] for clientStats in stats)))
+	if server is not None and server.reports:
+		print('Server: ' + server.reports[-1])
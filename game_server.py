@@ -0,0 +1,292 @@
+'''
+John Maurer
+
+Description: An authoritative game server that runs the toon, pie, and cog
+simulation headless on an asyncio loop at a fixed tick rate. Clients join over
+UDP, send the same input events the toon takes from the keyboard (arrow_*,
+control), and are sent a binary snapshot of every toon, pie, and cog every few
+ticks, as a delta against the last snapshot they told us they have
+
+Usage: python game_server.py [--port PORT] [--cogs N] [--tick-rate HZ] [--seconds S]
+'''
+
+from input_replay import INPUT_EVENTS
+from world_snapshot import captureSnapshot, encodeDelta
+import argparse
+import asyncio
+import json
+import random
+import struct
+import time
+
+#State datagrams start with this tag and the last input sequence number acted on for the player, then the snapshot
+#(every other datagram is JSON)
+STATE_TAG = b'S'
+STATE_HEADER = struct.Struct('<ci')
+
+#Only every few broadcasts is kept to encode deltas against, so players share bases (and their encodings),
+#and how many of those are kept (a player whose base is older than that is sent a full snapshot)
+BASE_BROADCASTS = 4
+SNAPSHOT_HISTORY = 16
+
+class RemotePlayer():
+	def __init__(self, playerId, address, toon):
+		self.playerId = playerId
+		self.address = address
+		self.toon = toon
+
+		#The last input sequence number acted on (older or repeated datagrams are dropped), and when we last heard anything
+		self.lastSeq = -1
+		self.lastHeard = 0.0
+
+		#Input events waiting for the next tick
+		self.pendingEvents = []
+
+		#The tick of the newest base snapshot the player says it has (None until it has one)
+		self.snapshotAck = None
+
+class ServerProtocol(asyncio.DatagramProtocol):
+	def __init__(self, server):
+		self.server = server
+
+	def connection_made(self, transport):
+		self.server.transport = transport
+
+	def datagram_received(self, data, address):
+		self.server.handleDatagram(data, address)
+
+class GameServer():
+	def __init__(self, pieThrow, tickRate=60, broadcastEvery=3, timeout=10.0, maxPlayers=64):
+		#The headless world the server is the authority on (it has to be built on a fixed-step clock at the same tick rate)
+		self.pieThrow = pieThrow
+		self.tickRate = tickRate
+		self.broadcastEvery = broadcastEvery
+		self.timeout = timeout
+		self.maxPlayers = maxPlayers
+
+		#Seconds the server may fall behind its schedule before it stops catching up
+		self.maxLag = 0.25
+
+		#Players by address, and the ids handed out so far (the first player takes the toon the world was built with)
+		self.players = {}
+		self.nextPlayerId = 0
+		self.transport = None
+
+		#Base snapshots sent out recently, by tick
+		self.baseEvery = broadcastEvery * BASE_BROADCASTS
+		self.snapshots = {}
+
+		#Totals, to see how much the server can take
+		self.ticks = 0
+		self.tickSeconds = 0.0
+		self.worstTickSeconds = 0.0
+		self.overruns = 0
+		self.ticksDropped = 0
+		self.datagramsIn = 0
+		self.datagramsOut = 0
+		self.bytesOut = 0
+		self.badDatagrams = 0
+		self.broadcasts = 0
+		self.snapshotSeconds = 0.0
+		self.fullSnapshots = 0
+		self.deltaSnapshots = 0
+
+	def handleDatagram(self, data, address):
+		self.datagramsIn += 1
+		try:
+			message = json.loads(data.decode('utf-8'))
+			messageType = message['type']
+		except (ValueError, KeyError, TypeError):
+			self.badDatagrams += 1
+			return
+
+		player = self.players.get(address)
+		if messageType == 'join':
+			if player is None:
+				player = self.addPlayer(address)
+			if player is not None:
+				self.send({'type': 'welcome', 'id': player.playerId, 'toonId': player.toon.toonId, 'tickRate': self.tickRate,
+							'baseEvery': self.baseEvery}, address)
+			else:
+				self.send({'type': 'full'}, address)
+			return
+		if player is None:
+			return
+		player.lastHeard = time.monotonic()
+
+		if messageType == 'input':
+			#Only act on inputs newer than the last ones, since datagrams can arrive late, twice, or out of order
+			seq = message.get('seq', -1)
+			if seq > player.lastSeq:
+				player.lastSeq = seq
+				player.pendingEvents += [event for event in message.get('events', []) if event in INPUT_EVENTS]
+
+			#Deltas can be sent against any base snapshot the player has, as long as we still have it too
+			snapshotAck = message.get('snapshot')
+			if snapshotAck in self.snapshots and (player.snapshotAck is None or snapshotAck > player.snapshotAck):
+				player.snapshotAck = snapshotAck
+		elif messageType == 'leave':
+			self.removePlayer(player)
+
+	def addPlayer(self, address):
+		if len(self.players) >= self.maxPlayers:
+			return None
+
+		#The first player to join plays the toon the world was built with, everyone after gets a toon of their own
+		if not any(player.toon is self.pieThrow.player for player in self.players.values()):
+			toon = self.pieThrow.player
+		else:
+			toon = self.pieThrow.addToon(listenForKeys=False)
+			x, y, z = self.pieThrow.player.toon.getPos(render)
+			toon.toon.setPos(x + random.uniform(-5, 5), y + random.uniform(-5, 5), z)
+		player = RemotePlayer(self.nextPlayerId, address, toon)
+		player.lastHeard = time.monotonic()
+		self.nextPlayerId += 1
+		self.players[address] = player
+		return player
+
+	def removePlayer(self, player):
+		del self.players[player.address]
+
+		#The world's own toon stays in it (stopped where it is) for whoever joins next
+		if player.toon is self.pieThrow.player:
+			for event in ('arrow_up-up', 'arrow_down-up', 'arrow_left-up', 'arrow_right-up'):
+				player.toon.handleInput(event)
+		else:
+			self.pieThrow.removeToon(player.toon)
+
+	def dropSilentPlayers(self):
+		now = time.monotonic()
+		for player in list(self.players.values()):
+			if now - player.lastHeard > self.timeout:
+				self.removePlayer(player)
+
+	def tick(self):
+		#Hand every player's inputs to their toon, then step the world one tick
+		for player in self.players.values():
+			for event in player.pendingEvents:
+				player.toon.handleInput(event)
+			player.pendingEvents = []
+		self.pieThrow.taskMgr.step()
+		self.ticks += 1
+		if self.ticks % self.broadcastEvery == 0 and self.players:
+			self.broadcastState()
+
+	def broadcastState(self):
+		#Snapshot the world once, then send every player a delta against the base snapshot they have
+		#(players that have the same one share the encoding)
+		startTime = time.perf_counter()
+		snapshot = captureSnapshot(self.pieThrow, self.ticks)
+		if snapshot.tick % self.baseEvery == 0:
+			self.snapshots[snapshot.tick] = snapshot
+			if len(self.snapshots) > SNAPSHOT_HISTORY:
+				del self.snapshots[min(self.snapshots)]
+
+		payloads = {}
+		for player in self.players.values():
+			base = self.snapshots.get(player.snapshotAck)
+			baseTick = base.tick if base is not None else None
+			payload = payloads.get(baseTick)
+			if payload is None:
+				payload = payloads[baseTick] = encodeDelta(base, snapshot) if base is not None else snapshot.getBytes()
+			if base is not None:
+				self.deltaSnapshots += 1
+			else:
+				self.fullSnapshots += 1
+			datagram = STATE_HEADER.pack(STATE_TAG, player.lastSeq) + payload
+			self.transport.sendto(datagram, player.address)
+			self.datagramsOut += 1
+			self.bytesOut += len(datagram)
+		self.broadcasts += 1
+		self.snapshotSeconds += time.perf_counter() - startTime
+
+	def send(self, message, address):
+		datagram = json.dumps(message, separators=(',', ':')).encode('utf-8')
+		self.transport.sendto(datagram, address)
+		self.datagramsOut += 1
+		self.bytesOut += len(datagram)
+
+	async def run(self, host='127.0.0.1', port=7198, seconds=None, reportEvery=5.0):
+		#Listen for clients, then tick on a fixed schedule (ticks that run long are caught up on, unless the server falls too far behind)
+		loop = asyncio.get_running_loop()
+		transport, protocol = await loop.create_datagram_endpoint(lambda: ServerProtocol(self), local_addr=(host, port))
+		try:
+			tickLength = 1.0 / self.tickRate
+			startTime = loop.time()
+			nextTick = startTime
+			nextReport = startTime + reportEvery
+			while seconds is None or loop.time() - startTime < seconds:
+				#Let the datagrams that came in since the last tick be read
+				await asyncio.sleep(max(0.0, nextTick - loop.time()))
+
+				tickStart = time.perf_counter()
+				self.tick()
+				tickSeconds = time.perf_counter() - tickStart
+				self.tickSeconds += tickSeconds
+				self.worstTickSeconds = max(self.worstTickSeconds, tickSeconds)
+				if tickSeconds > tickLength:
+					self.overruns += 1
+
+				#Once the server is too far behind to catch up, give up on the ticks it missed
+				nextTick += tickLength
+				if loop.time() - nextTick > self.maxLag:
+					self.ticksDropped += int((loop.time() - nextTick) / tickLength)
+					nextTick = loop.time()
+				if self.ticks % self.tickRate == 0:
+					self.dropSilentPlayers()
+				if reportEvery and loop.time() >= nextReport:
+					nextReport += reportEvery
+					print(self.getReport(loop.time() - startTime))
+		finally:
+			transport.close()
+		return self.getStats(loop.time() - startTime)
+
+	def getStats(self, seconds):
+		return {'seconds': seconds,
+				'ticks': self.ticks,
+				'ticksPerSecond': self.ticks / seconds if seconds else 0.0,
+				'players': len(self.players),
+				'cogs': len(self.pieThrow.waveManager.activeCogs),
+				'msPerTick': self.tickSeconds * 1000 / self.ticks if self.ticks else 0.0,
+				'worstMsPerTick': self.worstTickSeconds * 1000,
+				'overruns': self.overruns,
+				'ticksDropped': self.ticksDropped,
+				'datagramsIn': self.datagramsIn,
+				'datagramsOut': self.datagramsOut,
+				'kbOutPerSecond': self.bytesOut / 1024.0 / seconds if seconds else 0.0,
+				'badDatagrams': self.badDatagrams,
+				'snapshotMs': self.snapshotSeconds * 1000 / self.broadcasts if self.broadcasts else 0.0,
+				'deltaShare': self.deltaSnapshots / float(self.fullSnapshots + self.deltaSnapshots) if self.fullSnapshots + self.deltaSnapshots else 0.0}
+
+	def getReport(self, seconds):
+		return ('{seconds:.0f}s: {players} players, {cogs} cogs, {ticksPerSecond:.1f} ticks/s at {msPerTick:.2f} ms/tick '
+				'(worst {worstMsPerTick:.1f}, {overruns} over budget, {ticksDropped} dropped), {datagramsIn} datagrams in, '
+				'{datagramsOut} out ({kbOutPerSecond:.0f} KB/s, {deltaShare:.0%} deltas, {snapshotMs:.2f} ms each broadcast)'.format(**self.getStats(seconds)))
+
+def parseArguments(args=None):
+	parser = argparse.ArgumentParser(description='Run an authoritative Pie Throw server for UDP clients')
+	parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+	parser.add_argument('--port', type=int, default=7198, help='UDP port to listen on')
+	parser.add_argument('--cogs', type=int, default=10, help='cogs in each wave')
+	parser.add_argument('--tick-rate', type=int, default=60, help='simulation ticks per second')
+	parser.add_argument('--broadcast-every', type=int, default=3, help='ticks between state updates')
+	parser.add_argument('--max-players', type=int, default=64, help='players the server lets in')
+	parser.add_argument('--seconds', type=float, default=None, help='stop after this many seconds (default never)')
+	parser.add_argument('--seed', type=int, default=None, help='random seed for the world')
+	return parser.parse_args(args)
+
+if __name__ == '__main__':
+	arguments = parseArguments()
+	if arguments.seed is not None:
+		random.seed(arguments.seed)
+
+	#The world steps exactly one tick's worth of time whenever the server ticks it
+	from main import PieThrow
+	pieThrow = PieThrow(headless=True, cogCount=arguments.cogs, tickRate=arguments.tick_rate)
+	server = GameServer(pieThrow, arguments.tick_rate, arguments.broadcast_every, maxPlayers=arguments.max_players)
+	print('Serving on {0}:{1} at {2} ticks/s'.format(arguments.host, arguments.port, arguments.tick_rate))
+	try:
+		stats = asyncio.run(server.run(arguments.host, arguments.port, arguments.seconds))
+		print(server.getReport(stats['seconds']))
+	except KeyboardInterrupt:
+		pass
@@ -0,0 +1,106 @@
+'''
+John Maurer
+
+Description: Classes that record the player's input events (and the seed the
+world was built with) frame by frame, and feed a recording back into the game on
+a fixed-step clock, along with a check that the replayed session ended up in the
+same state as the recorded one
+'''
+
+from direct.showbase import DirectObject
+from panda3d.core import *
+import json
+
+#Every event the toon listens for
+INPUT_EVENTS = ['arrow_up', 'arrow_up-up', 'arrow_down', 'arrow_down-up',
+				'arrow_right', 'arrow_right-up', 'arrow_left', 'arrow_left-up',
+				'control']
+
+#Bumped whenever the recording format changes
+RECORDING_VERSION = 1
+
+def loadRecording(path):
+	with open(path) as recordingFile:
+		recording = json.load(recordingFile)
+	if recording.get('version') != RECORDING_VERSION:
+		raise Exception('UH OH! ' + path + ' was recorded with a different version of the recorder!')
+	return recording
+
+def compareStates(expected, actual, tolerance=1e-3, path='state'):
+	#Return a line for every place the two states differ (numbers only have to be within the tolerance)
+	if isinstance(expected, dict) and isinstance(actual, dict):
+		differences = []
+		for key in sorted(set(expected) | set(actual)):
+			if key not in expected or key not in actual:
+				differences.append('{0}.{1}: only in the {2} state'.format(path, key, 'recorded' if key in expected else 'replayed'))
+			else:
+				differences += compareStates(expected[key], actual[key], tolerance, path + '.' + key)
+		return differences
+	if isinstance(expected, list) and isinstance(actual, list):
+		if len(expected) != len(actual):
+			return ['{0}: recorded {1} items, replayed {2}'.format(path, len(expected), len(actual))]
+		differences = []
+		for index, (expectedItem, actualItem) in enumerate(zip(expected, actual)):
+			differences += compareStates(expectedItem, actualItem, tolerance, '{0}[{1}]'.format(path, index))
+		return differences
+	if isinstance(expected, (int, float)) and isinstance(actual, (int, float)) and not isinstance(expected, bool):
+		if abs(expected - actual) > tolerance:
+			return ['{0}: recorded {1}, replayed {2}'.format(path, expected, actual)]
+		return []
+	if expected != actual:
+		return ['{0}: recorded {1!r}, replayed {2!r}'.format(path, expected, actual)]
+	return []
+
+class InputRecorder(DirectObject.DirectObject):
+	def __init__(self, settings, events=INPUT_EVENTS):
+		#settings holds whatever the game needs to build the same world again (the seed, the cog count...)
+		self.settings = dict(settings)
+
+		#Frames are counted from now, which has to be the same point a replay starts from
+		self.startFrame = globalClock.getFrameCount()
+		self.events = []
+		for event in events:
+			self.accept(event, self.recordEvent, [event])
+
+	def recordEvent(self, event):
+		self.events.append([globalClock.getFrameCount() - self.startFrame, event])
+
+	def save(self, path, finalState):
+		self.ignoreAll()
+		recording = dict(self.settings)
+		recording.update({'version': RECORDING_VERSION,
+						'frames': globalClock.getFrameCount() - self.startFrame,
+						'events': self.events,
+						'finalState': finalState})
+		with open(path, 'w') as recordingFile:
+			json.dump(recording, recordingFile, indent=1)
+
+class InputPlayer():
+	def __init__(self, taskMgr, events):
+		self.taskMgr = taskMgr
+		self.events = events
+		self.nextEvent = 0
+		self.startFrame = globalClock.getFrameCount()
+
+		#Queue each frame's events after the real input devices are read, so the event manager sends them
+		#at the same point in the frame that it sent the recorded ones
+		self.eventQueue = EventQueue.getGlobalEventQueue()
+		self.task = self.taskMgr.add(self.playEvents, 'replay input', sort=-45)
+
+	def playEvents(self, task):
+		frame = globalClock.getFrameCount() - self.startFrame
+		while self.nextEvent < len(self.events) and self.events[self.nextEvent][0] <= frame:
+			self.eventQueue.queueEvent(Event(self.events[self.nextEvent][1]))
+			self.nextEvent += 1
+		if self.nextEvent >= len(self.events):
+			self.task = None
+			return task.done
+		return task.cont
+
+	def isDone(self):
+		return self.nextEvent >= len(self.events)
+
+	def destroy(self):
+		if self.task is not None:
+			self.taskMgr.remove(self.task)
+			self.task = None
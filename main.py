@@ -13,38 +13,116 @@ from direct.interval.LerpInterval import LerpPosInterval,LerpHprInterval
 from direct.interval.ActorInterval import ActorInterval
 from direct.interval.IntervalGlobal import *
 from direct.task import Task
-from toon import Toon
+from toon import Toon, getToonAssets
 from random_cog import RandomCog
+from cog_wave import CogWaveManager
+from pie_hits import PieHitDetector
+from pie_sweep import PieSweeper
+from cog_catalog import getCogCatalog, getCatalogAssets
+from asset_loader import AssetLoader
+from frame_profiler import FrameProfiler
+from terrain_heightfield import getHeightfield, getBakedHeightfieldPath
+from wall_bvh import findWallNodes, getWallBVH, getBakedWallBVHPath
+from flow_field import getNavGrid, getBakedNavGridPath
+from input_replay import InputRecorder, InputPlayer, loadRecording, compareStates
+from collision_batch import CollisionBatcher
 import sys,os
+import argparse
+import random
+import time
 
 class PieThrow(ShowBase):
-	def __init__(self):
+	def __init__(self, headless=False, cogCount=1, sweptPies=False, profile=True, streamAssets=False, useBaked=True, tickRate=None, pieCount=8, memoryBudgetMB=None,
+				batchCollisions=True):
+		#Time the startup from the very beginning
+		self.startTime = time.perf_counter()
+		self.startupTimes = {}
+		
+		#A headless world never opens a window or an audio device, so it can run on render-less machines
+		self.headless = headless
+		if self.headless:
+			loadPrcFileData('', 'window-type none')
+			loadPrcFileData('', 'audio-library-name null')
+		
 		#Initialize the Panda window & disable the default mouse controls
 		ShowBase.__init__(self)
 		self.disableMouse()
+		
+		#Step the clock exactly 1/tickRate seconds a frame, starting from zero before anything is built, so every run
+		#sees the very same frame times (a headless world runs as fast as it can, a windowed one waits on real time)
+		#(resetting a slaved clock keeps Panda from warning that the time was adjusted)
+		if tickRate is not None:
+			globalClock.setMode(ClockObject.MSlave)
+			globalClock.reset()
+			globalClock.setMode(ClockObject.MNonRealTime if self.headless else ClockObject.MForced)
+			globalClock.setFrameRate(tickRate)
 		#self.oobe()
 		
+		#Time every task from here on, so we can see where each frame goes
+		self.profiler = FrameProfiler(self.taskMgr) if profile else None
+		
 		#Establish where the current directory of the running file is
 		self.currentDirectory = os.path.abspath(sys.path[0])
 		self.pandaDirectory = Filename.fromOsSpecific(self.currentDirectory).getFullpath()
 		
 		#Source for collision learning: https://discourse.panda3d.org/t/panda3d-collisions-made-simple/7441
-		#Define collision handlers and the traverser
+		#Define collision handlers and the traverser (floors are looked up in a heightfield instead)
 		self.cTrav = CollisionTraverser()
-		self.floorHandler = CollisionHandlerFloor()
-		self.floorHandler.setMaxVelocity(40)
 		self.wallHandler = CollisionHandlerPusher()
 		
 		#Define collision masks
 		self.floorMaskBit = 1
 		self.wallMaskBit = 2
 		self.enemyMaskBit = 3
+		self.terrainWallMaskBit = 4
+		self.toonMaskBit = 5
 		self.FLOOR_MASK = BitMask32.bit(self.floorMaskBit)
 		self.WALL_MASK = BitMask32.bit(self.wallMaskBit)
 		self.ENEMY_MASK = BitMask32.bit(self.enemyMaskBit)
+		self.TERRAIN_WALL_MASK = BitMask32.bit(self.terrainWallMaskBit)
+		self.TOON_MASK = BitMask32.bit(self.toonMaskBit)
+		
+		#Every toon in the world (the player's comes first), and what their pies hit once the cogs are in
+		self.toons = []
+		self.nextToonId = 0
+		self.nextPieId = 0
+		self.waveManager = None
+		self.pieHitDetector = None
+		self.pieSweeper = None
+		
+		#Set up the collision events (or once-a-frame batches) that don't depend on anything being loaded yet
+		self.batchCollisions = batchCollisions
+		self.setUpCollisionEvents()
+		
+		#Read every file on a pool of loader threads, building the terrain, then the toon, then the cogs
+		#(which walk towards the toon) as soon as each one's files are in
+		self.cogCount = cogCount
+		self.sweptPies = sweptPies
+		self.pieCount = pieCount
+		self.memoryBudgetMB = memoryBudgetMB
+		self.terrainDirectory = self.pandaDirectory + '/resources/terrain/'
+		
+		#Load the prebuilt characters from bake_assets.py where they exist
+		self.bakedDirectory = self.pandaDirectory + '/resources/baked' if useBaked else None
+		self.assetLoader = AssetLoader(self.taskMgr)
+		terrainModels = [self.terrainDirectory + 'CogGolfHub.bam', self.terrainDirectory + 'LB_wall_panel.bam']
+		toonModels, toonTextures = getToonAssets(self.pandaDirectory, self.bakedDirectory)
+		cogModels, cogTextures = getCatalogAssets(self.pandaDirectory, bakedDirectory=self.bakedDirectory)
+		self.startupModels = terrainModels + toonModels + cogModels
+		self.startupTextures = toonTextures + cogTextures
+		self.assetLoader.request('terrain', terrainModels).onReady(self.setUpTerrain)
+		self.assetLoader.request('toon', toonModels, toonTextures, after=['terrain']).onReady(self.setUpPlayer)
+		self.assetLoader.request('cogs', cogModels, cogTextures, after=['toon']).onReady(self.setUpCogs)
+		self.assetLoader.request('world', after=['cogs']).onReady(self.worldReady)
 		
+		#Either stream the world in while frames are drawn, or wait for all of it
+		self.taskMgr.add(self.firstFrame, 'first frame', sort=1000)
+		if not streamAssets:
+			self.assetLoader.wait()
+	
+	def setUpTerrain(self):
 		#Load the main terrain to be used
-		self.terrain = loader.loadModel(self.pandaDirectory + '/resources/terrain/CogGolfHub.bam')
+		self.terrain = loader.loadModel(self.terrainDirectory + 'CogGolfHub.bam')
 		self.terrain.reparentTo(render)
 		self.terrain.setScale(1.5)
 		
@@ -58,7 +136,7 @@ class PieThrow(ShowBase):
 		self.walls = self.terrain.find('**/collision_walls')
 
 		#Load the wall to block off the exit tunnel
-		self.wall = loader.loadModel(self.pandaDirectory + '/resources/terrain/LB_wall_panel.bam')
+		self.wall = loader.loadModel(self.terrainDirectory + 'LB_wall_panel.bam')
 		self.wall.reparentTo(render)
 		self.wall.setPos(-30, -185, 0)
 		self.wall.setH(-30)
@@ -69,102 +147,406 @@ class PieThrow(ShowBase):
 		self.floorCollider = self.floor
 		self.floorCollider.node().setIntoCollideMask(self.FLOOR_MASK)
 		
+		#Look floor heights up in a grid sampled from the floor polygons (the grid is saved in the baked directory,
+		#and only sampled again when the floor changes)
+		self.heightfield = getHeightfield(self.floor, self.terrain, getBakedHeightfieldPath(self.bakedDirectory))
+		self.heightfield.place(self.terrain)
+		
 		#Define wall collider
 		self.wallCollider = self.walls
 		self.wallCollider.node().setIntoCollideMask(self.WALL_MASK)
 		
+		#Mark the terrain walls that the wall mask reaches, so the pie can collide with them without colliding with cogs
+		for wallNode in list(self.terrain.findAllMatches('**/+CollisionNode')) + list(self.wall.findAllMatches('**/+CollisionNode')):
+			intoMask = wallNode.node().getIntoCollideMask()
+			if not (intoMask & self.WALL_MASK).isZero():
+				wallNode.node().setIntoCollideMask(intoMask | self.TERRAIN_WALL_MASK)
+		
+		#Gather every wall into one tree of boxes, so pushes only test the walls near each collider
+		#(the tree is saved in the baked directory, and only built again when the walls change)
+		wallNodes = findWallNodes([self.terrain, self.wall], self.WALL_MASK)
+		self.wallTree = getWallBVH(wallNodes, getBakedWallBVHPath(self.bakedDirectory))
+		self.wallTree.reparentTo(render)
+		
+		#Grid the floor into cells cogs can walk through, from the same walls (saved and rebuilt the same way)
+		self.navGrid = getNavGrid(self.heightfield, wallNodes, getBakedNavGridPath(self.bakedDirectory))
+		for wallNode in wallNodes:
+			wallNode.stash()
+	
+	def setUpPlayer(self):
 		#Initialize the player model
-		self.player = Toon(self.taskMgr)
-		self.player.toon.reparentTo(render)
+		self.player = self.addToon()
+		
+		#Render collisions and reparent the camera (there is neither when running headless)
+		if not self.headless:
+			self.cTrav.showCollisions(render)
+			self.camera.reparentTo(self.player.toon)
+			self.camera.setPos(self.player.toon, 0, -20, 5)
+	
+	def addToon(self, listenForKeys=True):
+		#Put a toon in the world, with its wall collisions, its floor, and its pies (other toons share the world with the player)
+		toon = Toon(self.taskMgr, self.pieCount, bakedDirectory=self.bakedDirectory, listenForKeys=listenForKeys)
+		toon.toon.reparentTo(render)
+		toon.toonId = self.nextToonId
+		self.nextToonId += 1
+		for pie in toon.piePool.pies:
+			pie.pieId = self.nextPieId
+			self.nextPieId += 1
 		
 		#Set up player wall collision capsule
-		self.playerSphere = self.player.toon.attachNewNode(CollisionNode('playerSphere'))
-		self.playerSphere.node().addSolid(CollisionSphere(0, 0, 0, 1))
-		self.playerSphere.setZ(3)
-		self.playerSphere.node().setFromCollideMask(self.WALL_MASK)
-		self.playerSphere.node().setIntoCollideMask(self.WALL_MASK)
-		self.playerSphere.show()
+		toon.wallSphere = toon.toon.attachNewNode(CollisionNode('playerSphere'))
+		toon.wallSphere.node().addSolid(CollisionSphere(0, 0, 0, 1))
+		toon.wallSphere.setZ(3)
+		toon.wallSphere.node().setFromCollideMask(self.WALL_MASK)
+		toon.wallSphere.node().setIntoCollideMask(self.WALL_MASK | self.TOON_MASK)
+		toon.wallSphere.show()
 		
-		#Set up player floor collision ray
-		self.playerRay = self.player.toon.attachNewNode(CollisionNode('playerRay'))
+		#Keep the toon (and pies that come down) on the floor
+		toon.heightfield = self.heightfield
+		toon.piePool.heightfield = self.heightfield
+		toon.piePool.onFloorHit = self.pieFloorCollision
 		
-		#The ray has to be a unit above to detect stairs and inclined planes
-		self.playerRay.node().addSolid(CollisionRay(0, 0, 1, 0, 0, -1))
-		self.playerRay.node().setFromCollideMask(self.FLOOR_MASK)
-		self.playerRay.node().setIntoCollideMask(BitMask32.allOff())
+		#Add collisions to handler
+		self.wallHandler.addCollider(toon.wallSphere, toon.toon)
 		
-		#Set up enemy for testing
-		self.enemy = RandomCog(self.taskMgr, self.enemyMaskBit, self.wallMaskBit, self.player, 10, 0.05)
+		#Add handlers to traverser
+		self.cTrav.addCollider(toon.wallSphere, self.wallHandler)
 		
-		#Set a pie mask so that it detects wall and enemy collisions
-		self.pieSphereMask = BitMask32()
-		self.pieSphereMask.setBit(self.wallMaskBit)
-		self.pieSphereMask.setBit(self.enemyMaskBit)
+		#The pusher only throws events, so batched collisions find the toon's contacts with a sensor of its own
+		toon.sensor = None
+		if self.batchCollisions:
+			toon.sensor = toon.toon.attachNewNode(CollisionNode('playerSensor'))
+			toon.sensor.node().addSolid(CollisionSphere(0, 0, 0, 1))
+			toon.sensor.setZ(3)
+			toon.sensor.node().setFromCollideMask(self.WALL_MASK)
+			toon.sensor.node().setIntoCollideMask(BitMask32.allOff())
+			self.collisionBatcher.addCollider(toon.sensor, 'toon')
 		
-		#Set up pie wall collision capsule
-		self.pieSphere = self.player.pieNode.attachNewNode(CollisionNode('pieSphere'))
-		self.pieSphere.node().addSolid(CollisionSphere(0, 0, 0, 0.75))
-		self.pieSphere.node().setFromCollideMask(self.pieSphereMask)
-		self.pieSphere.node().setIntoCollideMask(BitMask32.allOff())
-		self.pieSphere.show()
-		
-		#Set up pie floor collision segment
-		self.pieSeg = self.player.pieNode.attachNewNode(CollisionNode('pieSeg'))
-		self.pieSeg.node().addSolid(CollisionSegment(0, 0, 1, 0, 0, -1))
-		self.pieSeg.node().setFromCollideMask(self.FLOOR_MASK)
-		self.pieSeg.node().setIntoCollideMask(BitMask32.allOff())
+		#Pies can only hit things once the cogs are in (setUpCogs does it for the toons that came first)
+		self.toons.append(toon)
+		if self.pieHitDetector is not None:
+			self.setUpToonPies(toon)
+			self.waveManager.addTarget(toon)
+		return toon
+	
+	def removeToon(self, toon):
+		#Take a toon (other than the player) and everything it set up back out of the world
+		if toon is self.player:
+			raise Exception('UH OH! The player can not be removed from the world!')
+		self.toons.remove(toon)
+		if self.waveManager is not None:
+			self.waveManager.removeTarget(toon)
+		self.cTrav.removeCollider(toon.wallSphere)
+		self.wallHandler.removeCollider(toon.wallSphere)
+		if toon.sensor is not None:
+			self.collisionBatcher.removeCollider(toon.sensor)
+		for pie in toon.piePool.pies:
+			pieSphere = pie.pieNode.find('pieSphere')
+			if not pieSphere.isEmpty():
+				if self.batchCollisions:
+					self.collisionBatcher.removeCollider(pieSphere)
+				else:
+					self.cTrav.removeCollider(pieSphere)
+					self.wallHandler.removeCollider(pieSphere)
+			if self.pieHitDetector is not None:
+				self.pieHitDetector.removePie(pie.pieNode)
+			if self.pieSweeper is not None:
+				self.pieSweeper.removePie(pie)
+		toon.destroy()
+	
+	def setUpCogs(self):
+		#Resolve the cog catalog once, then send in the cogs
+		self.cogCatalog = getCogCatalog(self.pandaDirectory, self.bakedDirectory)
+		self.waveManager = CogWaveManager(self.taskMgr, self.cTrav, self.wallHandler, self.enemyMaskBit, self.wallMaskBit,
+											self.player, self.cogCatalog, 10, 0.05, None if self.headless else self.cam,
+											self.heightfield, self.memoryBudgetMB, self.navGrid, self.terrainWallMaskBit, self.toonMaskBit)
+		if self.cogCount == 1:
+			self.enemy = self.waveManager.spawnCog()
+		else:
+			#(a memory budget too small for even one cog leaves the world empty)
+			cogs = self.waveManager.startWaves(self.cogCount)
+			self.enemy = cogs[0] if cogs else None
 		
-		#Add collisions to handler
-		self.floorHandler.addCollider(self.pieSeg, self.player.pieNode)
-		self.floorHandler.addCollider(self.playerRay, self.player.toon)
-		self.wallHandler.addCollider(self.pieSphere, self.player.pieNode)
-		self.wallHandler.addCollider(self.playerSphere, self.player.toon)
-		self.wallHandler.addCollider(self.enemy.cogTorsoBox, self.enemy.cog)
-		
-		#Add important collision events to the handlers (tags are used 
-		#since there are multiple GeomNodes under 'collision_floors' and walls)
-		self.floorHandler.addInPattern('%fn-into-%(collisions)it')
-		self.wallHandler.addInPattern('%fn-into-%(collisions)it')
-		self.wallHandler.addInPattern('%fn-into-%in')
+		#Set a pie mask so that it detects terrain wall collisions (enemy hits go through the cog grid instead)
+		self.pieSphereMask = BitMask32()
+		self.pieSphereMask.setBit(self.terrainWallMaskBit)
 		
-		#Add handlers to traverser
-		self.cTrav.addCollider(self.playerRay, self.floorHandler)
-		self.cTrav.addCollider(self.pieSeg, self.floorHandler)
-		self.cTrav.addCollider(self.playerSphere, self.wallHandler)
-		self.cTrav.addCollider(self.pieSphere, self.wallHandler)
-		self.cTrav.addCollider(self.enemy.cogTorsoBox, self.wallHandler)
+		#Only test pies against the cogs in the grid cells around them
+		self.pieHitDetector = PieHitDetector(self.taskMgr, self.waveManager.grid, self.WALL_MASK | self.ENEMY_MASK,
+												self.collisionBatcher.categories['pieCog'].add if self.batchCollisions else self.pieEnemyCollision)
 		
-		#Render collisions
-		self.cTrav.showCollisions(render)
+		#Either intersect each pie's whole arc with the terrain and cogs when it is thrown,
+		#or set up the traverser collisions for every pie in the pool once, up front
+		if self.sweptPies:
+			self.pieSweeper = PieSweeper(self.waveManager.grid, self.FLOOR_MASK | self.TERRAIN_WALL_MASK,
+											self.pieSweptTerrainCollision, self.pieHitCog)
+		for toon in self.toons:
+			self.setUpToonPies(toon)
+			self.waveManager.addTarget(toon)
+	
+	def setUpToonPies(self, toon):
+		if self.pieSweeper is not None:
+			toon.piePool.sweeper = self.pieSweeper
+		else:
+			for pie in toon.piePool.pies:
+				self.setUpPieCollisions(pie.pieNode)
+	
+	def setUpCollisionEvents(self):
+		#Either hand each frame's contacts over in one list per kind of collider...
+		if self.batchCollisions:
+			self.collisionBatcher = CollisionBatcher(self.taskMgr, self.cTrav)
+			self.collisionBatcher.addCategory('pie', self.pieCollisions)
+			self.collisionBatcher.addCategory('pieCog', self.pieEnemyCollisions, newOnly=False)
+			self.collisionBatcher.addCategory('toon', self.toonCollisions)
+			return
 		
-		#Reparent the camera
-		self.camera.reparentTo(self.player.toon)
-		self.camera.setPos(self.player.toon, 0, -20, 5)
+		#...or add important collision events to the handlers (tags are used 
+		#since there are multiple GeomNodes under the terrain walls)
+		self.wallHandler.addInPattern('%fn-into-%(collisions)it')
+		self.wallHandler.addInPattern('%fn-into-%in')
 		
 		#Accept collision handling events (into-NodeName must be the name of the ACTUAL NODE in the scene graph)
 		#For this case, we're using tags instead
-		self.accept('pieSeg-into-floor', self.pieTerrainCollision)
 		self.accept('pieSphere-into-walls', self.pieTerrainCollision)
-		self.accept('pieSphere-into-cogTorsoBox', self.pieEnemyCollision)
-		self.accept('pieSphere-into-cogHeadBox', self.pieEnemyCollision)
-		self.accept('pieSphere-into-cogLegsBox', self.pieEnemyCollision)
 		self.accept('playerSphere-into-cogTorsoBox', self.cogToonCollision)
 		self.accept('cogTorsoBox-into-playerSphere', self.cogToonCollision)
 	
+	def firstFrame(self, task):
+		#Note how long it took to draw a frame (with whatever has been built by then)
+		self.startupTimes['firstFrame'] = time.perf_counter() - self.startTime
+		return task.done
+	
+	def worldReady(self):
+		self.startupTimes['worldReady'] = time.perf_counter() - self.startTime
+	
+	def measureWarmLoad(self):
+		#Read every file again now that Panda's model and texture pools hold them all
+		startTime = time.perf_counter()
+		warmLoader = AssetLoader(self.taskMgr)
+		warmLoader.request('all', self.startupModels, self.startupTextures)
+		warmLoader.wait()
+		warmLoader.destroy()
+		return time.perf_counter() - startTime
+	
+	def setUpPieCollisions(self, pieNode):
+		#Set up pie wall collision capsule
+		pieSphere = pieNode.attachNewNode(CollisionNode('pieSphere'))
+		pieSphere.node().addSolid(CollisionSphere(0, 0, 0, 0.75))
+		pieSphere.node().setFromCollideMask(self.pieSphereMask)
+		pieSphere.node().setIntoCollideMask(BitMask32.allOff())
+		pieSphere.show()
+		
+		#Add collisions to the handlers and the traverser (a pie waiting in the pool is off the scene graph, so it is skipped)
+		if self.batchCollisions:
+			self.collisionBatcher.addCollider(pieSphere, 'pie')
+		else:
+			self.wallHandler.addCollider(pieSphere, pieNode)
+			self.cTrav.addCollider(pieSphere, self.wallHandler)
+		self.pieHitDetector.addPie(pieNode)
+	
+	def countCollision(self, entry):
+		if self.profiler is not None:
+			self.profiler.countCollisionEntry(entry)
+	
+	def pieCollisions(self, entries):
+		#A frame's worth of pies touching terrain walls
+		for entry in entries:
+			if entry.getIntoNodePath().getNetTag('collisions') == 'walls':
+				self.pieTerrainCollision(entry)
+	
+	def pieEnemyCollisions(self, entries):
+		for entry in entries:
+			self.pieEnemyCollision(entry)
+	
+	def toonCollisions(self, entries):
+		#The toon's sensor touches the walls too, but only cogs hurt
+		for entry in entries:
+			if entry.getIntoNodePath().getName() == 'cogTorsoBox':
+				self.cogToonCollision(entry)
+	
 	def pieTerrainCollision(self, entry):
+		self.countCollision(entry)
+		self.pieHitTerrain(entry.getFromNodePath().getNetPythonTag('pie'))
+	
+	def pieFloorCollision(self, pie):
+		if self.profiler is not None:
+			self.profiler.countCollision('pie', 'floor')
+		self.pieHitTerrain(pie)
+	
+	def pieSweptTerrainCollision(self, pie, entry):
+		self.countCollision(entry)
+		self.pieHitTerrain(pie)
+	
+	def pieHitTerrain(self, pie):
 		print('Terrain collision!')
 		
+		#Hand the pie back to its pool
+		if pie is not None:
+			pie.pool.releasePie(pie)
+		
 	def pieEnemyCollision(self, entry):
+		#Find which pie hit which cog
+		self.countCollision(entry)
+		self.pieHitCog(entry.getFromNodePath().getNetPythonTag('pie'), entry.getIntoNodePath().getNetPythonTag('randomCog'))
+	
+	def pieHitCog(self, pie, enemy, box=None):
+		#A pie only splats on one cog, then goes back to the pool
+		if pie is None or not pie.isFlying:
+			return
+		if box is not None and self.profiler is not None:
+			self.profiler.countCollision('pieArc', box.getName())
+		pie.pool.releasePie(pie)
+		
+		#Ignore cogs that are already on their way out
+		if enemy is None or enemy.currentHealth <= 0:
+			return
+		
 		#Reduce cog health and update it
-		self.enemy.currentHealth -= 1
-		self.enemy.updateHealth()
+		enemy.currentHealth -= 1
+		enemy.updateHealth()
 	
 	def cogToonCollision(self, entry):
 		#Reduce toon health, play toon damage animation, play finger wag
 		#self.player.health -= 1
+		self.countCollision(entry)
 		
 		print('Toon take damage!')
 	
+	def getReplayState(self):
+		#Where everything ended up, for checking a replay against its recording
+		toon = self.player.toon
+		return {'toon': [round(value, 4) for value in list(toon.getPos(render)) + list(toon.getHpr(render))],
+				'toonHealth': self.player.health,
+				'cogs': [{'name': cog.spec.name,
+						'pos': [round(value, 4) for value in cog.cog.getPos(render)],
+						'health': cog.currentHealth} for cog in self.waveManager.activeCogs],
+				'flyingPies': len(self.player.piePool.flyingPies),
+				'waves': self.waveManager.wavesSpawned}
+	
+	def runFixedSteps(self, ticks, tickRate=60):
+		#Step the task manager (and with it the intervals and the traverser) on a simulated clock
+		#that advances exactly 1/tickRate seconds per tick, as fast as the CPU allows
+		globalClock.setMode(ClockObject.MNonRealTime)
+		globalClock.setFrameRate(tickRate)
+		
+		startTime = time.perf_counter()
+		for tick in range(ticks):
+			self.taskMgr.step()
+		elapsedTime = time.perf_counter() - startTime
 		
-pieThrow = PieThrow()
-pieThrow.run()
+		#Report how fast the simulation ran compared to real time
+		ticksPerSecond = ticks / elapsedTime if elapsedTime > 0 else float('inf')
+		return {'ticks': ticks,
+				'tickRate': tickRate,
+				'simulatedSeconds': ticks / tickRate,
+				'wallSeconds': elapsedTime,
+				'ticksPerSecond': ticksPerSecond,
+				'realTimeFactor': ticksPerSecond / tickRate}
+
+def parseArguments(args=None):
+	parser = argparse.ArgumentParser(description='Pie Throw')
+	parser.add_argument('--headless', action='store_true', help='run without a window on a fixed simulated clock')
+	parser.add_argument('--ticks', type=int, default=3600, help='number of fixed steps to simulate when headless')
+	parser.add_argument('--tick-rate', type=int, default=60, help='simulated ticks per second when headless')
+	parser.add_argument('--cogs', type=int, default=1, help='number of cogs per wave')
+	parser.add_argument('--swept-pies', action='store_true', help='find pie impacts along their whole arc instead of every frame')
+	parser.add_argument('--no-profile', action='store_true', help='turn off the per-task frame time instrumentation')
+	parser.add_argument('--profile-json', default=None, help='write a frame time snapshot to this JSON file on exit')
+	parser.add_argument('--profile-csv', default=None, help='write a frame time snapshot to this CSV file on exit')
+	parser.add_argument('--stream-assets', action='store_true', help='draw frames while the toon and cogs are still loading')
+	parser.add_argument('--startup-report', action='store_true', help='print cold and warm startup times')
+	parser.add_argument('--unbaked', action='store_true', help='assemble the characters from their parts even if they have been baked')
+	parser.add_argument('--memory-budget', type=float, default=None, help='megabytes the cogs may hold; past it, new cogs come from the pools')
+	parser.add_argument('--collision-events', action='store_true', help='send every collision through the messenger instead of once-a-frame batches')
+	parser.add_argument('--seed', type=int, default=None, help='seed for the random number generator')
+	parser.add_argument('--record', default=None, help='record the input (and the seed) on a fixed-step clock to this file')
+	parser.add_argument('--replay', default=None, help='replay a recorded session as fast as possible and check where it ends up')
+	return parser.parse_args(args)
+
+if __name__ == '__main__':
+	arguments = parseArguments()
+	
+	#A replay builds the same world the recording was made in, and runs for as many frames
+	recording = loadRecording(arguments.replay) if arguments.replay is not None else None
+	if recording is not None:
+		arguments.seed = recording['seed']
+		arguments.cogs = recording['cogs']
+		arguments.swept_pies = recording['sweptPies']
+		arguments.collision_events = not recording.get('batchCollisions', False)
+		arguments.memory_budget = recording.get('memoryBudgetMB')
+		arguments.tick_rate = recording['tickRate']
+		arguments.ticks = recording['frames']
+		arguments.headless = arguments.headless or recording['headless']
+	elif arguments.record is not None and arguments.seed is None:
+		arguments.seed = random.randrange(2 ** 32)
+	
+	#Seed before the world is built so the same cogs get picked
+	if arguments.seed is not None:
+		random.seed(arguments.seed)
+	
+	pieThrow = PieThrow(headless=arguments.headless, cogCount=arguments.cogs, sweptPies=arguments.swept_pies,
+						profile=not arguments.no_profile, streamAssets=arguments.stream_assets,
+						useBaked=not arguments.unbaked, memoryBudgetMB=arguments.memory_budget,
+						batchCollisions=not arguments.collision_events,
+						tickRate=arguments.tick_rate if arguments.headless or arguments.record is not None or recording is not None else None)
+	
+	#Count frames (and feed or record input) from here on
+	recorder = None
+	if recording is not None:
+		inputPlayer = InputPlayer(pieThrow.taskMgr, recording['events'])
+	elif arguments.record is not None:
+		recorder = InputRecorder({'seed': arguments.seed, 'cogs': arguments.cogs, 'sweptPies': arguments.swept_pies,
+								'batchCollisions': not arguments.collision_events, 'memoryBudgetMB': arguments.memory_budget,
+								'tickRate': arguments.tick_rate, 'headless': arguments.headless})
+	
+	if arguments.headless or recording is not None:
+		stats = pieThrow.runFixedSteps(arguments.ticks, arguments.tick_rate)
+		print('Simulated {ticks} ticks ({simulatedSeconds:.1f}s) in {wallSeconds:.3f}s: '
+			'{ticksPerSecond:.0f} ticks/s, {realTimeFactor:.1f}x real time'.format(**stats))
+		#A streamed run can finish before the loader gets to the cogs
+		if pieThrow.waveManager is None:
+			print('The cogs were not built yet')
+		else:
+			waveStats = pieThrow.waveManager.getStats()
+			print('Cogs hold {0:.1f} MB ({1[nodes]} nodes, {1[vertices]} vertices, {1[textures]} textures, {1[animations]} animations); '
+				'{2} built, {3} refused'.format(waveStats['memory']['totalBytes'] / (1024.0 * 1024.0), waveStats['memory'],
+												waveStats['built'], waveStats['refused']))
+	else:
+		try:
+			pieThrow.run()
+		except SystemExit:
+			pass
+	
+	#Save the recording, or check the replay against it
+	replayDifferences = []
+	if recorder is not None:
+		recorder.save(arguments.record, pieThrow.getReplayState())
+		print('Recorded {0} input events to {1}'.format(len(recorder.events), arguments.record))
+	if recording is not None:
+		replayDifferences = compareStates(recording['finalState'], pieThrow.getReplayState())
+		if replayDifferences:
+			print('Replay did NOT match the recording:')
+			for difference in replayDifferences:
+				print('  ' + difference)
+		else:
+			print('Replay matched the recording')
+	
+	#Report how long the world took to load from scratch, and how long reading its files takes once they are cached
+	if arguments.startup_report:
+		startupTimes = pieThrow.startupTimes
+		print('Cold start: first frame after {0:.0f} ms, world ready after {1:.0f} ms'.format(
+			startupTimes.get('firstFrame', float('nan')) * 1000, startupTimes.get('worldReady', float('nan')) * 1000))
+		for name, times in pieThrow.assetLoader.getTimes(pieThrow.startTime).items():
+			print('  {0}: files read after {1:.0f} ms, built after {2:.0f} ms'.format(name, times['loaded'] * 1000, times['ready'] * 1000))
+		print('Warm start: files read in {0:.0f} ms'.format(pieThrow.measureWarmLoad() * 1000))
+	
+	#Save where the frame time went
+	if pieThrow.profiler is not None:
+		if arguments.profile_json is not None:
+			pieThrow.profiler.exportJson(arguments.profile_json)
+		if arguments.profile_csv is not None:
+			pieThrow.profiler.exportCsv(arguments.profile_csv)
+	
+	#Fail a replay that didn't end up where its recording did
+	if replayDifferences:
+		sys.exit(1)
@@ -0,0 +1,75 @@
+'''
+John Maurer
+
+Description: A class that finds pie hits on cogs by only testing the cogs in the
+grid cells around each pie, instead of handing every cog to the main traverser
+'''
+
+from panda3d.core import *
+
+class PieHitDetector():
+	def __init__(self, taskMgr, grid, hitMask, onHit, pieRadius=0.75, cogReach=6):
+		self.taskMgr = taskMgr
+		self.grid = grid
+		self.hitMask = hitMask
+		self.onHit = onHit
+
+		#Cogs are filed by where they stand, so look far enough out to reach the edge of a big cog
+		self.reach = pieRadius + cogReach
+		self.pieRadius = pieRadius
+
+		#A private traverser only ever sees the nearby cogs
+		self.traverser = CollisionTraverser('pie hits')
+		self.queue = CollisionHandlerQueue()
+		self.pies = []
+
+		#Contacts from last frame, so each hit is only reported when it starts (like an in pattern)
+		self.contacts = set()
+
+		#Run after the intervals have moved the pies
+		self.task = self.taskMgr.add(self.detectHits, 'pie hits', sort=35)
+
+	def addPie(self, pieNode):
+		#Give the pie a sphere that only this detector tests
+		hitSphere = pieNode.attachNewNode(CollisionNode('pieHitSphere'))
+		hitSphere.node().addSolid(CollisionSphere(0, 0, 0, self.pieRadius))
+		hitSphere.node().setFromCollideMask(self.hitMask)
+		hitSphere.node().setIntoCollideMask(BitMask32.allOff())
+		self.traverser.addCollider(hitSphere, self.queue)
+		self.pies.append(pieNode)
+		return hitSphere
+
+	def removePie(self, pieNode):
+		hitSphere = pieNode.find('pieHitSphere')
+		if not hitSphere.isEmpty():
+			self.traverser.removeCollider(hitSphere)
+		if pieNode in self.pies:
+			self.pies.remove(pieNode)
+
+	def detectHits(self, task):
+		#Broad phase: gather the cogs near any pie (in the order they were found, so hits come out the same every run)
+		nearbyCogs = {}
+		for pieNode in self.pies:
+			#Pies off the scene graph (such as ones waiting in a pool) can't hit anything
+			if pieNode.getParent().isEmpty():
+				continue
+			position = pieNode.getPos(render)
+			nearbyCogs.update(dict.fromkeys(self.grid.query(position.getX(), position.getY(), self.reach)))
+
+		#Narrow phase: test the pies against just those cogs
+		contacts = set()
+		for cog in nearbyCogs:
+			self.traverser.traverse(cog.cog)
+			for entry in self.queue.getEntries():
+				contact = (entry.getFromNodePath().getKey(), entry.getIntoNodePath().getKey())
+				contacts.add(contact)
+				if contact not in self.contacts:
+					self.onHit(entry)
+
+		self.contacts = contacts
+		return task.cont
+
+	def destroy(self):
+		self.taskMgr.remove(self.task)
+		self.traverser.clearColliders()
+		self.pies = []
@@ -0,0 +1,118 @@
+'''
+John Maurer
+
+Description: A fixed-size pool of pies that can be in the air at the same time.
+Every pie is built once up front, flown by one task, and handed back to the
+pool when it lands, hits something, or runs out of time
+'''
+
+from panda3d.core import *
+
+class Pie():
+	def __init__(self, index, model, pool):
+		#The node that flies (and carries the collision solids), with the pie model under it
+		self.index = index
+		self.pool = pool
+
+		#Known by this id in world snapshots (the world hands out its own, so no two of its pies share one)
+		self.pieId = index
+		self.pieNode = NodePath('pieNode')
+		self.pieNode.setPythonTag('pie', self)
+		self.model = model.copyTo(self.pieNode)
+
+		#Flight state, kept as plain numbers so a throw builds nothing new
+		self.isFlying = False
+		self.launchTime = 0.0
+		self.startX = self.startY = self.startZ = 0.0
+		self.velocityX = self.velocityY = self.velocityZ = 0.0
+
+class PiePool():
+	def __init__(self, taskMgr, model, size=8, duration=5, gravity=32.):
+		self.taskMgr = taskMgr
+		self.duration = duration
+		self.zAcceleration = -gravity
+
+		#Every pie waits off the scene graph until it is thrown
+		self.pies = [Pie(index, model, self) for index in range(size)]
+		self.idlePies = list(reversed(self.pies))
+		self.flyingPies = []
+
+		#Works out impacts along each pie's whole arc, if set (otherwise the traverser finds them)
+		self.sweeper = None
+
+		#Floor heights to land pies on, and who to tell when one does (without a sweeper)
+		self.heightfield = None
+		self.onFloorHit = None
+
+		#Fly every pie from one task, alongside the intervals
+		self.task = self.taskMgr.add(self.flyPies, 'fly pies', sort=20)
+
+	def launch(self, pos, hpr, launchVelocity=Vec3(0, 0, 75)):
+		#Take an idle pie, or reuse the one that has been flying longest if they are all in the air
+		if self.idlePies:
+			pie = self.idlePies.pop()
+		else:
+			pie = self.flyingPies[0]
+			self.releasePie(pie)
+			self.idlePies.remove(pie)
+
+		#Place the pie, then throw it along its own Z axis
+		pie.pieNode.reparentTo(render)
+		pie.pieNode.setPos(pos)
+		pie.model.setHpr(hpr)
+		velocity = render.getRelativeVector(pie.model, launchVelocity)
+
+		pie.launchTime = globalClock.getFrameTime()
+		pie.startX, pie.startY, pie.startZ = pos[0], pos[1], pos[2]
+		pie.velocityX, pie.velocityY, pie.velocityZ = velocity[0], velocity[1], velocity[2]
+		pie.isFlying = True
+		self.flyingPies.append(pie)
+
+		if self.sweeper is not None:
+			self.sweeper.launch(pie, self.zAcceleration, self.duration)
+		return pie
+
+	def flyPies(self, task):
+		#Arch those pies! (the same parabola a ProjectileInterval follows)
+		#Walk the list backwards so landed pies can be released along the way
+		now = globalClock.getFrameTime()
+		for index in range(len(self.flyingPies) - 1, -1, -1):
+			pie = self.flyingPies[index]
+			t = now - pie.launchTime
+			if self.sweeper is not None and self.sweeper.update(pie, min(t, self.duration)):
+				continue
+			if t >= self.duration:
+				self.releasePie(pie)
+				continue
+			x = pie.startX + pie.velocityX * t
+			y = pie.startY + pie.velocityY * t
+			z = pie.startZ + pie.velocityZ * t + 0.5 * self.zAcceleration * t * t
+
+			#The pie lands once the floor is within a unit under it
+			if self.sweeper is None and self.heightfield is not None:
+				floorHeight = self.heightfield.getHeight(x, y)
+				if floorHeight is not None and z - 1 <= floorHeight:
+					if self.onFloorHit is not None:
+						self.onFloorHit(pie)
+					else:
+						self.releasePie(pie)
+					continue
+			pie.pieNode.setFluidPos(x, y, z)
+		return task.cont
+
+	def releasePie(self, pie):
+		#Take the pie out of the world and put it back in the pool
+		if not pie.isFlying:
+			return
+		pie.isFlying = False
+		self.flyingPies.remove(pie)
+		pie.pieNode.detachNode()
+		self.idlePies.append(pie)
+
+	def destroy(self):
+		self.taskMgr.remove(self.task)
+		for pie in self.pies:
+			pie.pieNode.removeNode()
+		self.pies = []
+		self.idlePies = []
+		self.flyingPies = []
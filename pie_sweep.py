@@ -0,0 +1,248 @@
+'''
+John Maurer
+
+Description: A class that finds where and when a flying pie will hit something
+by intersecting its whole arc with the terrain and the cogs' collision boxes,
+instead of testing the pie once per frame. The terrain impact is found once when
+the pie is thrown, and a cog impact is only worked out again when that cog moves
+'''
+
+from panda3d.core import *
+import math
+
+def quadraticIntervals(a, b, c, low, high, t0, t1):
+	#Return the sorted, disjoint time intervals in [t0, t1] where low <= a*t*t + b*t + c <= high
+	times = [t0, t1]
+	for bound in (low, high):
+		if abs(a) > 1e-9:
+			discriminant = b * b - 4 * a * (c - bound)
+			if discriminant >= 0:
+				root = math.sqrt(discriminant)
+				times.append((-b - root) / (2 * a))
+				times.append((-b + root) / (2 * a))
+		elif abs(b) > 1e-9:
+			times.append((bound - c) / b)
+	times = sorted(t for t in set(times) if t0 <= t <= t1)
+
+	#The value can only cross a bound at one of these times, so testing between them is enough
+	intervals = []
+	for start, end in zip(times, times[1:] + [None]):
+		probe = start if end is None else (start + end) / 2
+		value = (a * probe + b) * probe + c
+		if low <= value <= high:
+			if intervals and abs(intervals[-1][1] - start) < 1e-9:
+				intervals[-1] = (intervals[-1][0], start if end is None else end)
+			else:
+				intervals.append((start, start if end is None else end))
+	return intervals
+
+def intersectIntervals(first, second):
+	#Intersect two sorted lists of disjoint intervals
+	result = []
+	i = j = 0
+	while i < len(first) and j < len(second):
+		start = max(first[i][0], second[j][0])
+		end = min(first[i][1], second[j][1])
+		if start <= end:
+			result.append((start, end))
+		if first[i][1] < second[j][1]:
+			i += 1
+		else:
+			j += 1
+	return result
+
+def parabolaBoxImpact(parabola, boxMin, boxMax, padding, t0, t1):
+	#Earliest time in [t0, t1] that the parabola is inside the padded box, or None
+	a, b, c = parabola.getA(), parabola.getB(), parabola.getC()
+	intervals = [(t0, t1)]
+	for axis in range(3):
+		intervals = intersectIntervals(intervals, quadraticIntervals(a[axis], b[axis], c[axis],
+										boxMin[axis] - padding[axis], boxMax[axis] + padding[axis], t0, t1))
+		if not intervals:
+			return None
+	return intervals[0][0]
+
+class CogImpact():
+	def __init__(self):
+		#The cog's placement when this impact was worked out, and what it found
+		self.state = None
+		self.time = None
+		self.box = None
+
+class SweptPie():
+	def __init__(self):
+		self.parabola = None
+		self.terrainTime = None
+		self.terrainEntry = None
+		self.endTime = 0.0
+		self.lastTime = 0.0
+		self.pathCells = []
+		self.cogImpacts = {}
+
+class PieSweeper():
+	def __init__(self, grid, terrainMask, onTerrainHit, onCogHit, pieRadius=0.75, cogReach=6, moveTolerance=0.2, turnTolerance=5):
+		self.grid = grid
+		self.onTerrainHit = onTerrainHit
+		self.onCogHit = onCogHit
+		self.pieRadius = pieRadius
+		self.reach = pieRadius + cogReach
+
+		#How far a cog has to walk (or turn, in degrees) before its impact is worked out again
+		self.moveTolerance = moveTolerance
+		self.turnTolerance = turnTolerance
+
+		#A one-shot traverser that follows a whole arc through the terrain when a pie is thrown
+		self.traverser = CollisionTraverser('pie sweep')
+		self.queue = CollisionHandlerQueue()
+		self.arcNode = NodePath(CollisionNode('pieArc'))
+		self.arcNode.node().setFromCollideMask(terrainMask)
+		self.arcNode.node().setIntoCollideMask(BitMask32.allOff())
+		self.traverser.addCollider(self.arcNode, self.queue)
+
+		#Sweep state for each pie, kept between throws
+		self.sweptPies = {}
+
+	def launch(self, pie, zAcceleration, duration):
+		swept = self.sweptPies.get(pie)
+		if swept is None:
+			swept = self.sweptPies[pie] = SweptPie()
+
+		#The pie's whole flight, with time in seconds as the parameter
+		swept.parabola = LParabola(LVector3(0, 0, 0.5 * zAcceleration),
+									LVector3(pie.velocityX, pie.velocityY, pie.velocityZ),
+									LPoint3(pie.startX, pie.startY, pie.startZ))
+		swept.cogImpacts.clear()
+		swept.lastTime = 0.0
+
+		#Follow the arc through the terrain once, keeping the first thing it hits
+		self.arcNode.reparentTo(render)
+		self.arcNode.node().clearSolids()
+		self.arcNode.node().addSolid(CollisionParabola(swept.parabola, 0, duration))
+		self.traverser.traverse(render)
+		self.arcNode.detachNode()
+
+		swept.terrainTime = None
+		swept.terrainEntry = None
+		if self.queue.getNumEntries() > 0:
+			self.queue.sortEntries()
+			swept.terrainEntry = self.queue.getEntry(0)
+			swept.terrainTime = self.timeAtPoint(pie, swept.terrainEntry.getSurfacePoint(render))
+
+		#Note which grid cells the pie passes over, and when
+		swept.endTime = duration if swept.terrainTime is None else swept.terrainTime
+		swept.pathCells = self.findPathCells(pie, swept.endTime)
+
+		#Work out the impact with every cog along the way
+		for leave, enter, cell in swept.pathCells:
+			for cog in self.grid.cells.get(cell, ()):
+				self.updateCogImpact(pie, swept, cog)
+
+	def timeAtPoint(self, pie, point):
+		#The pie moves in a straight line over the ground, so use that when it can
+		flatSpeed = pie.velocityX * pie.velocityX + pie.velocityY * pie.velocityY
+		if flatSpeed > 1e-6:
+			return ((point[0] - pie.startX) * pie.velocityX + (point[1] - pie.startY) * pie.velocityY) / flatSpeed
+		return abs(point[2] - pie.startZ) / max(abs(pie.velocityZ), 1e-6)
+
+	def findPathCells(self, pie, endTime):
+		#Step along the pie's path over the ground half a cell at a time
+		flatSpeed = math.hypot(pie.velocityX, pie.velocityY)
+		step = endTime if flatSpeed < 1e-6 else min(endTime, 0.5 * self.grid.cellSize / flatSpeed)
+		step = max(step, 1e-3)
+
+		cellTimes = {}
+		t = 0.0
+		while True:
+			x = pie.startX + pie.velocityX * t
+			y = pie.startY + pie.velocityY * t
+			minX, minY = self.grid.cellAt(x - self.reach, y - self.reach)
+			maxX, maxY = self.grid.cellAt(x + self.reach, y + self.reach)
+			for cellX in range(minX, maxX + 1):
+				for cellY in range(minY, maxY + 1):
+					enter, leave = cellTimes.get((cellX, cellY), (t, t))
+					cellTimes[(cellX, cellY)] = (min(enter, t - step), max(leave, t + step))
+			if t >= endTime:
+				break
+			t = min(t + step, endTime)
+
+		#Sorted by when the pie leaves each cell, so passed cells can be skipped
+		return sorted((leave, enter, cell) for cell, (enter, leave) in cellTimes.items())
+
+	def updateCogImpact(self, pie, swept, cog):
+		#Only work the impact out again if the cog has moved since last time
+		impact = swept.cogImpacts.get(cog)
+		if impact is None:
+			impact = swept.cogImpacts[cog] = CogImpact()
+		position = cog.cog.getPos()
+		heading = cog.cog.getH()
+		if impact.state is not None:
+			x, y, z, h = impact.state
+			dx, dy, dz = position[0] - x, position[1] - y, position[2] - z
+			if dx * dx + dy * dy + dz * dz < self.moveTolerance * self.moveTolerance and abs(heading - h) < self.turnTolerance:
+				return impact
+		impact.state = (position[0], position[1], position[2], heading)
+		impact.time, impact.box = self.findCogImpact(pie, swept, cog, position, swept.lastTime, swept.endTime)
+		return impact
+
+	def findCogImpact(self, pie, swept, cog, position, t0, t1):
+		#Cogs standing well off to the side of the pie's path can't be hit
+		flatSpeed = math.hypot(pie.velocityX, pie.velocityY)
+		if flatSpeed > 1e-6:
+			offsetX = position[0] - pie.startX
+			offsetY = position[1] - pie.startY
+			if abs(offsetX * pie.velocityY - offsetY * pie.velocityX) / flatSpeed > self.reach:
+				return None, None
+
+		#Test the arc against each of the cog's boxes in the box's own coordinate space
+		bestTime = None
+		bestBox = None
+		for box in (cog.cogHeadBox, cog.cogTorsoBox, cog.cogLegsBox):
+			solid = box.node().getSolid(0)
+			localParabola = LParabola(swept.parabola)
+			localParabola.xform(render.getMat(box))
+			scale = box.getScale(render)
+			padding = (self.pieRadius / scale[0], self.pieRadius / scale[1], self.pieRadius / scale[2])
+			impactTime = parabolaBoxImpact(localParabola, solid.getMin(), solid.getMax(), padding, t0, t1)
+			if impactTime is not None and (bestTime is None or impactTime < bestTime):
+				bestTime = impactTime
+				bestBox = box
+		return bestTime, bestBox
+
+	def removePie(self, pie):
+		#Forget a pie whose pool is going away
+		self.sweptPies.pop(pie, None)
+
+	def update(self, pie, t):
+		#Return True if the pie hit something by time t
+		swept = self.sweptPies[pie]
+
+		#Skip the cells the pie has already passed
+		while swept.pathCells and swept.pathCells[0][0] < swept.lastTime:
+			swept.pathCells.pop(0)
+
+		#Only the cells the pie has reached can hold an impact that is due, and only cogs
+		#that have moved since their impact was worked out need another look
+		bestTime = None
+		bestCog = None
+		bestBox = None
+		for leave, enter, cell in swept.pathCells:
+			if enter > t:
+				continue
+			for cog in self.grid.cells.get(cell, ()):
+				impact = self.updateCogImpact(pie, swept, cog)
+
+				#Impacts from before the last update belong to a place the cog has since left
+				if impact.time is not None and swept.lastTime <= impact.time <= t and (bestTime is None or impact.time < bestTime):
+					bestTime = impact.time
+					bestCog = cog
+					bestBox = impact.box
+		swept.lastTime = t
+
+		#Whichever comes first, a cog or the terrain
+		if bestTime is not None and (swept.terrainTime is None or bestTime <= swept.terrainTime):
+			self.onCogHit(pie, bestCog, bestBox)
+			return True
+		if swept.terrainTime is not None and swept.terrainTime <= t:
+			self.onTerrainHit(pie, swept.terrainEntry)
+			return True
+		return False
@@ -10,11 +10,14 @@ from direct.interval.LerpInterval import LerpPosInterval,LerpHprInterval
 from direct.interval.ActorInterval import ActorInterval
 from direct.interval.IntervalGlobal import *
 from panda3d.core import *
+from cog_catalog import getCogCatalog, LIFE_METER_MODEL, LIFE_METER_GLOW_MODEL, PROPELLER_MODEL, PROPELLER_ANIM
+from asset_cache import getAssetCache
+from cog_memory import MemoryTally
+from timer_wheel import TimerWheel, Timer
 import sys,os
-import random
 
 class RandomCog():
-	def __init__(self, taskMgr, enemyMaskBit, wallMaskBit, player, maxHealth, speed):
+	def __init__(self, taskMgr, enemyMaskBit, wallMaskBit, player, maxHealth, speed, catalog=None, template=None, pos=(5, 5), heightfield=None, timerWheel=None):
 		#Initialize variables for the cog's health, speed, and scale
 		self.maxHealth = maxHealth
 		self.currentHealth = self.maxHealth
@@ -37,8 +40,47 @@ class RandomCog():
 		#Define location of the toon node
 		self.player = player
 		
-		#Select the cog from random
-		self.pickRandomCog()
+		#Use the process-wide asset cache, and the process-wide cog catalog unless one was supplied
+		self.assetCache = getAssetCache()
+		self.catalog = catalog if catalog is not None else getCogCatalog(self.pandaDirectory)
+		
+		#Called with this cog once it has been destroyed, so an owner can reuse it
+		self.onDestroyed = None
+		
+		#Walk on our own task unless an owner hands us a shared steering task
+		self.steering = None
+		self.walkingTask = None
+		
+		#Level of detail an owner uses to animate far cogs less often
+		self.animationLOD = None
+		
+		#Grid an owner uses to find cogs near a point, and floor heights to walk on
+		self.grid = None
+		self.heightfield = heightfield
+		
+		#Timed transitions and life meter blinks run on an owner's timer wheel (a cog without an owner runs its own).
+		#A cog only ever waits on one transition and one blink, so it keeps a timer for each
+		self.timerWheel = timerWheel if timerWheel is not None else TimerWheel(taskMgr)
+		self.transitionTimer = Timer()
+		self.blinkTimer = Timer()
+		self.blinkDelay = 1.0
+		self.entering = False
+		
+		#The animation the cog is playing (or posed in), and its control
+		self.animation = None
+		self.animControl = None
+		
+		#Select the cog from random, unless told which one to be
+		if template is None:
+			self.pickRandomCog()
+		else:
+			self.template = template
+			self.spec = self.template.spec
+			self.cog, self.head = self.template.instantiate()
+			self.scale = self.spec.scale
+		
+		#Let collision handlers find their way back to this object
+		self.cog.setPythonTag('randomCog', self)
 		
 		#Render the head and actor
 		self.cog.reparentTo(render)
@@ -53,40 +95,33 @@ class RandomCog():
 		'''
 		
 		#Set up life meter
-		self.lifeMeter = loader.loadModel(self.pandaDirectory + '/resources/cogs/models/matching_game_gui.bam').find('**/minnieCircle')
+		self.lifeMeter = self.assetCache.loadModel(self.pandaDirectory + '/resources/cogs/models/' + LIFE_METER_MODEL).find('**/minnieCircle')
 		self.lifeMeter.reparentTo(self.cog.find('**/def_joint_attachMeter'))
 		self.lifeMeter.setHpr(180, 0.8, 0)
 		self.lifeMeter.setY(0.02)
 		self.lifeMeter.setScale(3)
 		self.lifeMeter.setColor(0, 1, 0)
 		
-		self.lifeMeterGlow = loader.loadModel(self.pandaDirectory + '/resources/cogs/models/glow.bam')
+		self.lifeMeterGlow = self.assetCache.loadModel(self.pandaDirectory + '/resources/cogs/models/' + LIFE_METER_GLOW_MODEL)
 		self.lifeMeterGlow.reparentTo(self.lifeMeter)
 		self.lifeMeterGlow.setScale(0.25)
 		self.lifeMeterGlow.setPos(-0.01, 0.01, 0.02)
 		
-		#Get the sizes of the head, torso, and legs
-		min, max = self.head.getTightBounds()
-		self.headSize = max - min
-		min, max = self.cog.find('**/torso').getTightBounds()
-		self.torsoSize = max - min
-		min, max = self.cog.find('**/legs').getTightBounds()
-		self.legSize = max - min
+		#Get the sizes of the torso and legs
+		torsoMin, torsoMax, self.torsoCenter = self.getPartBounds('torso')
+		self.torsoSize = torsoMax - torsoMin
+		legMin, legMax, self.legCenter = self.getPartBounds('legs')
+		self.legSize = legMax - legMin
+		
+		#The colliders ride on the cog's body (its torso and legs don't move relative to it)
+		self.body = self.cog.getPart('modelRoot')
 		
 		#Set up box collider for cog head
-		self.cogHeadBox = self.head.attachNewNode(CollisionNode('cogHeadBox'))
-		self.cogHeadBox.node().addSolid(CollisionBox(self.head.getBounds().getCenter(), 
-										(self.headSize.getX() / 2),
-										(self.headSize.getY() / 2),
-										(self.headSize.getZ() / 2)
-										))
-		self.cogHeadBox.node().setFromCollideMask(self.ENEMY_MASK)
-		self.cogHeadBox.node().setIntoCollideMask(self.ENEMY_MASK)
-		#self.cogHeadBox.show()
+		self.setUpHeadBox()
 		
 		#Set up box collider for cog torso
-		self.cogTorsoBox = self.cog.find('**/torso').attachNewNode(CollisionNode('cogTorsoBox'))
-		self.cogTorsoBox.node().addSolid(CollisionBox(self.cog.find('**/torso').getBounds().getCenter(), 
+		self.cogTorsoBox = self.body.attachNewNode(CollisionNode('cogTorsoBox'))
+		self.cogTorsoBox.node().addSolid(CollisionBox(self.torsoCenter, 
 										(self.torsoSize.getX() / 2) + (self.torsoSize.getX() / 5),
 										(self.torsoSize.getY() / 2),
 										(self.torsoSize.getZ() / 2)
@@ -96,8 +131,8 @@ class RandomCog():
 		#self.cogTorsoBox.show()
 		
 		#Set up box collider for cog legs
-		self.cogLegsBox = self.cog.find('**/torso').attachNewNode(CollisionNode('cogLegsBox'))
-		self.cogLegsBox.node().addSolid(CollisionBox(self.cog.find('**/legs').getBounds().getCenter(), 
+		self.cogLegsBox = self.body.attachNewNode(CollisionNode('cogLegsBox'))
+		self.cogLegsBox.node().addSolid(CollisionBox(self.legCenter, 
 										(self.legSize.getX() / 2),
 										(self.legSize.getY() / 2),
 										(self.legSize.getZ() / 2)
@@ -107,55 +142,165 @@ class RandomCog():
 		#self.cogLegsBox.show()
 		
 		#Set up propeller
-		self.propeller = Actor(self.pandaDirectory + '/resources/cogs/models/propeller-mod.bam', {
-								'fly':self.pandaDirectory + '/resources/cogs/models/propeller-chan.bam'})
-		self.propeller.loop('fly', fromFrame=0, toFrame=5)
+		self.propeller = self.assetCache.loadActor(self.pandaDirectory + '/resources/cogs/models/' + PROPELLER_MODEL, {
+								'fly':self.pandaDirectory + '/resources/cogs/models/' + PROPELLER_ANIM})
 		self.propeller.setP(5)
 		self.propeller.reparentTo(self.head)
 		
-		#Put the cog in a random position on the map
-		self.cog.setPos(5, 5, 20)
+		#Establish the flying movement (the end positions are filled in by spawn); the timer wheel
+		#starts each part of the entrance in turn
+		self.flyDown = LerpPosInterval(self.cog, duration=4, pos=(0, 0, 2))
+		self.land = LerpPosInterval(self.cog, duration=1, pos=(0, 0, 0))
+		self.landingWait = 2.8
 		
-		#Establish the flying movement
-		self.cog.pose('landing', 0)
-		self.flyDown = LerpPosInterval(self.cog, duration=4, pos=(self.cog.getX(), self.cog.getY(), 2))
-		self.land = LerpPosInterval(self.cog, duration=1, pos=(self.cog.getX(), self.cog.getY(), 0))
-		self.entranceAnim = Sequence(self.flyDown,
-							Func(self.cog.play, ['landing']),
-							Func(self.propeller.play, ['fly']),
-							self.land,
-							Wait(2.8),
-							Func(self.startWalk))
-							
 		#Start flying down!
-		self.entranceAnim.start()
+		self.spawn(pos)
 	
-	def startWalk(self):
-		#Set the cog to walk, then call the task manager to have the cog walk towards the player
-		self.cog.loop('walk')
+	def getPartBounds(self, partName):
+		#Return a body part's tight bounds and center, which a baked cog (whose parts are flattened together) has written down
+		bakedBounds = self.cog.find('**/=' + partName + 'Bounds')
+		if not bakedBounds.isEmpty():
+			values = [float(value) for value in bakedBounds.getTag(partName + 'Bounds').split()]
+			return Point3(*values[0:3]), Point3(*values[3:6]), Point3(*values[6:9])
+		part = self.cog.find('**/' + partName)
+		min, max = part.getTightBounds()
+		return min, max, part.getBounds().getCenter()
+	
+	def setUpHeadBox(self):
+		#Size the head collider to whichever head is currently attached
+		min, max = self.head.getTightBounds()
+		self.headSize = max - min
 		
-		self.walkingTask = self.taskMgr.add(self.walkingCog, 'walking cog')
+		self.cogHeadBox = self.head.attachNewNode(CollisionNode('cogHeadBox'))
+		self.cogHeadBox.node().addSolid(CollisionBox(self.head.getBounds().getCenter(), 
+										(self.headSize.getX() / 2),
+										(self.headSize.getY() / 2),
+										(self.headSize.getZ() / 2)
+										))
+		self.cogHeadBox.node().setFromCollideMask(self.ENEMY_MASK)
+		self.cogHeadBox.node().setIntoCollideMask(self.ENEMY_MASK)
+		#self.cogHeadBox.show()
+	
+	def spawn(self, pos):
+		#Put the cog high above the requested position on the map
+		self.cog.setPos(pos[0], pos[1], 20)
+		self.cog.setHpr(0, 0, 0)
 		
-		#Establish the hit, then walk animation
-		self.hitThenWalk = Sequence(Func(self.taskMgr.remove, [self.walkingTask]),
-							Func(self.cog.play, ['hit']),
-							Wait(2.5),
-							Func(self.startWalk))
+		#Aim the flying movement at the new position, then start flying down!
+		self.cog.pose('landing', 0)
+		self.setAnimation('landing')
+		self.propeller.loop('fly', fromFrame=0, toFrame=5)
+		if self.grid is not None:
+			self.grid.updateCog(self, pos[0], pos[1])
+		floorHeight = self.heightfield.getHeight(pos[0], pos[1], 0) if self.heightfield is not None else 0
+		self.flyDown.setEndPos(Point3(pos[0], pos[1], floorHeight + 2))
+		self.land.setEndPos(Point3(pos[0], pos[1], floorHeight))
+		self.entering = True
+		self.flyDown.start()
+		self.timerWheel.schedule(self.transitionTimer, self.flyDown.getDuration(), self.startLanding)
+	
+	def startLanding(self):
+		self.cog.play('landing')
+		self.propeller.play('fly')
+		self.land.start()
+		self.timerWheel.schedule(self.transitionTimer, self.land.getDuration() + self.landingWait, self.startWalk)
+	
+	def finishEntrance(self):
+		#Put the cog down where it was headed right away (and start it walking)
+		if not self.entering:
+			return
+		self.finishFlight()
+		self.startWalk()
+	
+	def finishFlight(self):
+		self.entering = False
+		self.flyDown.finish()
+		self.land.finish()
+		self.timerWheel.cancel(self.transitionTimer)
+	
+	def recycle(self, template, pos=(5, 5)):
+		#Reuse this cog (and its Actor) as another cog of the same suit type
+		if template.spec.suit != self.spec.suit:
+			raise Exception('UH OH! A suit {} cog cannot be recycled as a suit {} cog!'.format(self.spec.suit, template.spec.suit))
+		if template.poolKey != self.template.poolKey:
+			raise Exception('UH OH! A baked {} cog cannot be recycled as a {} cog!'.format(self.spec.name, template.spec.name))
+		
+		#Swap in the new head and colors if the cog changed
+		if template is not self.template:
+			self.template = template
+			self.spec = self.template.spec
+			self.scale = self.spec.scale
+			self.template.dress(self.cog)
+			self.cog.setScale(self.scale)
+			self.cog.setHpr(0, 0, 0)
+			
+			#Move the propeller over before the old head (and its collider) goes away
+			oldHead = self.head
+			self.head = self.template.instantiateHead()
+			self.head.reparentTo(self.cog.find('**/def_head'))
+			self.propeller.reparentTo(self.head)
+			oldHead.removeNode()
+			self.setUpHeadBox()
+		
+		#Restore full health
+		self.currentHealth = self.maxHealth
+		self.lifeMeter.setColor(0, 1, 0)
+		self.lifeMeter.show()
+		self.lifeMeterGlow.show()
 		
-		#Establish the hit, then destruct animation
-		self.hitThenDestroy = Sequence(Func(self.taskMgr.remove, [self.walkingTask]),
-							Func(self.cog.play, ['hit']),
-							Wait(2.5),
-							Func(self.destruct))
+		#Put the cog back in the world
+		self.cog.reparentTo(render)
+		self.spawn(pos)
+	
+	def startWalk(self):
+		#Set the cog to walk, then call the task manager to have the cog walk towards the player
+		self.entering = False
+		self.cog.loop('walk')
+		self.setAnimation('walk')
 		
+		if self.steering is not None:
+			self.steering.addCog(self)
+		else:
+			self.walkingTask = self.taskMgr.add(self.walkingCog, 'walking cog')
+		if self.animationLOD is not None:
+			self.animationLOD.addCog(self)
+	
+	def getHit(self, then):
+		#Stop, play the hit animation, then after a moment either walk again or destruct
+		#(a cog hit on its way down lands on the spot)
+		if self.entering:
+			self.finishFlight()
+		self.stopWalking()
+		self.cog.play('hit')
+		self.setAnimation('hit')
+		self.timerWheel.schedule(self.transitionTimer, 2.5, then)
+		
+	def setAnimation(self, animation):
+		#Remember what the cog is playing, so others (like world snapshots) can look it up without asking the Actor
+		self.animation = animation
+		self.animControl = self.cog.getAnimControl(animation) if animation is not None else None
+	
 	def walkingCog(self, task):
 		#Make the cog look at the toon...
 		self.cog.lookAt(self.player.toon)
 		
 		#Then walk towards them!
 		self.cog.setY(self.cog, self.speed)
+		if self.heightfield is not None:
+			self.cog.setZ(self.heightfield.getHeight(self.cog.getX(), self.cog.getY(), self.cog.getZ()))
+		if self.grid is not None:
+			self.grid.updateCog(self, self.cog.getX(), self.cog.getY())
 		
 		return task.cont
+	
+	def stopWalking(self):
+		if self.animationLOD is not None:
+			self.animationLOD.removeCog(self)
+		if self.steering is not None:
+			self.steering.removeCog(self)
+		if self.walkingTask is not None:
+			self.taskMgr.remove(self.walkingTask)
+			self.walkingTask = None
 		
 	def updateHealth(self):
 		#Update the life meter, depending on the cog's health
@@ -168,339 +313,75 @@ class RandomCog():
 		elif (self.currentHealth / self.maxHealth) >= 0.05:
 			self.lifeMeter.setColor(1, 0, 0)
 		elif (self.currentHealth / self.maxHealth) > 0:
-			self.taskMgr.add(self.blink, 'blink', extraArgs=[1.0], appendTask=True)
+			self.startBlink(1.0)
 		else:
 			#Destroy cog
-			self.taskMgr.add(self.blink, 'blink', extraArgs=[0.5], appendTask=True)
-			self.hitThenDestroy.start()
+			self.startBlink(0.5)
+			self.getHit(self.destruct)
 			return
 		
 		#If the cog is still alive, have him get hit then walk
-		self.hitThenWalk.start()
+		self.getHit(self.startWalk)
 			
 		
-	def blink(self, delayTime, task):
+	def startBlink(self, delayTime):
+		#Each cog blinks on its own timer, so stopping it never touches another cog's
+		self.blinkDelay = delayTime
+		self.timerWheel.schedule(self.blinkTimer, 0, self.blink)
+	
+	def blink(self):
 		#If the current color is red... (getColor need to be compared to an LColor)
 		if self.lifeMeter.getColor() == LColor(1, 0, 0, 1):
 			#Change color to grey and set delay time
 			self.lifeMeter.setColor(0.45, 0.45, 0.45)
 			self.lifeMeterGlow.hide()
-			task.delayTime = 0.1
+			delayTime = 0.1
 		else:
 			#Change color to red and set delay time
 			self.lifeMeter.setColor(1, 0, 0)
 			self.lifeMeterGlow.show()
-			task.delayTime = delayTime
-			
-		return task.again
+			delayTime = self.blinkDelay
+		
+		self.timerWheel.schedule(self.blinkTimer, delayTime, self.blink)
 	
 	def destruct(self):
-		#Remove the light animation from the task manager
-		self.taskMgr.remove(self.walkingTask)
-		self.taskMgr.remove('blink')
-		self.lifeMeter.hide()
-		
 		#Play the destruction animation, then remove the model
 		print('BOOM!')
+		self.removeFromWorld()
+		
+		#Let the owner know this cog is free to be reused
+		if self.onDestroyed is not None:
+			self.onDestroyed(self)
+		
+	def removeFromWorld(self):
+		#Remove the walking and light animations from the task manager
+		self.stopWalking()
+		if self.grid is not None:
+			self.grid.removeCog(self)
+		self.timerWheel.cancel(self.blinkTimer)
+		self.lifeMeter.hide()
 		
-	def pickRandomCog(self):
-		#Generate a random number between 0 and 31 inclusive to select a cog
-		self.randomNumber = random.randint(0, 31)
-		
-		#Num cogs in suits
-		#A - 14
-		#B - 9
-		#C - 9
-		
-		#Determine which cog the random number generator picked and set its properties
-		if self.randomNumber <= 13:
-			#Render the suit A type cogs
-			self.cog = Actor(self.pandaDirectory + '/resources/cogs/models/tt_a_ene_cga_zero.bam',{
-						'neutral':(self.pandaDirectory + '/resources/cogs/animations/tt_a_ene_cga_neutral.bam'),
-						'walk':(self.pandaDirectory + '/resources/cogs/animations/tt_a_ene_cga_walk.bam'),
-						'finger wag':(self.pandaDirectory + '/resources/cogs/animations/tt_a_ene_cga_finger-wag.bam'),
-						'landing':(self.pandaDirectory + '/resources/cogs/animations/tt_a_ene_cga_landing.bam'),
-						'hit':(self.pandaDirectory + '/resources/cogs/animations/tt_a_ene_cga_pie-small.bam')
-						})
-			
-			self.headList = loader.loadModel(self.pandaDirectory + '/resources/cogs/models/suitA-heads.bam')
-			
-			if self.randomNumber == 0:
-				self.head = self.headList.find('**/backstabber')
-				self.cog.find('**/hands').setColorScale(0.75,0.75,0.95,1)
-				self.scale = 0.9
-				self.setLawTexture()
-				
-			elif self.randomNumber == 1:
-				self.head = self.headList.find('**/bigcheese')
-				self.cog.find('**/hands').setColor(0.65,0.95,0.85,1)
-				self.scale = 1.3
-				self.setBossTexture()
-				
-			elif self.randomNumber == 2:
-				self.head = self.headList.find('**/bigwig')
-				self.cog.find('**/hands').setColor(0.75,0.75,0.95,1)
-				self.scale = 1.3
-				self.setLawTexture()
-				
-			elif self.randomNumber == 3:
-				self.head = self.headList.find('**/headhunter')
-				self.cog.find('**/hands').setColor(0.95,0.75,0.75,1)
-				self.scale = 1.2
-				self.setBossTexture()
-				
-			elif self.randomNumber == 4:
-				self.head = self.headList.find('**/legaleagle')
-				self.cog.find('**/hands').setColor(0.3,0.3,0.55,1)
-				self.scale = 1.3
-				self.setLawTexture()
-				
-			elif self.randomNumber == 5:
-				self.head = self.headList.find('**/numbercruncher')
-				self.cog.find('**/hands').setColor(0.65,0.95,0.85,1)
-				self.scale = 1
-				self.setCashTexture()
-				
-			elif self.randomNumber == 6:
-				#name dropper
-				self.head = self.headList.find('**/numbercruncher')
-				self.head.setTexture(loader.loadTexture(self.pandaDirectory + \
-									'/resources/cogs/textures/name-dropper.jpg'), 1)
-				self.cog.find('**/hands').setColor(0.95,0.75,0.95,1)
-				self.scale = 0.9
-				self.setSellTexture()
-				
-			elif self.randomNumber == 7:
-				self.head = self.headList.find('**/pennypincher')
-				self.cog.find('**/hands').setColor(0.98,0.55,0.56,1)
-				self.scale = 0.8
-				self.setCashTexture()
-				
-			elif self.randomNumber == 8:
-				self.head = self.headList.find('**/yesman')
-				self.cog.find('**/hands').setColor(0.95,0.75,0.75,1)
-				self.scale = 0.9
-				self.setBossTexture()
-				
-			elif self.randomNumber == 9:
-				#robber baron
-				self.head = self.headList.find('**/yesman')
-				self.head.setTexture(loader.loadTexture(self.pandaDirectory + \
-									'/resources/cogs/textures/robber-baron.jpg'), 1)
-				self.cog.find('**/hands').setColor(0.65,0.95,0.85,1)
-				self.scale = 1.3
-				self.setCashTexture()
-				
-			elif self.randomNumber == 10:
-				#mr. hollywood
-				self.head = self.headList.find('**/yesman')
-				self.cog.find('**/hands').setColor(0.95,0.75,0.95,1)
-				self.scale = 1.3
-				self.setSellTexture()
-				
-			elif self.randomNumber == 11:
-				self.head = self.headList.find('**/twoface')
-				self.cog.find('**/hands').setColor(0.95,0.75,0.95,1)
-				self.scale = 1
-				self.setSellTexture()
-				
-			elif self.randomNumber == 12:
-				#mingler
-				self.head = self.headList.find('**/twoface')
-				self.head.setTexture(loader.loadTexture(self.pandaDirectory + \
-									'/resources/cogs/textures/mingler.jpg'), 1)
-				self.cog.find('**/hands').setColor(0.95,0.75,0.95,1)
-				self.scale = 1.1
-				self.setSellTexture()
-				
-			else:
-				#double talker
-				self.head = self.headList.find('**/twoface')
-				self.head.setTexture(loader.loadTexture(self.pandaDirectory + \
-									'/resources/cogs/textures/double-talker.jpg'), 1)
-				self.cog.find('**/hands').setColor(0.75,0.75,0.95,1)
-				self.scale = 0.9
-				self.setLawTexture()
-				
-		elif self.randomNumber <= 22:
-			#Render the suit B type cogs
-			self.cog = Actor(self.pandaDirectory + '/resources/cogs/models/tt_a_ene_cgb_zero.bam',{
-						'neutral':(self.pandaDirectory + '/resources/cogs/animations/tt_a_ene_cgb_neutral.bam'),
-						'walk':(self.pandaDirectory + '/resources/cogs/animations/tt_a_ene_cgb_walk.bam'),
-						'finger wag':(self.pandaDirectory + '/resources/cogs/animations/tt_a_ene_cgb_finger-wag.bam'),
-						'landing':(self.pandaDirectory + '/resources/cogs/animations/tt_a_ene_cgb_landing.bam'),
-						'hit':(self.pandaDirectory + '/resources/cogs/animations/tt_a_ene_cgb_pie-small.bam')
-						})
-						
-			self.headList = loader.loadModel(self.pandaDirectory + '/resources/cogs/models/suitB-heads.bam')
-			
-			if self.randomNumber == 14:
-				self.head = self.headList.find('**/ambulancechaser')
-				self.cog.find('**/hands').setColor(0.75,0.75,0.95,1)
-				self.scale = 1
-				self.setLawTexture()
-				
-			elif self.randomNumber == 15:
-				self.head = self.headList.find('**/beancounter')
-				self.cog.find('**/hands').setColor(0.65,0.95,0.85,1)
-				self.scale = 0.9
-				self.setCashTexture()
-			
-			elif self.randomNumber == 16:
-				#downsizer
-				self.head = self.headList.find('**/beancounter')
-				self.cog.find('**/hands').setColor(0.95,0.75,0.75,1)
-				self.scale = 0.9
-				self.setBossTexture()
-				
-			elif self.randomNumber == 17:
-				self.head = self.headList.find('**/loanshark')
-				self.cog.find('**/hands').setColor(0.65,0.95,0.85,1)
-				self.scale = 1.3
-				self.setCashTexture()
-				
-			elif self.randomNumber == 18:
-				self.head = self.headList.find('**/movershaker')
-				self.cog.find('**/hands').setColor(0.95,0.75,0.95,1)
-				self.scale = 1
-				self.setSellTexture()
-				
-			elif self.randomNumber == 19:
-				#bloodsucker
-				self.head = self.headList.find('**/movershaker')
-				self.head.setTexture(loader.loadTexture(self.pandaDirectory + \
-									'/resources/cogs/textures/blood-sucker.jpg'), 1)
-				self.scale = 0.8
-				self.setLawTexture()
-				
-			elif self.randomNumber == 20:
-				self.head = self.headList.find('**/pencilpusher')
-				self.cog.find('**/hands').setColor(0.95,0.75,0.75,1)
-				self.scale = 0.8
-				self.setBossTexture()
-				
-			elif self.randomNumber == 21:
-				self.head = self.headList.find('**/telemarketer')
-				self.cog.find('**/hands').setColor(0.95,0.75,0.95,1)
-				self.scale = 0.8
-				self.setSellTexture()
-				
-			else:
-				#spin doctor
-				self.head = self.headList.find('**/telemarketer')
-				self.head.setTexture(loader.loadTexture(self.pandaDirectory + \
-									'/resources/cogs/textures/spin-doctor.jpg'), 1)
-				self.cog.find('**/hands').setColor(0.65,0.95,0.85,1)
-				self.scale = 1.1
-				self.setLawTexture()
-			
-		elif self.randomNumber <= 31:
-			#Render the suit C type cogs
-			self.cog = Actor(self.pandaDirectory + '/resources/cogs/models/tt_a_ene_cgc_zero.bam',{
-						'neutral':(self.pandaDirectory + '/resources/cogs/animations/tt_a_ene_cgc_neutral.bam'),
-						'walk':(self.pandaDirectory + '/resources/cogs/animations/tt_a_ene_cgc_walk.bam'),
-						'finger wag':(self.pandaDirectory + '/resources/cogs/animations/tt_a_ene_cgc_finger-wag.bam'),
-						'landing':(self.pandaDirectory + '/resources/cogs/animations/tt_a_ene_cgc_landing.bam'),
-						'hit':(self.pandaDirectory + '/resources/cogs/animations/tt_a_ene_cgc_pie-small.bam')
-						})
-						
-			self.headList = loader.loadModel(self.pandaDirectory + '/resources/cogs/models/suitC-heads.bam')
-			
-			if self.randomNumber == 23:
-				#actually a short change
-				self.head = self.headList.find('**/coldcaller')
-				self.cog.find('**/hands').setColor(0.65,0.95,0.85,1)
-				self.scale = 1.1
-				self.setCashTexture()
-				
-			elif self.randomNumber == 24:
-				#cold caller needs to be recolored
-				self.head = self.headList.find('**/coldcaller')
-				self.head.setColor(0, 0, 255, 1)
-				self.cog.find('**/hands').setColor(0.09,0.48,0.95,1)
-				self.scale = 1.1
-				self.setSellTexture()
-				
-			elif self.randomNumber == 25:
-				self.head = self.headList.find('**/flunky')
-				self.glasses = self.headList.find('**/glasses')
-				self.glasses.reparentTo(self.head)
-				self.cog.find('**/hands').setColor(0.95,0.75,0.75,1)
-				self.scale = 1.1
-				self.setBossTexture()
-				
-			elif self.randomNumber == 26:
-				#corporate raider
-				self.head = self.headList.find('**/flunky')
-				self.head.setTexture(loader.loadTexture(self.pandaDirectory + \
-									'/resources/cogs/textures/corporate-raider.jpg'), 1)
-				self.cog.find('**/hands').setColor(0.98,0.55,0.56,1)
-				self.scale = 1.7
-				self.setBossTexture()
-				
-			elif self.randomNumber == 27:
-				self.head = self.headList.find('**/gladhander')
-				self.cog.find('**/hands').setColor(0.95,0.75,0.95,1)
-				self.scale = 1.2
-				self.setSellTexture()
-				
-			elif self.randomNumber == 28:
-				self.head = self.headList.find('**/micromanager')
-				self.cog.find('**/hands').setColor(0.95,0.75,0.75,1)
-				self.scale = 0.7
-				self.setBossTexture()
-				
-			elif self.randomNumber == 29:
-				self.head = self.headList.find('**/moneybags')
-				self.cog.find('**/hands').setColor(0.65,0.95,0.85,1)
-				self.scale = 1.5
-				self.setCashTexture()
-				
-			elif self.randomNumber == 30:
-				self.head = self.headList.find('**/tightwad')
-				self.cog.find('**/hands').setColor(0.65,0.95,0.85,1)
-				self.scale = 1.3
-				self.setCashTexture()
-				
-			else:
-				#bottom feeder
-				self.head = self.headList.find('**/tightwad')
-				self.head.setTexture(loader.loadTexture(self.pandaDirectory + \
-									'/resources/cogs/textures/bottom-feeder.jpg'), 1)
-				self.cog.find('**/hands').setColor(0.75,0.75,0.95,1)
-				self.scale = 1.1
-				self.setLawTexture()
-		else:
-			raise Exception('UH OH! randomNumber is not between 0 and 31! The value of randomNumber is {}'.format(self.randomNumber))
-
-	def setSellTexture(self):
-		#Set the suit texture to the Sellbot texture
-		self.cog.findAllMatches('**/torso').setTexture(loader.loadTexture(self.pandaDirectory + '/resources/cogs/textures/s_blazer.jpg'), 1)
-		
-		self.cog.findAllMatches('**/arms').setTexture(loader.loadTexture(self.pandaDirectory + '/resources/cogs/textures/s_sleeve.jpg'), 1)
-		
-		self.cog.findAllMatches('**/legs').setTexture(loader.loadTexture(self.pandaDirectory + '/resources/cogs/textures/s_leg.jpg'), 1)
+		#Stop everything the cog is doing and take it out of the scene graph
+		self.entering = False
+		self.timerWheel.cancel(self.transitionTimer)
+		self.flyDown.pause()
+		self.land.pause()
+		self.cog.stop()
+		self.setAnimation(None)
+		self.propeller.stop()
+		self.cog.detachNode()
 	
-	def setCashTexture(self):
-		#Set the suit texture to the Cashbot texture
-		self.cog.findAllMatches('**/torso').setTexture(loader.loadTexture(self.pandaDirectory + '/resources/cogs/textures/m_blazer.jpg'), 1)
-		
-		self.cog.findAllMatches('**/arms').setTexture(loader.loadTexture(self.pandaDirectory + '/resources/cogs/textures/m_sleeve.jpg'), 1)
-		
-		self.cog.findAllMatches('**/legs').setTexture(loader.loadTexture(self.pandaDirectory + '/resources/cogs/textures/m_leg.jpg'), 1)
-		
-	def setLawTexture(self):
-		#Set the suit texture to the Lawbot texture
-		self.cog.findAllMatches('**/torso').setTexture(loader.loadTexture(self.pandaDirectory + '/resources/cogs/textures/l_blazer.jpg'), 1)
-		
-		self.cog.findAllMatches('**/arms').setTexture(loader.loadTexture(self.pandaDirectory + '/resources/cogs/textures/l_sleeve.jpg'), 1)
-		
-		self.cog.findAllMatches('**/legs').setTexture(loader.loadTexture(self.pandaDirectory + '/resources/cogs/textures/l_leg.jpg'), 1)
+	def pickRandomCog(self):
+		#Pick a weighted random cog from the catalog and copy its prepared template
+		self.template = self.catalog.pickTemplate()
+		self.spec = self.template.spec
+		self.cog, self.head = self.template.instantiate()
+		self.scale = self.spec.scale
 	
-	def setBossTexture(self):
-		#Set the suit texture to the Bossbot texture
-		self.cog.findAllMatches('**/torso').setTexture(loader.loadTexture(self.pandaDirectory + '/resources/cogs/textures/c_blazer.jpg'), 1)
-		
-		self.cog.findAllMatches('**/arms').setTexture(loader.loadTexture(self.pandaDirectory + '/resources/cogs/textures/c_sleeve.jpg'), 1)
-		
-		self.cog.findAllMatches('**/legs').setTexture(loader.loadTexture(self.pandaDirectory + '/resources/cogs/textures/c_leg.jpg'), 1)
+	def tallyMemory(self, tally=None):
+		#Add what this cog holds to a tally (a fresh one unless given one shared with other cogs), and return it
+		if tally is None:
+			tally = MemoryTally()
+		tally.addActor(self.cog)
+		tally.addActor(self.propeller)
+		return tally
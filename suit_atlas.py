@@ -0,0 +1,84 @@
+'''
+John Maurer
+
+Description: A class that packs every department's blazer, sleeve, and leg
+textures into one atlas texture. Each cog then picks its department's tiles with a
+texture matrix, so every suit shares a single texture instead of binding its own
+'''
+
+from panda3d.core import *
+
+class SuitAtlas():
+	def __init__(self, departmentTextures, tileSize=128, padding=4):
+		#departmentTextures maps each department to its (blazer, sleeve, leg) textures
+		self.tileSize = tileSize
+		self.padding = padding
+		self.departments = sorted(departmentTextures)
+
+		#One row of tiles per department, one column per suit part, in a power-of-two image
+		columns = max(len(textures) for textures in departmentTextures.values())
+		self.width = self.powerOfTwo(columns * tileSize)
+		self.height = self.powerOfTwo(len(self.departments) * tileSize)
+		self.image = PNMImage(self.width, self.height, 3)
+
+		self.tileTransforms = {}
+		for row, department in enumerate(self.departments):
+			for column, texture in enumerate(departmentTextures[department]):
+				self.addTile(texture, column * tileSize, row * tileSize)
+				self.tileTransforms[(department, column)] = self.makeTileTransform(column * tileSize, row * tileSize)
+
+		self.texture = Texture('suitAtlas')
+		self.texture.load(self.image)
+		self.texture.setMinfilter(SamplerState.FTLinearMipmapLinear)
+		self.texture.setMagfilter(SamplerState.FTLinear)
+		self.texture.setWrapU(SamplerState.WMClamp)
+		self.texture.setWrapV(SamplerState.WMClamp)
+
+	def powerOfTwo(self, size):
+		power = 1
+		while power < size:
+			power *= 2
+		return power
+
+	def addTile(self, texture, x, y):
+		#Scale the texture into the tile, inside a border of its own edge pixels so filtering doesn't bleed between tiles
+		source = PNMImage()
+		if not texture.store(source):
+			raise Exception('UH OH! Could not read the image of texture ' + texture.getName())
+		innerSize = self.tileSize - 2 * self.padding
+		scaled = PNMImage(innerSize, innerSize, 3)
+		scaled.quickFilterFrom(source)
+		left = x + self.padding
+		top = y + self.padding
+		self.image.copySubImage(scaled, left, top)
+
+		#Stretch the outermost rows, then the outermost columns (corners included), across the border
+		last = innerSize - 1
+		for offset in range(1, self.padding + 1):
+			self.image.copySubImage(scaled, left, top - offset, 0, 0, innerSize, 1)
+			self.image.copySubImage(scaled, left, top + last + offset, 0, last, innerSize, 1)
+		for offset in range(1, self.padding + 1):
+			self.image.copySubImage(self.image, left - offset, y, left, y, 1, self.tileSize)
+			self.image.copySubImage(self.image, left + last + offset, y, left + last, y, 1, self.tileSize)
+
+	def makeTileTransform(self, x, y):
+		#Map the part's own 0-1 texture coordinates onto its tile (image rows run top-down, texture V runs bottom-up)
+		innerSize = self.tileSize - 2 * self.padding
+		scaleU = float(innerSize) / self.width
+		scaleV = float(innerSize) / self.height
+		offsetU = float(x + self.padding) / self.width
+		offsetV = 1.0 - float(y + self.padding + innerSize) / self.height
+		return TransformState.makePosHprScale(Vec3(offsetU, offsetV, 0), Vec3(0, 0, 0), Vec3(scaleU, scaleV, 1))
+
+	def apply(self, nodePath, department, partIndex):
+		#Every suit part shares the atlas texture; only its texture matrix says which tile to read
+		nodePath.setTexture(self.texture, 1)
+		nodePath.setTexTransform(TextureStage.getDefault(), self.tileTransforms[(department, partIndex)])
+
+	def write(self, path):
+		#Save the atlas, so models baked with it refer to a file instead of carrying the image
+		filename = Filename.fromOsSpecific(path)
+		if not self.image.write(filename):
+			raise Exception('UH OH! Could not write the suit atlas to ' + path)
+		self.texture.setFilename(filename)
+		self.texture.setFullpath(filename)
@@ -0,0 +1,196 @@
+'''
+John Maurer
+
+Description: A class that samples the terrain's floor collision polygons once into
+a grid of heights, so the height of the floor under any point can be looked up
+(and smoothed between samples) without casting a ray into the scene graph.
+Grids can be saved and loaded (along with a signature of the floor they were
+sampled from), so the sampling only happens again when the floor changes
+'''
+
+from panda3d.core import *
+from array import array
+import hashlib
+import math
+import struct
+import os
+
+#Batch lookups need NumPy; single lookups don't
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+#What the file starts with: a tag, the signature of the floor it was sampled from, then the origin, the spacing of the samples,
+#and how many there are each way
+HEIGHTFIELD_HEADER = struct.Struct('<4s32sfffii')
+HEIGHTFIELD_TAG = b'HFLD'
+
+#Bumped whenever the way floors are sampled changes, so saved heightfields get sampled again
+HEIGHTFIELD_VERSION = 1
+
+#The terrain's floor heights written by bake_assets.py (or by the game), in the baked directory
+BAKED_HEIGHTFIELD = 'terrain_heights.bin'
+
+def getBakedHeightfieldPath(bakedDirectory):
+	#Where the heightfield lives (whether or not it has been saved yet)
+	if bakedDirectory is None:
+		return None
+	return bakedDirectory + '/' + BAKED_HEIGHTFIELD
+
+def getHeightfieldSignature(triangles, cellSize):
+	#Sums up every floor triangle, so a saved heightfield is only used for the same floor
+	signature = hashlib.md5()
+	signature.update(repr((HEIGHTFIELD_VERSION, cellSize)).encode())
+	for triangle in triangles:
+		signature.update(repr(tuple(tuple(point) for point in triangle)).encode())
+	return signature.hexdigest().encode()
+
+def getFloorTriangles(floor, terrain):
+	#Every floor polygon as triangles, in the terrain's own coordinate space
+	triangles = []
+	for collisionNode in floor.findAllMatches('**/+CollisionNode'):
+		mat = collisionNode.getMat(terrain)
+		for solid in collisionNode.node().getSolids():
+			if not isinstance(solid, CollisionPolygon):
+				continue
+			points = [mat.xformPoint(point) for point in solid.getPoints()]
+			for index in range(1, len(points) - 1):
+				triangles.append((points[0], points[index], points[index + 1]))
+	return triangles
+
+def buildHeightfield(floor, terrain, cellSize=1.0):
+	#Sample the topmost floor at every grid point the floor covers (points off the floor are NaN)
+	triangles = getFloorTriangles(floor, terrain)
+	if not triangles:
+		raise Exception('UH OH! There are no floor polygons under ' + str(floor))
+	minX = min(point[0] for triangle in triangles for point in triangle)
+	minY = min(point[1] for triangle in triangles for point in triangle)
+	maxX = max(point[0] for triangle in triangles for point in triangle)
+	maxY = max(point[1] for triangle in triangles for point in triangle)
+	columns = int(math.ceil((maxX - minX) / cellSize)) + 1
+	rows = int(math.ceil((maxY - minY) / cellSize)) + 1
+	heights = array('f', [float('nan')]) * (columns * rows)
+
+	for a, b, c in triangles:
+		#Twice the triangle's area seen from above (walls standing on edge have none, and are skipped)
+		area = (b[0] - a[0]) * (c[1] - a[1]) - (c[0] - a[0]) * (b[1] - a[1])
+		if abs(area) < 1e-9:
+			continue
+
+		#Only the grid points inside the triangle's bounding box can be inside it
+		firstColumn = max(0, int(math.ceil((min(a[0], b[0], c[0]) - minX) / cellSize - 1e-6)))
+		lastColumn = min(columns - 1, int(math.floor((max(a[0], b[0], c[0]) - minX) / cellSize + 1e-6)))
+		firstRow = max(0, int(math.ceil((min(a[1], b[1], c[1]) - minY) / cellSize - 1e-6)))
+		lastRow = min(rows - 1, int(math.floor((max(a[1], b[1], c[1]) - minY) / cellSize + 1e-6)))
+		for row in range(firstRow, lastRow + 1):
+			y = minY + row * cellSize
+			for column in range(firstColumn, lastColumn + 1):
+				x = minX + column * cellSize
+
+				#Barycentric coordinates tell whether the point is inside, and how high the triangle is there
+				u = ((b[0] - x) * (c[1] - y) - (c[0] - x) * (b[1] - y)) / area
+				v = ((c[0] - x) * (a[1] - y) - (a[0] - x) * (c[1] - y)) / area
+				w = 1.0 - u - v
+				if u < -1e-6 or v < -1e-6 or w < -1e-6:
+					continue
+				z = u * a[2] + v * b[2] + w * c[2]
+				index = row * columns + column
+				if not z <= heights[index]:
+					heights[index] = z
+
+	return TerrainHeightfield(minX, minY, cellSize, columns, rows, heights, getHeightfieldSignature(triangles, cellSize))
+
+def loadHeightfield(path, signature):
+	#The saved heightfield, if there is one and it was sampled from this same floor
+	if path is None or not os.path.exists(Filename(path).toOsSpecific()):
+		return None
+	with open(Filename(path).toOsSpecific(), 'rb') as heightFile:
+		tag, savedSignature, originX, originY, cellSize, columns, rows = HEIGHTFIELD_HEADER.unpack(heightFile.read(HEIGHTFIELD_HEADER.size))
+		if tag != HEIGHTFIELD_TAG:
+			raise Exception('UH OH! ' + path + ' is not a heightfield!')
+		if savedSignature != signature:
+			return None
+		heights = array('f')
+		heights.fromfile(heightFile, columns * rows)
+	return TerrainHeightfield(originX, originY, cellSize, columns, rows, heights, signature)
+
+def getHeightfield(floor, terrain, path=None, cellSize=1.0):
+	#Load the saved heightfield, or sample the floor (and save it for next time)
+	heightfield = loadHeightfield(path, getHeightfieldSignature(getFloorTriangles(floor, terrain), cellSize))
+	if heightfield is None:
+		heightfield = buildHeightfield(floor, terrain, cellSize)
+		if path is not None:
+			directory = os.path.dirname(Filename(path).toOsSpecific())
+			if not os.path.isdir(directory):
+				os.makedirs(directory)
+			heightfield.write(Filename(path).toOsSpecific())
+	return heightfield
+
+class TerrainHeightfield():
+	def __init__(self, originX, originY, cellSize, columns, rows, heights, signature=b''):
+		#Heights of the grid points, row by row, in the terrain's own coordinate space
+		self.originX = originX
+		self.originY = originY
+		self.cellSize = cellSize
+		self.columns = columns
+		self.rows = rows
+		self.heights = heights
+		self.signature = signature
+
+		#Where the terrain sits in the world (lookups take and give world coordinates)
+		self.offsetX = self.offsetY = self.offsetZ = 0.0
+		self.scale = 1.0
+
+	def place(self, terrain):
+		#Follow the terrain's position and scale (a turned or stretched terrain would need a full matrix per lookup)
+		scale = terrain.getScale(render)
+		if terrain.getHpr(render).length() > 1e-3 or abs(scale[0] - scale[1]) > 1e-6 or abs(scale[0] - scale[2]) > 1e-6:
+			raise Exception('UH OH! A heightfield can only follow a terrain that is moved or evenly scaled!')
+		self.offsetX, self.offsetY, self.offsetZ = terrain.getPos(render)
+		self.scale = scale[0]
+
+	def getHeight(self, x, y, default=None):
+		#Smoothly blend the four samples around the point, or return default if any of them is off the floor
+		gridX = ((x - self.offsetX) / self.scale - self.originX) / self.cellSize
+		gridY = ((y - self.offsetY) / self.scale - self.originY) / self.cellSize
+		column = int(math.floor(gridX))
+		row = int(math.floor(gridY))
+		if column < 0 or row < 0 or column >= self.columns - 1 or row >= self.rows - 1:
+			return default
+		fractionX = gridX - column
+		fractionY = gridY - row
+		index = row * self.columns + column
+		heights = self.heights
+		bottom = heights[index] + (heights[index + 1] - heights[index]) * fractionX
+		top = heights[index + self.columns] + (heights[index + self.columns + 1] - heights[index + self.columns]) * fractionX
+		height = bottom + (top - bottom) * fractionY
+		if height != height:
+			return default
+		return height * self.scale + self.offsetZ
+
+	def getHeights(self, xs, ys, defaults):
+		#getHeight for whole NumPy arrays of points at once
+		if numpy is None:
+			raise Exception('UH OH! Looking up many heights at once needs NumPy!')
+		grid = numpy.frombuffer(self.heights, dtype=numpy.float32).reshape(self.rows, self.columns)
+		gridX = ((xs - self.offsetX) / self.scale - self.originX) / self.cellSize
+		gridY = ((ys - self.offsetY) / self.scale - self.originY) / self.cellSize
+		columns = numpy.floor(gridX).astype(int)
+		rows = numpy.floor(gridY).astype(int)
+		inside = (columns >= 0) & (rows >= 0) & (columns < self.columns - 1) & (rows < self.rows - 1)
+		columns = numpy.where(inside, columns, 0)
+		rows = numpy.where(inside, rows, 0)
+		fractionX = gridX - columns
+		fractionY = gridY - rows
+		bottom = grid[rows, columns] + (grid[rows, columns + 1] - grid[rows, columns]) * fractionX
+		top = grid[rows + 1, columns] + (grid[rows + 1, columns + 1] - grid[rows + 1, columns]) * fractionX
+		heights = (bottom + (top - bottom) * fractionY) * self.scale + self.offsetZ
+		return numpy.where(inside & ~numpy.isnan(heights), heights, defaults)
+
+	def write(self, path):
+		#path is an OS path, like the other files bake_assets.py writes
+		with open(path, 'wb') as heightFile:
+			heightFile.write(HEIGHTFIELD_HEADER.pack(HEIGHTFIELD_TAG, self.signature, self.originX, self.originY, self.cellSize,
+														self.columns, self.rows))
+			self.heights.tofile(heightFile)
@@ -0,0 +1,111 @@
+'''
+John Maurer
+
+Description: A hashed timer wheel that runs every cog's timed transitions (and
+life meter blinks) from one task. Timers hash into a ring of slots by the tick
+they are due on, so each frame only looks at the slots it passes over, however
+many cogs are waiting on something
+'''
+
+from panda3d.core import *
+import math
+
+class Timer():
+	def __init__(self):
+		#Owners keep their timers and schedule them again and again, so nothing is allocated per schedule
+		self.callback = None
+
+		#The slot the timer is waiting in (None when it isn't scheduled), and how many more laps of the wheel until it's due
+		self.slot = None
+		self.rounds = 0
+
+	def isScheduled(self):
+		return self.slot is not None
+
+class TimerWheel():
+	def __init__(self, taskMgr, resolution=1.0 / 60, slotCount=256, sort=20):
+		self.taskMgr = taskMgr
+
+		#Seconds per tick, and the ring of slots (dictionaries keep the timers in the order they were scheduled)
+		self.resolution = resolution
+		self.slotCount = slotCount
+		self.slots = [{} for index in range(slotCount)]
+
+		#The last tick whose slot has been handled
+		self.tick = self.getCurrentTick()
+
+		#Totals, to see how busy the wheel is
+		self.scheduledCount = 0
+		self.firedCount = 0
+		self.pendingCount = 0
+
+		#Run alongside the intervals, so timers fire at the same point in the frame the Sequences they replace did
+		self.task = self.taskMgr.add(self.advance, 'timer wheel', sort=sort)
+
+	def getCurrentTick(self):
+		#The small nudge keeps frame times that are whole ticks from rounding down to the tick before
+		return int(globalClock.getFrameTime() / self.resolution + 1e-6)
+
+	def schedule(self, timer, delay, callback):
+		#Call callback once delay seconds have passed (moving the timer if it was already waiting)
+		if timer.slot is not None:
+			self.cancel(timer)
+		ticks = max(1, int(math.ceil(delay / self.resolution - 1e-6)))
+		timer.callback = callback
+		timer.rounds = (ticks - 1) // self.slotCount
+		timer.slot = (self.tick + ticks) % self.slotCount
+		self.slots[timer.slot][timer] = None
+		self.scheduledCount += 1
+		self.pendingCount += 1
+
+	def cancel(self, timer):
+		#A cancelled timer has no callback, so it can't fire even if it was already due this tick
+		timer.callback = None
+		if timer.slot is None:
+			return
+		del self.slots[timer.slot][timer]
+		timer.slot = None
+		self.pendingCount -= 1
+
+	def advance(self, task):
+		#Handle the slot of every tick since last frame
+		currentTick = self.getCurrentTick()
+		while self.tick < currentTick and self.pendingCount > 0:
+			self.tick += 1
+			slot = self.slots[self.tick % self.slotCount]
+			if not slot:
+				continue
+
+			#Timers that aren't due yet go around again; a callback may schedule timers (even into this slot) as it likes
+			dueTimers = []
+			for timer in slot:
+				if timer.rounds > 0:
+					timer.rounds -= 1
+				else:
+					dueTimers.append(timer)
+			for timer in dueTimers:
+				del slot[timer]
+				timer.slot = None
+				self.pendingCount -= 1
+			for timer in dueTimers:
+				#An earlier callback this tick may have cancelled or moved the timer
+				if timer.slot is None and timer.callback is not None:
+					self.firedCount += 1
+					timer.callback()
+
+		#With nothing waiting there is nothing to catch up on
+		self.tick = currentTick
+		return task.cont
+
+	def getStats(self):
+		return {'pending': self.pendingCount,
+				'scheduled': self.scheduledCount,
+				'fired': self.firedCount}
+
+	def destroy(self):
+		self.taskMgr.remove(self.task)
+		for slot in self.slots:
+			for timer in slot:
+				timer.slot = None
+			slot.clear()
+		self.pendingCount = 0
@@ -12,10 +12,63 @@ from direct.interval.LerpInterval import LerpPosInterval,LerpHprInterval
 from direct.interval.ActorInterval import ActorInterval
 from direct.interval.IntervalGlobal import *
 from direct.task import Task
+from asset_cache import getAssetCache
+from pie_pool import PiePool
 import sys,os
 
+#The toon's files, relative to the resources/toon directory
+TOON_PARTS = {
+	'torso': 'models/tt_a_chr_dgl_shorts_torso_1000.bam',
+	'legs': 'models/tt_a_chr_dgm_shorts_legs_1000.bam'
+}
+TOON_ANIMS = {
+	'torso': {
+		'neutral': 'animations/tt_a_chr_dgl_shorts_torso_neutral.bam',
+		'run': 'animations/tt_a_chr_dgl_shorts_torso_run.bam',
+		'attackTorso': 'animations/tt_a_chr_dgl_shorts_torso_pie-throw.bam',
+		'walk': 'animations/tt_a_chr_dgl_shorts_torso_walk.bam'
+	},
+	'legs': {
+		'neutral': 'animations/tt_a_chr_dgm_shorts_legs_neutral.bam',
+		'run': 'animations/tt_a_chr_dgm_shorts_legs_run.bam',
+		'attackLegs': 'animations/tt_a_chr_dgm_shorts_legs_pie-throw.bam',
+		'walk': 'animations/tt_a_chr_dgm_shorts_legs_walk.bam'
+	}
+}
+TOON_HEAD = 'models/tt_a_chr_dgm_skirt_head_1000.bam'
+TOON_HAT = 'models/tt_m_chr_avt_acc_hat_topHat.bam'
+TOON_PIE = 'models/tart.bam'
+TOON_TEXTURES = {
+	'sleeves': 'textures/ttr_t_chr_avt_shirtSleeve_cashbotCrusher.jpg',
+	'torso-top': 'textures/ttr_t_chr_avt_shirt_cashbotCrusher.jpg',
+	'torso-bot': 'textures/ttr_t_chr_avt_shorts_cashbotCrusher.jpg',
+	'shoes': 'textures/ttr_t_chr_avt_acc_sho_cashbotCrusher.jpg'
+}
+TOON_HAT_TEXTURE = 'textures/tt_t_chr_avt_acc_hat_topHatQuizmaster.jpg'
+
+#The fully assembled toon written by bake_assets.py, in the baked directory
+BAKED_TOON = 'toon.bam'
+
+def getBakedToonPath(bakedDirectory):
+	#The baked toon, if there is a baked directory and the toon has been baked into it
+	if bakedDirectory is None:
+		return None
+	path = bakedDirectory + '/' + BAKED_TOON
+	return path if os.path.exists(Filename(path).toOsSpecific()) else None
+
+def getToonAssets(pandaDirectory, bakedDirectory=None):
+	#Every model (and animation) and texture file the toon loads, for reading them ahead of time
+	toonDirectory = pandaDirectory + '/resources/toon/'
+	animations = [toonDirectory + path for anims in TOON_ANIMS.values() for path in anims.values()]
+	bakedPath = getBakedToonPath(bakedDirectory)
+	if bakedPath is not None:
+		return [bakedPath, toonDirectory + TOON_PIE] + animations, []
+	models = list(TOON_PARTS.values()) + [TOON_HEAD, TOON_HAT, TOON_PIE]
+	textures = list(TOON_TEXTURES.values()) + [TOON_HAT_TEXTURE]
+	return [toonDirectory + path for path in models] + animations, [toonDirectory + path for path in textures]
+
 class Toon(DirectObject.DirectObject):
-	def __init__(self, taskMgr):
+	def __init__(self, taskMgr, pieCount=8, bakedDirectory=None, listenForKeys=True):
 		#Establish where the current directory of the running file is
 		self.currentDirectory = os.path.abspath(sys.path[0])
 		self.pandaDirectory = Filename.fromOsSpecific(self.currentDirectory).getFullpath()
@@ -24,46 +77,63 @@ class Toon(DirectObject.DirectObject):
 		self.isThrowing = False
 		self.isMovingInY = False
 		self.isTurning = False
-		self.pieIsThrown = False
 		self.movementHeading = ''
 		self.turnHeading = ''
 		self.speed = 0.0
 		self.turnSpeed = 0.0
 		self.health = 100
+		self.throwTask = None
+		
+		#Floor heights to keep the toon standing on, if set
+		self.heightfield = None
 		
 		#Set object variable to point to the global task manager
 		self.taskMgr = taskMgr
 		
-		#Define pie node, which will serve as the flying part of the pie. Put it far enough away to not cause problems
-		self.pieNode = NodePath('pieNode')
-		self.pieNode.reparentTo(render)
-		self.pieNode.setPos(100, 0, 0)
+		#Load everything through the process-wide asset cache
+		self.assetCache = getAssetCache()
 		
 		#Load the pie model and define its scaling motion
-		self.pie = loader.loadModel(self.pandaDirectory + "/resources/toon/models/tart.bam")
+		self.toonDirectory = self.pandaDirectory + '/resources/toon/'
+		self.pie = self.assetCache.loadModel(self.toonDirectory + TOON_PIE)
 		self.scalePie = LerpScaleInterval(self.pie, 1, 1, 0)
 		
-		#Set up the Actor
-		self.initActor()
+		#Define the pool of flying pies, so several can be in the air without building new ones
+		self.piePool = PiePool(self.taskMgr, self.pie, pieCount)
+		
+		#Set up the Actor, from the baked toon if there is one
+		bakedPath = getBakedToonPath(bakedDirectory)
+		if bakedPath is not None:
+			self.initBakedActor(bakedPath)
+		else:
+			self.initActor()
 		
 		#Initialize animations
 		self.toon.loop('neutral', 'torso')
 		self.toon.loop('neutral', 'legs')
 		
-		#Define Y (Forwards/backwards) movement
-		self.accept('arrow_up', self.moveInYStart, ['forward'])
-		self.accept('arrow_up-up', self.moveInYEnd, ['forward'])
-		self.accept('arrow_down', self.moveInYStart, ['backward'])
-		self.accept('arrow_down-up', self.moveInYEnd, ['backward'])
-		
-		#Define turning movement
-		self.accept('arrow_right', self.turnStart, ['right'])
-		self.accept('arrow_right-up', self.turnEnd, ['right'])
-		self.accept('arrow_left', self.turnStart, ['left'])
-		self.accept('arrow_left-up', self.turnEnd, ['left'])
+		#What each input event does
+		self.inputs = {
+			#Define Y (Forwards/backwards) movement
+			'arrow_up': (self.moveInYStart, ['forward']),
+			'arrow_up-up': (self.moveInYEnd, ['forward']),
+			'arrow_down': (self.moveInYStart, ['backward']),
+			'arrow_down-up': (self.moveInYEnd, ['backward']),
+			
+			#Define turning movement
+			'arrow_right': (self.turnStart, ['right']),
+			'arrow_right-up': (self.turnEnd, ['right']),
+			'arrow_left': (self.turnStart, ['left']),
+			'arrow_left-up': (self.turnEnd, ['left']),
+			
+			#Define pie throwing animation control
+			'control': (self.attackStart, [])
+		}
 		
-		#Define pie throwing animation control
-		self.accept('control', self.attackStart)
+		#Take the inputs from the keyboard, unless something else (like a server) hands them over
+		if listenForKeys:
+			for event, (method, extraArgs) in self.inputs.items():
+				self.accept(event, method, extraArgs)
 		
 		#Set up throwing interval and sequence
 		self.throwTorso = self.toon.actorInterval('attackTorso', loop=0)
@@ -74,7 +144,24 @@ class Toon(DirectObject.DirectObject):
 									)
 		
 		#Tell the taskmanager to keep track of this task
-		self.taskMgr.add(self.updateToon, 'Update Toon')
+		self.task = self.taskMgr.add(self.updateToon, 'Update Toon')
+	
+	def handleInput(self, event):
+		#Act on an input event as if it came from the keyboard (events the toon doesn't know are ignored)
+		if event in self.inputs:
+			method, extraArgs = self.inputs[event]
+			method(*extraArgs)
+	
+	def destroy(self):
+		#Stop listening, stop every task and interval, and take the toon and its pies out of the world
+		self.ignoreAll()
+		self.taskMgr.remove(self.task)
+		if self.throwTask is not None:
+			self.taskMgr.remove(self.throwTask)
+		self.throw.pause()
+		self.piePool.destroy()
+		self.toon.cleanup()
+		self.toon.removeNode()
 		
 	def updateToon(self, task):
 		#Update the player's position and heading
@@ -84,6 +171,13 @@ class Toon(DirectObject.DirectObject):
 		if self.isTurning:
 			self.toon.setH(self.toon, self.turnSpeed)
 		
+		#Stand on the floor under the toon (off the floor, stay at the same height)
+		if self.heightfield is not None:
+			x, y, z = self.toon.getPos()
+			floorHeight = self.heightfield.getHeight(x, y, z)
+			if abs(floorHeight - z) > 1e-4:
+				self.toon.setZ(floorHeight)
+		
 		return task.cont
 		
 	def toggleIsThrowing(self):
@@ -101,7 +195,7 @@ class Toon(DirectObject.DirectObject):
 		#Render the pie, then throw it!
 		self.pie.setHpr(0,0,0)
 		self.pie.reparentTo(self.toon.find('**/def_joint_right_hold'))
-		self.taskMgr.doMethodLater(2.7, self.throwPie, 'throw pie')
+		self.throwTask = self.taskMgr.doMethodLater(2.7, self.throwPie, 'throw pie')
 		
 		#Call the pre-defined sequence
 		self.throw.start()
@@ -121,20 +215,13 @@ class Toon(DirectObject.DirectObject):
 			self.toon.loop('neutral', 'torso')
 	
 	def throwPie(self, task):
-		#Get the current position and hpr of the pie for the pieNode
-		self.pieNode.setPos(self.pie.getPos(render))
+		#Get the current position and hpr of the pie in hand for the flying pie
+		piePos = self.pie.getPos(render)
 		pieHpr = Point3(self.toon.getH(render) + 90, self.pie.getP(render), 80)
 		
-		#Reparent the pie to the pieNode
-		self.pie.reparentTo(self.pieNode)
-		self.pie.setHpr(pieHpr)
-		
-		#Arch that pieNode puppy!
-		self.flyingPie = ProjectileInterval(self.pieNode, startPos=self.pieNode.getPos(), 
-											startVel=render.getRelativeVector(self.pie,Vec3(0,0,75)), duration=5)
-		self.flyingPie.start()
-		
-		self.pieIsThrown = True
+		#Swap the pie in hand for one from the pool, then arch that puppy!
+		self.pie.detachNode()
+		self.piePool.launch(piePos, pieHpr)
 		
 		return task.done
 	
@@ -232,22 +319,22 @@ class Toon(DirectObject.DirectObject):
 		#Tell the task manager to stop moving in local Y
 		self.isMovingInY = False
 		
+	def initBakedActor(self, bakedPath):
+		#The baked toon is the legs with the torso (already colored, with its head and hat) attached
+		legs = self.assetCache.loadModel(bakedPath)
+		torso = legs.find('**/__Actor_torso')
+		torso.detachNode()
+		self.toon = Actor({'torso': torso, 'legs': legs},
+							dict((partName, dict((animName, self.toonDirectory + path) for animName, path in anims.items()))
+								for partName, anims in TOON_ANIMS.items()))
+		self.toon.attach('torso', 'legs', 'joint_hips')
+		self.toonHead = self.toon.find('**/def_head').getChild(0)
+	
 	def initActor(self):
 		#Create the toon!
-		self.toon = Actor({'torso': self.pandaDirectory + '/resources/toon/models/tt_a_chr_dgl_shorts_torso_1000.bam',
-							'legs': self.pandaDirectory + '/resources/toon/models/tt_a_chr_dgm_shorts_legs_1000.bam'},
-							{'torso':{
-							'neutral': self.pandaDirectory + '/resources/toon/animations/tt_a_chr_dgl_shorts_torso_neutral.bam',
-							'run': self.pandaDirectory + '/resources/toon/animations/tt_a_chr_dgl_shorts_torso_run.bam',
-							'attackTorso': self.pandaDirectory + '/resources/toon/animations/tt_a_chr_dgl_shorts_torso_pie-throw.bam',
-							'walk': self.pandaDirectory + '/resources/toon/animations/tt_a_chr_dgl_shorts_torso_walk.bam'
-							},
-							'legs':{
-							'neutral': self.pandaDirectory + '/resources/toon/animations/tt_a_chr_dgm_shorts_legs_neutral.bam',
-							'run': self.pandaDirectory + '/resources/toon/animations/tt_a_chr_dgm_shorts_legs_run.bam',
-							'attackLegs': self.pandaDirectory + '/resources/toon/animations/tt_a_chr_dgm_shorts_legs_pie-throw.bam',
-							'walk': self.pandaDirectory + '/resources/toon/animations/tt_a_chr_dgm_shorts_legs_walk.bam'
-							}})
+		self.toon = self.assetCache.loadActor(dict((partName, self.toonDirectory + path) for partName, path in TOON_PARTS.items()),
+							dict((partName, dict((animName, self.toonDirectory + path) for animName, path in anims.items()))
+								for partName, anims in TOON_ANIMS.items()))
 		self.toon.attach('torso', 'legs', 'joint_hips')
 		self.toon.find('**/neck').setColor(1, 1, 0)
 		self.toon.find('**/legs').setColor(1, 1, 0)
@@ -255,24 +342,22 @@ class Toon(DirectObject.DirectObject):
 		self.toon.find('**/hands').setColor(1, 1, 1)
 		
 		#Set textures and remove unnecessary models
-		self.toon.find('**/sleeves').setTexture(loader.loadTexture(self.pandaDirectory + '/resources/toon/textures/ttr_t_chr_avt_shirtSleeve_cashbotCrusher.jpg'),1)
-		self.toon.find('**/torso-top').setTexture(loader.loadTexture(self.pandaDirectory + '/resources/toon/textures/ttr_t_chr_avt_shirt_cashbotCrusher.jpg'),1)
-		self.toon.find('**/torso-bot').setTexture(loader.loadTexture(self.pandaDirectory + '/resources/toon/textures/ttr_t_chr_avt_shorts_cashbotCrusher.jpg'),1)
-		self.toon.find('**/shoes').setTexture(loader.loadTexture(self.pandaDirectory + '/resources/toon/textures/ttr_t_chr_avt_acc_sho_cashbotCrusher.jpg'),1)
+		for partName, path in TOON_TEXTURES.items():
+			self.toon.find('**/' + partName).setTexture(self.assetCache.loadTexture(self.toonDirectory + path), 1)
 		self.toon.find('**/feet').removeNode()
 		self.toon.find('**/boots_short').removeNode()
 		self.toon.find('**/boots_long').removeNode()
 		
 		#Create the toon head!
-		self.toonHead = loader.loadModel(self.pandaDirectory + '/resources/toon/models/tt_a_chr_dgm_skirt_head_1000.bam')
+		self.toonHead = self.assetCache.loadModel(self.toonDirectory + TOON_HEAD)
 		self.toonHead.reparentTo(self.toon.find('**/def_head'))
 		self.toonHead.find('**/head').setColor(1, 1, 0)
 		self.toonHead.find('**/head-front').setColor(1, 1, 0)
 		
 		#Add a cute hat
-		self.topHat = loader.loadModel(self.pandaDirectory + '/resources/toon/models/tt_m_chr_avt_acc_hat_topHat.bam')
+		self.topHat = self.assetCache.loadModel(self.toonDirectory + TOON_HAT)
 		self.topHat.reparentTo(self.toonHead.find('**/head'))
 		self.topHat.setZ(0.5)
 		self.topHat.setHpr(180,-45,0)
-		self.topHat.setTexture(loader.loadTexture(self.pandaDirectory + '/resources/toon/textures/tt_t_chr_avt_acc_hat_topHatQuizmaster.jpg'),1)
+		self.topHat.setTexture(self.assetCache.loadTexture(self.toonDirectory + TOON_HAT_TEXTURE),1)
 		self.topHat.setScale(0.35)
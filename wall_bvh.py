@@ -0,0 +1,113 @@
+'''
+John Maurer
+
+Description: Functions that gather every wall collision solid in the world into
+a bounding-volume hierarchy: a tree of nodes with tight boxes around them, with a
+few solids at each leaf. The traverser skips any branch whose box a collider
+doesn't touch, so pushing spheres and boxes off walls only looks at the walls
+nearby. A built tree is saved, and reused for as long as the walls haven't moved
+'''
+
+from panda3d.core import *
+import hashlib
+import os
+
+#The tree of walls saved by the game (or by bake_assets.py), in the baked directory
+BAKED_WALL_BVH = 'terrain_walls.bam'
+
+#Tag on the saved tree that says which walls it was built from
+WALL_SIGNATURE_TAG = 'wallSignature'
+
+def getBakedWallBVHPath(bakedDirectory):
+	#Where the tree of walls lives (whether or not it has been saved yet)
+	if bakedDirectory is None:
+		return None
+	return bakedDirectory + '/' + BAKED_WALL_BVH
+
+def findWallNodes(roots, wallMask):
+	#Every collision node under the roots that something could be pushed off of
+	return [wallNode for root in roots for wallNode in root.findAllMatches('**/+CollisionNode')
+			if not (wallNode.node().getIntoCollideMask() & wallMask).isZero()]
+
+def getWallSignature(wallNodes):
+	#Sums up where the walls are and what they're made of, so a saved tree is only used for the same walls
+	signature = hashlib.md5()
+	for wallNode in wallNodes:
+		signature.update(repr((wallNode.getName(), wallNode.node().getNumSolids(), wallNode.node().getIntoCollideMask().getWord(),
+								wallNode.getNetTag('collisions'), tuple(wallNode.getMat(render).getRow(row) for row in range(4)))).encode())
+	return signature.hexdigest()
+
+def getWorldSolids(wallNode):
+	#The node's solids moved into world space (flattening a node pushes its transform into its own copies of its solids)
+	worldNode = NodePath(CollisionNode('world'))
+	for solid in wallNode.node().getSolids():
+		worldNode.node().addSolid(solid)
+	holder = NodePath('holder')
+	worldNode.reparentTo(holder)
+	worldNode.setMat(wallNode.getMat(render))
+	holder.flattenLight()
+	return list(worldNode.node().getSolids())
+
+def getSolidBox(solid):
+	bounds = solid.getBounds()
+	return bounds.getMin(), bounds.getMax()
+
+def buildBranch(solids, intoMask, leafSize):
+	#solids is a list of (solid, min, max); split it at the median along its widest side until the pieces are small
+	if len(solids) <= leafSize:
+		leaf = CollisionNode('wallLeaf')
+		leaf.setIntoCollideMask(intoMask)
+		leaf.setFromCollideMask(BitMask32.allOff())
+		leaf.setBoundsType(BoundingVolume.BT_box)
+		for solid, solidMin, solidMax in solids:
+			leaf.addSolid(solid)
+		return leaf
+
+	centers = [(solidMin + solidMax) * 0.5 for solid, solidMin, solidMax in solids]
+	spans = [max(center[axis] for center in centers) - min(center[axis] for center in centers) for axis in range(3)]
+	axis = spans.index(max(spans))
+	order = sorted(range(len(solids)), key=lambda index: centers[index][axis])
+	half = len(order) // 2
+
+	branch = PandaNode('wallBranch')
+	branch.setBoundsType(BoundingVolume.BT_box)
+	branch.addChild(buildBranch([solids[index] for index in order[:half]], intoMask, leafSize))
+	branch.addChild(buildBranch([solids[index] for index in order[half:]], intoMask, leafSize))
+	return branch
+
+def buildWallBVH(wallNodes, leafSize=4):
+	#Walls that answer to different masks or tags can't share a leaf, so each kind gets its own tree
+	groups = {}
+	for wallNode in wallNodes:
+		key = (wallNode.node().getIntoCollideMask().getWord(), wallNode.getNetTag('collisions'))
+		groups.setdefault(key, []).extend(getWorldSolids(wallNode))
+
+	root = NodePath(ModelRoot('terrainWalls'))
+	root.node().setBoundsType(BoundingVolume.BT_box)
+	for (intoMask, tag), solids in sorted(groups.items()):
+		tree = root.attachNewNode(buildBranch([(solid,) + getSolidBox(solid) for solid in solids], BitMask32(intoMask), leafSize))
+		if tag:
+			tree.setTag('collisions', tag)
+	root.setTag(WALL_SIGNATURE_TAG, getWallSignature(wallNodes))
+	return root
+
+def loadWallBVH(path, wallNodes):
+	#The saved tree, if there is one and it was built from these same walls
+	if path is None or not os.path.exists(Filename(path).toOsSpecific()):
+		return None
+	root = NodePath(loader.loadModel(path, noCache=True))
+	if root.isEmpty() or root.getTag(WALL_SIGNATURE_TAG) != getWallSignature(wallNodes):
+		return None
+	return root
+
+def getWallBVH(wallNodes, path=None):
+	#Load the saved tree of walls, or build it (and save it for next time)
+	root = loadWallBVH(path, wallNodes)
+	if root is None:
+		root = buildWallBVH(wallNodes)
+		if path is not None:
+			directory = os.path.dirname(Filename(path).toOsSpecific())
+			if not os.path.isdir(directory):
+				os.makedirs(directory)
+			root.writeBamFile(Filename(path))
+	return root
@@ -0,0 +1,305 @@
+'''
+John Maurer
+
+Description: Compact binary snapshots of the world. Every toon, flying pie, and
+cog is packed into a fixed 32 byte record (position, HPR, health, animation id
+and frame), and a snapshot can be sent as a delta against an older one that
+only carries the fields that changed. Snapshots are read straight out of the
+buffer they arrived in through a memoryview, without copying it
+'''
+
+import struct
+
+#Structured (and still zero-copy) views of the records need NumPy
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+#Snapshot kinds, in the first byte of the header
+FULL = 0
+DELTA = 1
+
+#Kind, tick, base tick (deltas only), and how many toons, pies, and cogs there are
+HEADER = struct.Struct('<BxIIHHH')
+
+#Every entity packs into the same record, after its id
+FIELDS = [('anim', 'B'), ('flags', 'B'), ('x', 'f'), ('y', 'f'), ('z', 'f'),
+		('h', 'f'), ('p', 'f'), ('r', 'f'), ('health', 'h'), ('frame', 'H')]
+RECORD = struct.Struct('<H' + ''.join(format for name, format in FIELDS))
+FIELD_STRUCTS = [struct.Struct('<' + format) for name, format in FIELDS]
+ALL_FIELDS = (1 << len(FIELDS)) - 1
+
+#Positions are snapped to 1/1024 of a unit and angles to 1/128 of a degree (steps a float holds exactly), so the
+#float noise of a standing (or level) entity doesn't show up as a change in every delta
+POSITION_STEPS = 1024.0
+ANGLE_STEPS = 128.0
+
+#Sections of a snapshot, in the order they are packed
+TOONS = 0
+PIES = 1
+COGS = 2
+SECTIONS = (TOONS, PIES, COGS)
+
+#Every animation a toon or cog plays, by id (0 is nothing)
+ANIMATIONS = [None, 'neutral', 'walk', 'run', 'attackTorso', 'attackLegs', 'landing', 'hit']
+ANIMATION_IDS = dict((animation, animId) for animId, animation in enumerate(ANIMATIONS))
+
+#Toon flags
+THROWING = 1
+MOVING = 2
+TURNING = 4
+BACKWARDS = 8
+
+#Cog flags
+ENTERING = 1
+
+#Delta sections: how many records were removed (then their ids), and how many changed (then each one's id, field mask, and fields)
+COUNT = struct.Struct('<H')
+ID = struct.Struct('<H')
+CHANGE = struct.Struct('<HH')
+
+if numpy is not None:
+	RECORD_DTYPE = numpy.dtype([('id', '<u2')] + [(name, '<' + format.replace('B', 'u1').replace('H', 'u2').replace('h', 'i2').replace('f', 'f4'))
+												for name, format in FIELDS])
+
+def snapTransform(pos, hpr):
+	#(int() is much quicker than round(), and rounding toward zero snaps just as well)
+	return (int(pos.x * POSITION_STEPS) / POSITION_STEPS, int(pos.y * POSITION_STEPS) / POSITION_STEPS,
+			int(pos.z * POSITION_STEPS) / POSITION_STEPS, int(hpr.x * ANGLE_STEPS) / ANGLE_STEPS,
+			int(hpr.y * ANGLE_STEPS) / ANGLE_STEPS, int(hpr.z * ANGLE_STEPS) / ANGLE_STEPS)
+
+def getToonRecord(toon):
+	#A toon is known by the id the world gave it (ids wrap around at 16 bits, like cogs'), and shown by what its torso is doing
+	pos = toon.toon.getPos()
+	hpr = toon.toon.getHpr()
+	if toon.isThrowing:
+		animation = 'attackTorso'
+	else:
+		animation = toon.toon.getCurrentAnim('torso')
+	control = toon.toon.getAnimControl(animation, 'torso') if animation is not None else None
+	flags = ((THROWING if toon.isThrowing else 0) | (MOVING if toon.isMovingInY else 0) | (TURNING if toon.isTurning else 0)
+			| (BACKWARDS if toon.speed < 0 else 0))
+	return (toon.toonId & 0xffff, ANIMATION_IDS.get(animation, 0), flags) + snapTransform(pos, hpr) + (toon.health,
+			control.getFrame() if control is not None else 0)
+
+def getPieRecord(pie):
+	#A pie is known by the id the world gave it (wrapping around at 16 bits, like cogs')
+	return (pie.pieId & 0xffff, 0, 0) + snapTransform(pie.pieNode.getPos(), pie.model.getHpr()) + (0, 0)
+
+def getCogRecord(cog):
+	control = cog.animControl
+	return ((cog.cogId & 0xffff, ANIMATION_IDS.get(cog.animation, 0), ENTERING if cog.entering else 0)
+			+ snapTransform(cog.cog.getPos(), cog.cog.getHpr()) + (int(cog.currentHealth), control.getFrame() if control is not None else 0))
+
+def captureSnapshot(pieThrow, tick):
+	#Pack the whole world into one buffer: the header, then the toons, the flying pies, and the cogs
+	cogs = pieThrow.waveManager.activeCogs if pieThrow.waveManager is not None else []
+	return packSnapshot(tick, [getToonRecord(toon) for toon in pieThrow.toons],
+						[getPieRecord(pie) for toon in pieThrow.toons for pie in toon.piePool.flyingPies],
+						[getCogRecord(cog) for cog in cogs])
+
+def packSnapshot(tick, toonRecords, pieRecords, cogRecords):
+	#A full snapshot of the given records (each one as (id, anim, flags, x, y, z, h, p, r, health, frame))
+	data = bytearray(HEADER.size + RECORD.size * (len(toonRecords) + len(pieRecords) + len(cogRecords)))
+	HEADER.pack_into(data, 0, FULL, tick, 0, len(toonRecords), len(pieRecords), len(cogRecords))
+	offset = HEADER.size
+	packInto = RECORD.pack_into
+	for records in (toonRecords, pieRecords, cogRecords):
+		for record in records:
+			packInto(data, offset, *record)
+			offset += RECORD.size
+	return WorldSnapshot(data)
+
+class WorldSnapshot():
+	def __init__(self, data):
+		#Read from whatever buffer the snapshot is in (bytes, a bytearray, a received datagram), without copying it
+		self.view = memoryview(data)
+		kind, self.tick, baseTick, toonCount, pieCount, cogCount = HEADER.unpack_from(self.view, 0)
+		if kind != FULL:
+			raise Exception('UH OH! That is a delta, not a full snapshot (apply it to its base with applyDelta)!')
+		self.counts = (toonCount, pieCount, cogCount)
+		self.starts = (HEADER.size, HEADER.size + toonCount * RECORD.size, HEADER.size + (toonCount + pieCount) * RECORD.size)
+		if len(self.view) < self.starts[COGS] + cogCount * RECORD.size:
+			raise Exception('UH OH! The snapshot is cut short!')
+
+		#Where each record is, by id (only worked out if someone asks)
+		self.indices = None
+
+	def getBytes(self):
+		return self.view.tobytes()
+
+	def getSize(self):
+		return HEADER.size + RECORD.size * sum(self.counts)
+
+	def getSectionView(self, section):
+		start = self.starts[section]
+		return self.view[start:start + self.counts[section] * RECORD.size]
+
+	def getRecords(self, section):
+		#Every record in the section, as (id, anim, flags, x, y, z, h, p, r, health, frame)
+		return RECORD.iter_unpack(self.getSectionView(section))
+
+	def getRecord(self, section, index):
+		return RECORD.unpack_from(self.view, self.starts[section] + index * RECORD.size)
+
+	def getRecordView(self, section, index):
+		start = self.starts[section] + index * RECORD.size
+		return self.view[start:start + RECORD.size]
+
+	def findIndex(self, section, entityId):
+		#The index of the entity's record in its section, or None if it isn't in this snapshot
+		if self.indices is None:
+			self.indices = [dict((ID.unpack_from(self.view, self.starts[each] + index * RECORD.size)[0], index)
+								for index in range(self.counts[each])) for each in SECTIONS]
+		return self.indices[section].get(entityId)
+
+	def asArray(self, section):
+		#The section as a NumPy record array over the snapshot's own memory
+		if numpy is None:
+			raise Exception('UH OH! Reading a snapshot as an array needs NumPy!')
+		return numpy.frombuffer(self.view, RECORD_DTYPE, self.counts[section], self.starts[section])
+
+def encodeDelta(base, snapshot):
+	#Only send what changed since base: the ids of records that went away, and the changed fields of every other record
+	#(new records send all of their fields)
+	parts = [HEADER.pack(DELTA, snapshot.tick, base.tick, *snapshot.counts)]
+	for section in SECTIONS:
+		baseIndices = dict((ID.unpack_from(base.view, base.starts[section] + index * RECORD.size)[0], index)
+							for index in range(base.counts[section]))
+		changes = []
+		for index in range(snapshot.counts[section]):
+			recordView = snapshot.getRecordView(section, index)
+			entityId = ID.unpack_from(recordView)[0]
+			baseIndex = baseIndices.pop(entityId, None)
+			if baseIndex is None:
+				changes.append(CHANGE.pack(entityId, ALL_FIELDS) + recordView[ID.size:].tobytes())
+				continue
+
+			#Records that didn't change at all are skipped without unpacking them
+			baseView = base.getRecordView(section, baseIndex)
+			if recordView == baseView:
+				continue
+			values = RECORD.unpack(recordView)
+			baseValues = RECORD.unpack(baseView)
+			mask = 0
+			fields = []
+			for field, fieldStruct in enumerate(FIELD_STRUCTS):
+				if values[field + 1] != baseValues[field + 1]:
+					mask |= 1 << field
+					fields.append(fieldStruct.pack(values[field + 1]))
+			changes.append(CHANGE.pack(entityId, mask) + b''.join(fields))
+
+		#Whatever is left in the base wasn't in the new snapshot
+		parts.append(COUNT.pack(len(baseIndices)))
+		parts += [ID.pack(entityId) for entityId in baseIndices]
+		parts.append(COUNT.pack(len(changes)))
+		parts += changes
+	return b''.join(parts)
+
+def getBaseTick(data):
+	#The tick a delta was encoded against (None for a full snapshot)
+	kind, tick, baseTick = HEADER.unpack_from(data, 0)[:3]
+	return baseTick if kind == DELTA else None
+
+def applyDelta(base, data):
+	#Rebuild the full snapshot a delta was encoded from, given the snapshot it was encoded against
+	view = memoryview(data)
+	kind, tick, baseTick, toonCount, pieCount, cogCount = HEADER.unpack_from(view, 0)
+	if kind != DELTA:
+		raise Exception('UH OH! That is a full snapshot, not a delta!')
+	if baseTick != base.tick:
+		raise Exception('UH OH! The delta is against tick {0}, not tick {1}!'.format(baseTick, base.tick))
+
+	result = bytearray(HEADER.size + RECORD.size * (toonCount + pieCount + cogCount))
+	HEADER.pack_into(result, 0, FULL, tick, 0, toonCount, pieCount, cogCount)
+	offset = HEADER.size
+	position = HEADER.size
+	for section in SECTIONS:
+		removedCount = COUNT.unpack_from(view, position)[0]
+		position += COUNT.size
+		removed = set(ID.unpack_from(view, position + index * ID.size)[0] for index in range(removedCount))
+		position += removedCount * ID.size
+
+		#Records that are still around keep their place (and their values, until a change says otherwise)
+		changedCount = COUNT.unpack_from(view, position)[0]
+		position += COUNT.size
+		records = {}
+		for index in range(base.counts[section]):
+			recordView = base.getRecordView(section, index)
+			entityId = ID.unpack_from(recordView)[0]
+			if entityId not in removed:
+				records[entityId] = recordView
+		for index in range(changedCount):
+			entityId, mask = CHANGE.unpack_from(view, position)
+			position += CHANGE.size
+			#With every field there (a new record always has them all), the fields are the record
+			if mask == ALL_FIELDS:
+				records[entityId] = ID.pack(entityId) + view[position:position + RECORD.size - ID.size].tobytes()
+				position += RECORD.size - ID.size
+				continue
+			values = list(RECORD.unpack(records[entityId]))
+			for field, fieldStruct in enumerate(FIELD_STRUCTS):
+				if mask & (1 << field):
+					values[field + 1] = fieldStruct.unpack_from(view, position)[0]
+					position += fieldStruct.size
+			records[entityId] = RECORD.pack(*values)
+
+		for record in records.values():
+			result[offset:offset + RECORD.size] = record
+			offset += RECORD.size
+	if offset != len(result):
+		raise Exception('UH OH! The delta does not add up to the snapshot it came from!')
+	return WorldSnapshot(result)
+
+def checkRoundTrip():
+	#Encode deltas between made up snapshots and make sure applying them gives back exactly what was encoded: records
+	#added, removed, and changed in each field, ids at both ends of their range, and a toon and pie past the 8 bit range
+	from panda3d.core import NodePath
+	class StandInActor():
+		def getPos(self):
+			return NodePath('toon').getPos()
+		def getHpr(self):
+			return NodePath('toon').getHpr()
+		def getCurrentAnim(self, partName=None):
+			return None
+	class StandInToon():
+		toonId = 256
+		toon = StandInActor()
+		isThrowing = isMovingInY = isTurning = False
+		speed = 0
+		health = 15
+	class StandInPie():
+		pieId = 0x10000 + 300
+		pieNode = NodePath('pieNode')
+		model = NodePath('pie')
+	toonRecord = getToonRecord(StandInToon())
+	pieRecord = getPieRecord(StandInPie())
+	if toonRecord[0] != 256 or pieRecord[0] != 300:
+		raise Exception('UH OH! Toon and pie ids past 16 bits should wrap around!')
+
+	def makeRecord(entityId, seed):
+		return (entityId, seed % len(ANIMATIONS), seed % 16, seed * 0.5, -seed * 0.25, seed * 0.125,
+				seed * 1.5, -seed * 2.0, seed * 0.75, seed - 100, seed * 3)
+	base = packSnapshot(8, [toonRecord, makeRecord(0, 1)], [pieRecord, makeRecord(0xffff, 2)],
+						[makeRecord(0, 3), makeRecord(1, 4), makeRecord(0xffff, 5)])
+	for field in range(len(FIELDS)):
+		#Change one field of one cog, drop a cog and a pie, and add a cog and a pie at the top of the id range
+		changed = list(makeRecord(1, 4))
+		changed[field + 1] = makeRecord(1, 40)[field + 1]
+		snapshot = packSnapshot(12, [toonRecord, makeRecord(0, 1)], [makeRecord(0xffff, 2), makeRecord(0xfffe, 6)],
+								[tuple(changed), makeRecord(0xffff, 5), makeRecord(0xfffd, 7)])
+		for rebuilt, fromBase in ((applyDelta(base, encodeDelta(base, snapshot)), True), (WorldSnapshot(snapshot.getBytes()), False)):
+			if rebuilt.tick != snapshot.tick or rebuilt.counts != snapshot.counts:
+				raise Exception('UH OH! The snapshot came back with a different header!')
+			for section in SECTIONS:
+				if sorted(rebuilt.getRecords(section)) != sorted(snapshot.getRecords(section)):
+					raise Exception('UH OH! Section {0} changed on the way through {1}!'.format(section, 'a delta' if fromBase else 'the bytes'))
+
+	#A delta against the same snapshot carries no changes at all
+	if len(encodeDelta(base, base)) != HEADER.size + COUNT.size * 2 * len(SECTIONS):
+		raise Exception('UH OH! A delta against an unchanged snapshot should be empty!')
+
+if __name__ == '__main__':
+	checkRoundTrip()
+	print('Snapshots and deltas round trip')